@@ -12,10 +12,9 @@ del _re
 del _warnings
 
 from lanfang import utils
-from lanfang import runner
-from lanfang import network
-from lanfang import ai
-from lanfang import dev
 
-
-__all__ = [_s for _s in dir() if not _s.startswith('_')]
+# The other packages are imported on first access, e.g. 'lanfang.ai'
+# pulls in tensorflow, which is unnecessary to run tasks.
+__getattr__, __dir__, __all__ = utils.lazy.attach(
+    __name__, ["runner", "network", "ai", "dev"])
+__all__ = ["utils"] + __all__
@@ -1,27 +1,15 @@
-from lanfang.ai.engine import names
-from lanfang.ai import utils
-from lanfang.ai.engine.dataset import Dataset
-from lanfang.ai.engine.model import Model
-from lanfang.ai.engine.model import KerasModel
-from lanfang.ai.engine.oracle import BaseOracle
-from lanfang.ai.engine.oracle import KerasOracle
-from lanfang.ai import dataset
-from lanfang.ai import model
-
-from lanfang.utils import func as _func
-
-import inspect as _inspect
-
-
-for dataset_class in _func.subclasses(Dataset):
-  if _inspect.isabstract(dataset_class):
-    continue
-  Dataset.register(dataset_class)
-
-for model_class in _func.subclasses(KerasModel):
-  if _inspect.isabstract(model_class):
-    continue
-  Model.register(model_class)
-
-
-__all__ = [_s for _s in dir() if not _s.startswith('_')]
+from lanfang.utils import lazy as _lazy
+
+
+# Nothing is imported until it is accessed, tensorflow is only loaded by
+# the modules which need it. Datasets are registered when they are
+# created, see 'Dataset.create'.
+__getattr__, __dir__, __all__ = _lazy.attach(
+    __name__, ["engine", "utils", "dataset"], {
+      "names": "engine",
+      "Dataset": "engine.dataset",
+      "Model": "engine.model",
+      "KerasModel": "engine.model",
+      "BaseOracle": "engine.oracle",
+      "KerasOracle": "engine.oracle",
+    })
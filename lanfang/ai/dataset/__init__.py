@@ -1,4 +1,4 @@
-from . import images
-from . import texts
+from lanfang.utils import lazy as _lazy
 
-__all__ = ["images", "texts"]
+
+__getattr__, __dir__, __all__ = _lazy.attach(__name__, ["images", "texts"])
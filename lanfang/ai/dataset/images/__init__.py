@@ -1,2 +1,4 @@
-from . import mnist
-from . import cifar
+from lanfang.utils import lazy as _lazy
+
+
+__getattr__, __dir__, __all__ = _lazy.attach(__name__, ["mnist", "cifar"])
@@ -233,3 +233,7 @@ class Cifar100(Cifar10):
         all_labels = all_labels[sample_idx[:self._m_dev_size]]
 
     return tf.data.Dataset.from_tensor_slices((all_images, all_labels))
+
+
+Dataset.register(Cifar10)
+Dataset.register(Cifar100)
@@ -118,3 +118,6 @@ class Mnist(Dataset):
 
   def paddings(self):
     return None
+
+
+Dataset.register(Mnist)
@@ -1,3 +1,5 @@
-from . import imdb
-from . import snli
-from . import msra_ner
+from lanfang.utils import lazy as _lazy
+
+
+__getattr__, __dir__, __all__ = _lazy.attach(
+    __name__, ["imdb", "snli", "msra_ner"])
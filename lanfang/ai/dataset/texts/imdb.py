@@ -193,3 +193,6 @@ class IMDB(Dataset):
   def parse(self, mode, sent, label):
     sent = tf.cast(sent, tf.int32)
     return {names.Text.SENTENCE: sent}, {names.Classification.LABEL: label}
+
+
+Dataset.register(IMDB)
@@ -307,3 +307,6 @@ class MSRA_NER(Dataset):
           text=[map(operator.itemgetter(c), tokens)],
           save_file=fname,
           extra_tokens=extra_tokens)
+
+
+Dataset.register(MSRA_NER)
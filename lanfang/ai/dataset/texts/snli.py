@@ -9,7 +9,6 @@ import urllib.request
 import json
 import logging
 
-import nltk
 import tensorflow as tf
 
 
@@ -163,6 +162,8 @@ class SNLI(Dataset):
     )
 
   def _extract_data(self, zip_fname, output_path):
+    import nltk
+
     train_tokens = []
     train_labels = []
     for split in ["train", "dev", "test"]:
@@ -212,3 +213,6 @@ class SNLI(Dataset):
       Tokenizer.create("identity_tokenizer").build_dict(
           text=train_labels,
           save_file=os.path.join(output_path, "label.vocab.txt"))
+
+
+Dataset.register(SNLI)
@@ -1,12 +1,18 @@
-from lanfang.ai.engine.dataset import Dataset
-from lanfang.ai.engine.model import Model
-from lanfang.ai.engine.model import KerasModel
-from lanfang.ai.engine.optimizer import Optimizer
-from lanfang.ai.engine.optimizer import KerasOptimizer
-from lanfang.ai.engine.optimizer import LearningRateSchedule
-from lanfang.ai.engine.optimizer import KerasLearningRateSchedule
-from lanfang.ai.engine.oracle import BaseOracle
-from lanfang.ai.engine.oracle import KerasOracle
+from lanfang.utils import lazy as _lazy
+
+
+__getattr__, __dir__, _ = _lazy.attach(
+    __name__, ["names", "dataset", "model", "optimizer", "oracle"], {
+      "Dataset": "dataset",
+      "Model": "model",
+      "KerasModel": "model",
+      "Optimizer": "optimizer",
+      "KerasOptimizer": "optimizer",
+      "LearningRateSchedule": "optimizer",
+      "KerasLearningRateSchedule": "optimizer",
+      "BaseOracle": "oracle",
+      "KerasOracle": "oracle",
+    })
 
 
 __all__ = [
@@ -1,6 +1,6 @@
 import abc
 import functools
-import tensorflow as tf
+import importlib
 
 
 class Dataset(abc.ABC):
@@ -9,6 +9,17 @@ class Dataset(abc.ABC):
 
   __datasets__ = {}
 
+  # Modules of the builtin datasets, which register their datasets when
+  # imported, see 'Dataset.create'.
+  __dataset_modules__ = {
+    "mnist": "lanfang.ai.dataset.images.mnist",
+    "cifar10": "lanfang.ai.dataset.images.cifar",
+    "cifar100": "lanfang.ai.dataset.images.cifar",
+    "imdb": "lanfang.ai.dataset.texts.imdb",
+    "snli": "lanfang.ai.dataset.texts.snli",
+    "msra_ner": "lanfang.ai.dataset.texts.msra_ner",
+  }
+
   @staticmethod
   def register(dataset_class):
     """Register a dataset."""
@@ -27,6 +38,9 @@ class Dataset(abc.ABC):
   def create(name, **kwargs):
     """Create dataset."""
     name = name.lower()
+    if name not in Dataset.__datasets__ \
+        and name in Dataset.__dataset_modules__:
+      importlib.import_module(Dataset.__dataset_modules__[name])
     if name not in Dataset.__datasets__:
       raise KeyError("Can't find dataset: %s" % (name))
 
@@ -114,6 +128,8 @@ class Dataset(abc.ABC):
                                shuffle_batches=100,
                                prefetch_buffer_size=1):
     def input_fn(splits, mode, config):
+      import tensorflow as tf
+
       if isinstance(splits, dict):
         splits, weights = list(zip(*splits.items()))
       else:
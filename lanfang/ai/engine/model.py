@@ -1,5 +1,4 @@
 import abc
-import tensorflow as tf
 
 
 class Model(abc.ABC):
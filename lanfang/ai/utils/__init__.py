@@ -1,6 +1,5 @@
-from . import tokenizer
-from . import dictionary
-from . import tags
+from lanfang.utils import lazy as _lazy
 
 
-__all__ = [_s for _s in dir() if not _s.startswith('_')]
+__getattr__, __dir__, __all__ = _lazy.attach(
+    __name__, ["tokenizer", "dictionary", "tags"])
@@ -4,8 +4,6 @@ import collections
 import itertools
 import operator
 
-import jieba
-
 
 class Tokenizer(abc.ABC):
   __tokenizers__ = {}
@@ -114,6 +112,7 @@ class JiebaTokenizer(Tokenizer):
     return "jieba"
 
   def tokenize(self, s, cut_all=False, HMM=True):
+    import jieba
     return list(jieba.cut(s, cut_all=cut_all, HMM=HMM))
 
 
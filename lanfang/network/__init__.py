@@ -1,5 +1,4 @@
-from lanfang.network import netdata
-from lanfang.network import email
+from lanfang.utils import lazy as _lazy
 
 
-__all__ = [_s for _s in dir() if not _s.startswith('_')]
+__getattr__, __dir__, __all__ = _lazy.attach(__name__, ["netdata", "email"])
@@ -6,7 +6,6 @@ import glob
 import urllib.parse
 import os
 import logging
-import requests
 import copy
 
 
@@ -202,6 +201,8 @@ def http_download(url, save_path, params=None, overwrite=False,
     The local file which saved the remote data.
 
   """
+  import requests
+
   r = requests.get(url, params=params, stream=True)
   if r.status_code != requests.codes.ok:
     logging.warning("Download data from '%s' failed with status code %d" % (
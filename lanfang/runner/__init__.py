@@ -8,13 +8,26 @@ from lanfang.runner.base import RunnerStatus
 from lanfang.runner.base import Runner
 from lanfang.runner.cmd_runner import ArgumentParser
 from lanfang.runner.cmd_runner import CmdRunner
+from lanfang.runner.cmd_runner import AsyncCmdRunner
+from lanfang.runner.cmd_runner import RunnerEventLoop
+from lanfang.runner.cmd_runner import dump_result
 from lanfang.runner.func_runner import FuncThreadRunner
 from lanfang.runner.func_runner import FuncProcessRunner
+from lanfang.runner.func_runner import FuncPoolRunner
+from lanfang.runner.func_runner import FuncWorkerPool
 from lanfang.runner.multi_task_dependency import TopologicalGraph
 from lanfang.runner.multi_task_dependency import DynamicTopologicalGraph
 from lanfang.runner.multi_task_config import MultiTaskConfig
 from lanfang.runner.multi_task_config import MultiTaskJsonnetConfig
 from lanfang.runner.multi_task_runner import MultiTaskRunner
+from lanfang.runner.multi_task_cache import TaskResultCache
+from lanfang.runner.multi_task_journal import CheckpointJournal
+from lanfang.runner.output_store import OutputStore
+from lanfang.runner.remote_runner import RemoteRunner
+from lanfang.runner.remote_runner import RemoteWorkerAgent
+from lanfang.runner.remote_runner import RemoteWorkerPool
+from lanfang.runner.multi_task_runner import Scheduler
+from lanfang.runner.multi_task_runner import ParallelScheduler
 from lanfang.runner.task_register import TaskRegister
 from lanfang.runner.task_register import TaskSchema
 from lanfang.runner.task_loader import TaskLoader
@@ -4,6 +4,7 @@ import argparse
 import json
 
 
+import os
 import sys
 if sys.argv[0].endswith("__main__.py"):
   import os.path
@@ -13,7 +14,6 @@ if sys.argv[0].endswith("__main__.py"):
   # (if you have spaces in your executable you get what you deserve!)
   executable = os.path.basename(sys.executable)
   sys.argv[0] = executable + " -m lanfang.runner"
-  del os
 
 
 def parse_args():
@@ -24,7 +24,8 @@ def parse_args():
 
   parser.add_argument(
     "-l", "--lists", action="store_true",
-    help="List all the registered tasks.")
+    help="List all the registered tasks, only the task files changed "
+         "since the last listing are imported.")
 
   parser.add_argument(
     "-r", "--run", nargs='*',
@@ -48,22 +49,104 @@ def parse_args():
   parser.add_argument(
     "--tasks", nargs="+", help="A subset of tasks to use.")
 
+  parser.add_argument(
+    "--task-index-dir", default="~/.lanfang/runner/task_index",
+    help="The directory to cache the tasks registered by each task file.")
+
+  parser.add_argument(
+    "--no-task-index", action="store_true",
+    help="Import all the task files without using the task index.")
+
+  parser.add_argument(
+    "--cache-dir",
+    help="The directory to cache task outputs, tasks with cached outputs "
+         "are skipped.")
+
+  parser.add_argument(
+    "--cache-size", type=int,
+    help="Maximum bytes of the cached task outputs.")
+
+  parser.add_argument(
+    "--workers", nargs="+",
+    help="Addresses 'host:port' of the worker agents to execute the tasks, "
+         "the secret shared with them is read from the environment "
+         "variable %s." % runner.remote_runner.SECRET_ENV_NAME)
+
+  parser.add_argument(
+    "--serve-worker", metavar="[HOST:]PORT",
+    help="Serve as a worker agent which executes the tasks dispatched by "
+         "the coordinator, the tasks under 'start_dir' must be importable. "
+         "It listens on 127.0.0.1 if HOST is omitted, and only accepts the "
+         "coordinators who know the secret in the environment variable "
+         "%s." % runner.remote_runner.SECRET_ENV_NAME)
+
   return parser, parser.parse_args()
 
 
+def serve_worker(address, start_dir):
+  host, _, port = address.rpartition(":")
+  # Callable targets are imported by their module names.
+  sys.path.insert(0, os.path.abspath(start_dir))
+  agent = runner.RemoteWorkerAgent(
+      host or "127.0.0.1", int(port), start_dir=start_dir)
+  print("Worker agent is listening on %s:%s" % agent.address)
+  try:
+    agent.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    agent.shutdown()
+  return 0
+
+
+def print_tasks(tasks, subset=None):
+  for task in tasks:
+    if subset is not None and task["name"] not in subset:
+      continue
+    inputs = [] if task["input"] is None else \
+        task["input"]["globals"] + task["input"]["locals"]
+    outputs = task["output"]["globals"] + task["output"]["locals"]
+    print("%s (%s)\n  input: %s\n  output: %s" % (
+        task["name"], os.path.relpath(task["file"]),
+        ", ".join(inputs), ", ".join(outputs)))
+
+
 def main():
   parser, args = parse_args()
 
+  if args.serve_worker is not None:
+    return serve_worker(args.serve_worker, args.start_dir)
+
   if args.feed_values is None:
     feed_dict = {}
   else:
     feed_dict = json.loads(args.feed_values)
 
+  task_loader = runner.TaskLoader(
+      None if args.no_task_index else args.task_index_dir)
+  load_args = [args.start_dir]
   if args.file_pattern is not None:
-    runner.TaskLoader().load(args.start_dir, args.file_pattern)
-  else:
-    runner.TaskLoader().load(args.start_dir)
-  scheduler = runner.TaskRegister.spawn(feed_dict=feed_dict, subset=args.tasks)
+    load_args.append(args.file_pattern)
+
+  if args.lists is True and not args.print_params:
+    print_tasks(task_loader.list(*load_args), args.tasks)
+    exit(0)
+  task_loader.load(*load_args, tasks=args.tasks)
+
+  runner_kwargs = {}
+  if args.cache_dir is not None:
+    runner_kwargs["cache"] = runner.TaskResultCache(
+        args.cache_dir, max_size=args.cache_size)
+  if args.workers is not None:
+    runner_kwargs["remote_worker_pool"] = runner.RemoteWorkerPool(args.workers)
+
+  runner_creater = None
+  if len(runner_kwargs) > 0:
+    runner_creater = lambda task_params: runner.MultiTaskRunner(
+        params=task_params, **runner_kwargs)
+
+  scheduler = runner.TaskRegister.spawn(
+      feed_dict=feed_dict, subset=args.tasks, runner_creater=runner_creater)
 
   if args.print_params:
     print("--------------- Initial Parameters -------------")
@@ -71,11 +154,11 @@ def main():
     print("------------------------------------------------")
 
   if args.lists is True:
-    scheduler.lists(verbose=True)
+    scheduler.list(verbose=True)
     exit(0)
 
   if args.run is None:
-    scheduler.lists(verbose=True)
+    scheduler.list(verbose=True)
     parser.print_help()
     exit(0)
 
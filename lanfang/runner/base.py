@@ -1,13 +1,22 @@
+from lanfang import utils
+
+import os
+import sys
 import copy
 import enum
 import collections
+import collections.abc
+import ctypes
+import math
 import time
 import json
 import hashlib
 import threading
 import abc
 import multiprocessing
+import multiprocessing.managers
 import logging
+import resource
 
 
 class RunnerStatus(enum.Enum):
@@ -26,7 +35,7 @@ class SharedScope(enum.Enum):
   PROCESS = 2
 
 
-class SharedData(collections.MutableMapping):
+class SharedData(collections.abc.MutableMapping):
   """Shared data between multiple processes or threads.
 
   Parameters
@@ -34,14 +43,23 @@ class SharedData(collections.MutableMapping):
   shared_scope: SharedScope
     The data sharing scope, can be SharedScope.THREAD or SharedScope.PROCESS.
 
+  server: SharedDataServer
+    The server which holds the data when 'shared_scope' is
+    SharedScope.PROCESS, a new manager process is started if it's None.
+
   """
-  def __init__(self, *args, shared_scope=SharedScope.THREAD, **kwargs):
+  def __init__(self, *args, shared_scope=SharedScope.THREAD, server=None,
+                            **kwargs):
     self._m_shared_scope = shared_scope
 
     if self._m_shared_scope == SharedScope.THREAD:
       self._m_shared_dict = dict(*args, **kwargs)
       self._m_lock = threading.Lock()
 
+    elif self._m_shared_scope == SharedScope.PROCESS and server is not None:
+      self._m_shared_dict, self._m_lock = server.register(
+          dict(*args, **kwargs))
+
     elif self._m_shared_scope == SharedScope.PROCESS:
       self._m_manager = multiprocessing.Manager()
       self._m_shared_dict = self._m_manager.dict(*args, **kwargs)
@@ -50,7 +68,8 @@ class SharedData(collections.MutableMapping):
     else:
       raise ValueError("Unsupported 'shared_scope': {}".format(shared_scope))
 
-    # Data used when the connection is broken.
+    # Data used when the connection is broken. Only the accessed items are
+    # refreshed, so an access doesn't transfer the whole data.
     self._m_standby_shared_data = self._m_shared_dict.copy()
 
   def _acquire(self):
@@ -68,13 +87,14 @@ class SharedData(collections.MutableMapping):
           self.__class__.__name__, type(e), e)
 
   def update(self, *args, **kwds):
+    values = dict(*args, **kwds)
     try:
       self._acquire()
-      self._m_shared_dict.update(*args, **kwds)
-      self._m_standby_shared_data = self._m_shared_dict.copy()
+      self._m_shared_dict.update(values)
+      self._m_standby_shared_data.update(values)
 
     except (ConnectionError, EOFError) as e:
-      self._m_standby_shared_data.update(*args, **kwds)
+      self._m_standby_shared_data.update(values)
       logging.warning("%s.update got exception %s: %s",
           self.__class__.__name__, type(e), e)
     finally:
@@ -89,7 +109,7 @@ class SharedData(collections.MutableMapping):
         value = copy.deepcopy(self._m_shared_dict[key])
       else:
         value = self._m_shared_dict[key]
-      self._m_standby_shared_data = self._m_shared_dict.copy()
+      self._m_standby_shared_data[key] = value
 
     except (ConnectionError, EOFError) as e:
       logging.warning("%s.__getitem__ got exception %s: %s",
@@ -100,11 +120,43 @@ class SharedData(collections.MutableMapping):
 
     return value
 
+  def get_items(self, keys):
+    """Return a dict of the items with 'keys', missing keys are skipped.
+
+    The lock is acquired once for all the items, which are fetched in
+    one call if the data is held by a SharedDataServer.
+    """
+    keys = list(keys)
+    try:
+      self._acquire()
+      if isinstance(self._m_shared_dict, _SharedNamespace):
+        items = self._m_shared_dict.get_items(keys)
+      else:
+        items = {}
+        for key in keys:
+          try:
+            items[key] = self._m_shared_dict[key]
+          except KeyError:
+            pass
+      if self._m_shared_scope == SharedScope.THREAD:
+        items = copy.deepcopy(items)
+      self._m_standby_shared_data.update(items)
+
+    except (ConnectionError, EOFError) as e:
+      logging.warning("%s.get_items got exception %s: %s",
+          self.__class__.__name__, type(e), e)
+      items = copy.deepcopy({key: self._m_standby_shared_data[key]
+          for key in keys if key in self._m_standby_shared_data})
+    finally:
+      self._release()
+
+    return items
+
   def __setitem__(self, key, value):
     try:
       self._acquire()
       self._m_shared_dict[key] = value
-      self._m_standby_shared_data = self._m_shared_dict.copy()
+      self._m_standby_shared_data[key] = value
 
     except (ConnectionError, EOFError) as e:
       logging.warning("%s.__setitem__ got exception %s: %s",
@@ -117,7 +169,7 @@ class SharedData(collections.MutableMapping):
     try:
       self._acquire()
       del self._m_shared_dict[key]
-      self._m_standby_shared_data = self._m_shared_dict.copy()
+      self._m_standby_shared_data.pop(key, None)
 
     except (ConnectionError, EOFError) as be:
       logging.warning("%s.__delitem__ got exception %s: %s",
@@ -129,8 +181,7 @@ class SharedData(collections.MutableMapping):
   def __iter__(self):
     try:
       self._acquire()
-      keys = self._m_shared_dict.keys()
-      self._m_standby_shared_data = self._m_shared_dict.copy()
+      keys = list(self._m_shared_dict.keys())
 
     except (ConnectionError, EOFError) as e:
       logging.warning("%s.__iter__ got exception %s: %s",
@@ -145,7 +196,6 @@ class SharedData(collections.MutableMapping):
     try:
       self._acquire()
       length = len(self._m_shared_dict)
-      self._m_standby_shared_data = self._m_shared_dict.copy()
 
     except (ConnectionError, EOFError) as e:
       logging.warning("%s.__len__ got exception %s: %s",
@@ -169,6 +219,19 @@ class SharedData(collections.MutableMapping):
     finally:
       self._release()
 
+  def copy(self):
+    """Return a dict with all the data."""
+    try:
+      self._acquire()
+      self._m_standby_shared_data = self._m_shared_dict.copy()
+
+    except (ConnectionError, EOFError) as e:
+      logging.warning("%s.copy got exception %s: %s",
+          self.__class__.__name__, type(e), e)
+    finally:
+      self._release()
+    return copy.deepcopy(self._m_standby_shared_data)
+
   def __hash__(self):
     try:
       self._acquire()
@@ -184,6 +247,357 @@ class SharedData(collections.MutableMapping):
     return int(hashlib.md5(frozen_value.encode("utf-8")).hexdigest(), 16)
 
 
+class SharedDataServer(object):
+  """Hold the data of multiple SharedData instances in one manager process.
+
+  The manager process is started when it's first used. All the SharedData
+  registered into the same server are saved in one store, each one
+  under its own namespace, and are protected by the same lock. So only
+  two proxies are inherited by a forked child, no matter how many
+  SharedData instances are created.
+  """
+
+  def __init__(self):
+    self._m_manager = None
+    self._m_shared_store = None
+    self._m_shared_lock = None
+    self._m_namespace_id = 0
+    self._m_lock = threading.Lock()
+
+  def create(self, *args, **kwargs):
+    """Create a SharedData which can be shared between processes.
+    """
+    return SharedData(
+        *args, shared_scope=SharedScope.PROCESS, server=self, **kwargs)
+
+  def register(self, value):
+    """Register a new namespace with initial value.
+
+    Returns
+    -------
+    shared_dict: object
+      A dict-like object which saves its data in the new namespace.
+
+    shared_lock: object
+      The lock need to be held when operate on 'shared_dict'.
+    """
+    with self._m_lock:
+      if self._m_manager is None:
+        self._m_manager = _SharedDataManager()
+        self._m_manager.start()
+        self._m_shared_store = self._m_manager.NamespaceStore()
+        self._m_shared_lock = self._m_manager.Lock()
+      namespace = self._m_namespace_id
+      self._m_namespace_id += 1
+    return (_SharedNamespace(self._m_shared_store, namespace, value),
+            self._m_shared_lock)
+
+  def shutdown(self):
+    """Stop the manager process if it's started."""
+    with self._m_lock:
+      if self._m_manager is not None:
+        self._m_manager.shutdown()
+        self._m_manager = None
+
+
+class _NamespaceStore(object):
+  """The dicts of all the namespaces, which lives in the manager process.
+
+  Each method operates on one namespace only, so listing or copying a
+  namespace doesn't transfer the items of the others.
+  """
+
+  def __init__(self):
+    self._m_namespaces = {}
+
+  def get(self, namespace, key):
+    return self._m_namespaces.get(namespace, {})[key]
+
+  def get_items(self, namespace, keys):
+    items = self._m_namespaces.get(namespace, {})
+    return {key: items[key] for key in keys if key in items}
+
+  def set(self, namespace, key, value):
+    self._m_namespaces.setdefault(namespace, {})[key] = value
+
+  def update(self, namespace, items):
+    self._m_namespaces.setdefault(namespace, {}).update(items)
+
+  def delete(self, namespace, key):
+    del self._m_namespaces.get(namespace, {})[key]
+
+  def copy(self, namespace):
+    return dict(self._m_namespaces.get(namespace, {}))
+
+  def keys(self, namespace):
+    return list(self._m_namespaces.get(namespace, {}))
+
+  def length(self, namespace):
+    return len(self._m_namespaces.get(namespace, {}))
+
+
+class _SharedDataManager(multiprocessing.managers.SyncManager):
+  pass
+
+
+_SharedDataManager.register("NamespaceStore", _NamespaceStore)
+
+
+class _SharedNamespace(object):
+  """A dict whose items are saved in a namespace of the store in the
+  manager process.
+
+  Each access is a single call of the store, and only transfers the
+  accessed items instead of the whole namespace.
+  """
+
+  def __init__(self, shared_store, namespace, value):
+    self._m_shared_store = shared_store
+    self._m_namespace = namespace
+    self.update(value)
+
+  def copy(self):
+    return self._m_shared_store.copy(self._m_namespace)
+
+  def keys(self):
+    return self._m_shared_store.keys(self._m_namespace)
+
+  def get_items(self, keys):
+    return self._m_shared_store.get_items(self._m_namespace, list(keys))
+
+  def update(self, *args, **kwargs):
+    value = dict(*args, **kwargs)
+    if len(value) > 0:
+      self._m_shared_store.update(self._m_namespace, value)
+
+  def __getitem__(self, key):
+    return self._m_shared_store.get(self._m_namespace, key)
+
+  def __setitem__(self, key, value):
+    self._m_shared_store.set(self._m_namespace, key, value)
+
+  def __delitem__(self, key):
+    self._m_shared_store.delete(self._m_namespace, key)
+
+  def __len__(self):
+    return self._m_shared_store.length(self._m_namespace)
+
+
+def _is_process_alive(pid):
+  try:
+    os.kill(pid, 0)
+  except ProcessLookupError:
+    return False
+  except PermissionError:
+    return True
+
+  # A terminated child is a zombie until it's reaped.
+  try:
+    with open("/proc/%d/stat" % (pid), 'r') as fin:
+      return fin.read().rsplit(")", 1)[1].split()[0] != "Z"
+  except (OSError, IndexError):
+    return True
+
+
+class SharedStatus(collections.abc.MutableMapping):
+  """Fixed layout status record shared between multiple processes or threads.
+
+  Values are stored in shared memory, so reading a value is a plain memory
+  access instead of a round trip to a manager process. Writers are
+  serialized by a lock, readers don't take it but retry when a writer is
+  updating the record at the same time (sequence lock). A reader takes the
+  lock as well if it keeps failing.
+
+  Each writer records its pid while it holds the lock. If the lock can't
+  be acquired and the recorded writer is dead, e.g. a process killed by
+  SIGTERM during writing, the lock is taken over and the sequence it left
+  is repaired. The fields written by that writer may be partially updated.
+
+  Parameters
+  ----------
+  fields: dict
+    Name and type of each field, the type can be int, float or bool.
+    Every field can also be set to None, which is its initial value.
+
+  shared_scope: SharedScope
+    The data sharing scope, can be SharedScope.THREAD or SharedScope.PROCESS.
+
+  """
+
+  __max_read_retry__ = 10000
+  __write_lock_timeout__ = 1.0
+  __lock_poll_interval__ = 0.01
+
+  def __init__(self, fields, *args, shared_scope=SharedScope.THREAD, **kwargs):
+    self._m_fields = collections.OrderedDict()
+    for index, (name, value_type) in enumerate(fields.items()):
+      if value_type not in (int, float, bool):
+        raise TypeError("Unsupported type %s of field '%s'" % (
+            value_type, name))
+      self._m_fields[name] = (index, value_type)
+
+    if shared_scope == SharedScope.THREAD:
+      self._m_lock = threading.Lock()
+      self._m_takeover_lock = threading.Lock()
+    elif shared_scope == SharedScope.PROCESS:
+      self._m_lock = multiprocessing.Lock()
+      self._m_takeover_lock = multiprocessing.Lock()
+    else:
+      raise ValueError("Unsupported 'shared_scope': {}".format(shared_scope))
+
+    self._m_values = multiprocessing.RawArray(ctypes.c_double, len(fields))
+    self._m_sequence = multiprocessing.RawValue(ctypes.c_ulonglong, 0)
+    # Pid of the writer holding the lock, 0 if it's not held.
+    self._m_writer = multiprocessing.RawValue(ctypes.c_long, 0)
+    for index in range(len(fields)):
+      self._m_values[index] = math.nan
+    self.update(*args, **kwargs)
+
+  def _read(self):
+    for _ in range(self.__max_read_retry__):
+      sequence = self._m_sequence.value
+      if sequence % 2 == 1:
+        continue
+      values = self._m_values[:]
+      if sequence == self._m_sequence.value:
+        return values
+
+    # Writers keep updating the record, or a writer is terminated
+    # during writing, read it with the lock held.
+    if not self._acquire():
+      logging.warning("%s._read failed to acquire the lock after %d "
+          "retries, the values may be inconsistent",
+          self.__class__.__name__, self.__max_read_retry__)
+      return self._m_values[:]
+    try:
+      return self._m_values[:]
+    finally:
+      self._release()
+
+  def _acquire(self):
+    """Acquire the lock, or take it over from a dead writer.
+
+    Returns
+    -------
+    acquired: boolean
+      False if the lock isn't acquired in __write_lock_timeout__ seconds.
+    """
+    deadline = time.time() + self.__write_lock_timeout__
+    while True:
+      if self._m_lock.acquire(timeout=self.__lock_poll_interval__):
+        self._m_writer.value = os.getpid()
+        return True
+      writer = self._m_writer.value
+      if writer != 0 and not _is_process_alive(writer) and \
+          self._take_over(writer):
+        return True
+      if time.time() >= deadline:
+        return False
+
+  def _take_over(self, writer):
+    # Only one of the processes finding the dead writer takes over the lock.
+    with self._m_takeover_lock:
+      if self._m_writer.value != writer:
+        return False
+      self._m_writer.value = os.getpid()
+
+    logging.warning("%s takes over the lock from the dead writer %d",
+        self.__class__.__name__, writer)
+    if self._m_sequence.value % 2 == 1:
+      # The writer is terminated during writing.
+      self._m_sequence.value += 1
+    return True
+
+  def _release(self):
+    self._m_writer.value = 0
+    self._m_lock.release()
+
+  def _write(self, items):
+    encoded_items = []
+    for key, value in items:
+      if key not in self._m_fields:
+        raise KeyError("'%s' is not a field of %s" % (
+            key, self.__class__.__name__))
+      index, value_type = self._m_fields[key]
+      if value is None:
+        encoded_items.append((index, math.nan))
+      else:
+        encoded_items.append((index, float(value_type(value))))
+
+    # Writing without the lock breaks the sequence of the readers.
+    if not self._acquire():
+      raise RuntimeError("%s._write failed to acquire the lock in %s "
+          "seconds" % (self.__class__.__name__, self.__write_lock_timeout__))
+    try:
+      self._m_sequence.value += 1
+      try:
+        for index, value in encoded_items:
+          self._m_values[index] = value
+      finally:
+        self._m_sequence.value += 1
+    finally:
+      self._release()
+
+  def _decode(self, key, values):
+    index, value_type = self._m_fields[key]
+    if math.isnan(values[index]):
+      return None
+    return value_type(values[index])
+
+  def update(self, *args, **kwds):
+    self._write(dict(*args, **kwds).items())
+
+  def __getitem__(self, key):
+    if key not in self._m_fields:
+      raise KeyError(key)
+    return self._decode(key, self._read())
+
+  def __setitem__(self, key, value):
+    self._write([(key, value)])
+
+  def __delitem__(self, key):
+    self._write([(key, None)])
+
+  def __iter__(self):
+    return iter(self._m_fields)
+
+  def __len__(self):
+    return len(self._m_fields)
+
+  def __str__(self):
+    values = self._read()
+    return str({key: self._decode(key, values) for key in self._m_fields})
+
+
+# ru_maxrss is in kilobytes on Linux, and in bytes on macOS.
+__RSS_UNIT__ = 1 if sys.platform == "darwin" else 1024
+
+# ru_inblock and ru_oublock count blocks of 512 bytes.
+__IO_BLOCK_SIZE__ = 512
+
+__USAGE_FIELDS__ = ("cpu_user", "cpu_sys", "max_rss",
+                    "read_bytes", "write_bytes")
+
+
+def resource_usage(rusage):
+  """Convert a resource.struct_rusage into the resource usage of a runner.
+
+  Returns
+  -------
+  usage: dict
+    'cpu_user' and 'cpu_sys' in seconds, 'max_rss' which is the peak
+    resident set size, 'read_bytes' and 'write_bytes' which are the bytes
+    read from and written to the storage, all in bytes.
+  """
+  return {
+    "cpu_user": rusage.ru_utime,
+    "cpu_sys": rusage.ru_stime,
+    "max_rss": rusage.ru_maxrss * __RSS_UNIT__,
+    "read_bytes": rusage.ru_inblock * __IO_BLOCK_SIZE__,
+    "write_bytes": rusage.ru_oublock * __IO_BLOCK_SIZE__,
+  }
+
+
 class RunnerHook(abc.ABC):
   """The base hook class for runner to invoke during running.
   """
@@ -319,6 +733,15 @@ class Runner(abc.ABC):
   internal_scope: SharedScope
     The internal data sharing scope of this runner.
 
+  shared_server: SharedDataServer
+    The server to hold the internal data shared between processes,
+    a runner with internal scope SharedScope.PROCESS starts
+    its own manager process if it's None.
+
+  output_store: OutputStore
+    Save the large output values into the store, and pass their handles
+    to the context instead, see 'output_store.OutputStore'.
+
   Properties
   ----------
   name: The name of this runner.
@@ -331,6 +754,10 @@ class Runner(abc.ABC):
 
   attempts: tuple (attempts, retry), The attempts info of this runner.
 
+  spans: list, The timing of the phases of this runner, see 'spans'.
+
+  usage: dict, The resource usage of all the attempts, see 'usage'.
+
   exitcode: The exit code after execute target.
 
   stdin: stdin stream.
@@ -340,10 +767,25 @@ class Runner(abc.ABC):
   stderr: stderr stream.
   """
 
+  __status_fields__ = {
+    "attempts": int,
+    "start_time": float,
+    "elapsed_time": float,
+    "exitcode": int,
+    "need_stop": bool,
+    "cpu_user": float,
+    "cpu_sys": float,
+    "max_rss": int,
+    "read_bytes": int,
+    "write_bytes": int,
+  }
+
   def __init__(self, target, *, name=None, retry=1, interval=5, daemon=None,
                              hooks=None, context=None,
                              stdin=None, stdout=None, stderr=None,
-                             internal_scope=SharedScope.THREAD):
+                             internal_scope=SharedScope.THREAD,
+                             shared_server=None,
+                             output_store=None):
     self._m_target = target
     self._m_name = name
     self._m_retry_limit = retry
@@ -355,6 +797,10 @@ class Runner(abc.ABC):
     self._m_hooks = hooks if hooks is not None else []
 
     self._m_context = context
+    self._m_output_store = output_store
+    # Values shared with the target and the hooks instead of copied,
+    # keyed by their ids.
+    self._m_shared_values = {}
 
     self.stdin = stdin
     self.stdout = stdout
@@ -365,8 +811,22 @@ class Runner(abc.ABC):
       "start_time": None,
       "elapsed_time": None,
       "exitcode": None,
+      "need_stop": False,
+      "cpu_user": None,
+      "cpu_sys": None,
+      "max_rss": None,
+      "read_bytes": None,
+      "write_bytes": None,
     }
-    self._m_runner_status = SharedData(status, shared_scope=internal_scope)
+    self._m_runner_status = SharedStatus(
+        self.__status_fields__, status, shared_scope=internal_scope)
+    self._m_runner_output = SharedData(
+        shared_scope=internal_scope, server=shared_server)
+    self._m_done_callbacks = []
+    # Spans recorded in the thread/process which executes run(),
+    # they're published together with the output.
+    self._m_spans = []
+    self._m_attempt_usage = None
 
   @property
   def name(self):
@@ -385,7 +845,7 @@ class Runner(abc.ABC):
 
   @property
   def output(self):
-    return self._m_runner_status.get("output")
+    return self._m_runner_output.get("output")
 
   @property
   def attempts(self):
@@ -395,6 +855,40 @@ class Runner(abc.ABC):
   def exitcode(self):
     return self._m_runner_status["exitcode"]
 
+  @property
+  def spans(self):
+    """The phases of the finished run, each one is a dict with keys
+    'name', 'start', 'end' in seconds since the epoch and 'args'.
+
+    Phases are 'fetch_input', 'hook_begin', 'execute' of each attempt,
+    'hook_end' and 'publish' which saves the output into the context.
+    """
+    return self._m_runner_output.get("spans", [])
+
+  @property
+  def usage(self):
+    """The resource usage of the target summed over the attempts,
+    with 'max_rss' the peak of them, see 'resource_usage'.
+    None if it's not measured, e.g. for targets executed in threads.
+    """
+    status = self._m_runner_status
+    if status["cpu_user"] is None:
+      return None
+    return {key: status[key] for key in __USAGE_FIELDS__}
+
+  def _record_usage(self, usage):
+    """Add the resource usage of an attempt, see 'usage'."""
+    self._m_attempt_usage = usage
+    status = self._m_runner_status
+    total = {key: (status[key] or 0) + usage[key] for key in __USAGE_FIELDS__}
+    total["max_rss"] = max(status["max_rss"] or 0, usage["max_rss"])
+    status.update(total)
+
+  def _record_span(self, name, start, **args):
+    """Record a phase which begins at 'start' and ends now."""
+    self._m_spans.append(
+        {"name": name, "start": start, "end": time.time(), "args": args})
+
   @abc.abstractmethod
   def is_alive(self):
     """Return whether this runner is alive."""
@@ -419,21 +913,38 @@ class Runner(abc.ABC):
     """
     pass
 
-  def run(self):
-    if self._m_runner_status["start_time"] is not None:
-      raise RuntimeError("runner can only be started once")
-    self._m_runner_status["start_time"] = time.time()
+  def add_done_callback(self, callback):
+    """Attach a callable which will be invoked when run() finishes.
 
-    if self._m_context is not None:
-      input_params = self._m_context.get_input(self.name)
-    else:
-      input_params = {}
-    input_params = self._fetch_input_params(input_params)
+    Parameters
+    ----------
+    callback: callable object
+      Invoked with this runner as its only argument, in the thread/process
+      which executes run(), no matter the target succeed or not.
+    """
+    if not callable(callback):
+      raise TypeError("Parameter 'callback' must be callable object.")
+    self._m_done_callbacks.append(callback)
 
-    # Begin hooks
-    self._execute_hooks_begin(input_params)
+  def _invoke_done_callbacks(self):
+    for callback in self._m_done_callbacks:
+      try:
+        callback(self)
+      except BaseException as e:
+        logging.warning("Done callback of runner '%s' got exception %s: %s",
+            self.name, type(e), e)
+
+  def run(self):
+    try:
+      self._run()
+    finally:
+      self._invoke_done_callbacks()
+
+  def _run(self):
+    input_params = self._begin_run()
 
     # Run target
+    output_values = None
     while not self.stopped() and \
             self._m_runner_status["attempts"] < self._m_retry_limit:
       if self._m_runner_status["attempts"] > 0:
@@ -441,27 +952,70 @@ class Runner(abc.ABC):
         time.sleep(self._m_retry_interval)
       self._m_runner_status["attempts"] += 1
 
+      start = time.time()
+      self._m_attempt_usage = None
       exitcode, output_values = self._execute_target(input_params)
+      self._record_span("execute", start, exitcode=exitcode,
+                        attempt=self._m_runner_status["attempts"],
+                        usage=self._m_attempt_usage)
       if exitcode == 0:
         self._m_runner_status["exitcode"] = exitcode
         break
       elif self._m_runner_status["attempts"] >= self._m_retry_limit:
-        self._m_runner_status["elapsed_time"] = \
-            time.time() - self._m_runner_status["start_time"]
-        self._m_runner_status["exitcode"] = exitcode
+        self._end_failed_run(exitcode)
         exit(exitcode)
 
+    self._end_run(input_params, output_values)
+
+  def _begin_run(self):
+    """Record the start time and execute begin hooks.
+
+    Returns
+    -------
+    input_params: dict
+      The input parameters of the target.
+    """
+    if self._m_runner_status["start_time"] is not None:
+      raise RuntimeError("runner can only be started once")
+    start = time.time()
+    self._m_runner_status["start_time"] = start
+
+    if self._m_context is not None:
+      input_params = self._m_context.get_input(self.name)
+    else:
+      input_params = {}
+    input_params = self._fetch_input_params(input_params)
+    self._record_span("fetch_input", start)
+
+    # Begin hooks
+    self._execute_hooks_begin(input_params)
+    return input_params
+
+  def _end_failed_run(self, exitcode):
+    """Record the exit code after all attempts failed."""
+    self._m_runner_status["elapsed_time"] = \
+        time.time() - self._m_runner_status["start_time"]
+    self._m_runner_status["exitcode"] = exitcode
+    self._m_runner_output["spans"] = self._m_spans
+
+  def _end_run(self, input_params, output_values):
+    """Execute end hooks and save the output values."""
     # End hooks
     self._execute_hooks_end(input_params, output_values)
 
+    start = time.time()
+    if self._m_output_store is not None:
+      output_values = self._m_output_store.offload(output_values)
+
     if self._m_context is not None:
       try:
         self._m_context.set_output(self.name, output_values)
       except BaseException as e:
         self._m_runner_status["exitcode"] = 1
         raise e
+    self._record_span("publish", start)
 
-    self._m_runner_status["output"] = output_values
+    self._m_runner_output.update(output=output_values, spans=self._m_spans)
     self._m_runner_status["elapsed_time"] = \
         time.time() - self._m_runner_status["start_time"]
 
@@ -472,9 +1026,13 @@ class Runner(abc.ABC):
 
   def _execute_hooks_begin(self, input_params):
     for hook in self._m_hooks:
-      input_values = copy.deepcopy(input_params)
+      start = time.time()
+      input_values = utils.frozen.thaw(
+          input_params, dict(self._m_shared_values))
       try:
         ret = hook.begin(self._m_target, input_values)
+        self._record_span(
+            "hook_begin", start, hook=hook.__class__.__name__)
       except BaseException as e:
         self._m_runner_status["elapsed_time"] = \
             time.time() - self._m_runner_status["start_time"]
@@ -488,9 +1046,13 @@ class Runner(abc.ABC):
 
   def _execute_hooks_end(self, input_params, output_values):
     for hook in self._m_hooks:
-      input_values = copy.deepcopy(input_params)
-      output_values = copy.deepcopy(output_values)
+      start = time.time()
+      input_values = utils.frozen.thaw(
+          input_params, dict(self._m_shared_values))
+      output_values = utils.frozen.thaw(
+          output_values, dict(self._m_shared_values))
       ret = hook.end(self._m_target, input_values, output_values)
+      self._record_span("hook_end", start, hook=hook.__class__.__name__)
       if ret not in (0, None):
         self._m_runner_status["elapsed_time"] = \
             time.time() - self._m_runner_status["start_time"]
@@ -1,20 +1,197 @@
 from lanfang.runner.base import Runner, SharedScope
+from lanfang.runner.base import resource_usage
 
 import sys
 import os
 import subprocess
 import threading
-import time
 import signal
 import json
 import copy
 import argparse
+import asyncio
+import codecs
+import collections
+import concurrent.futures
+import itertools
+import logging
+import tempfile
+import time
 
 
 __TASK_ENV_PARAMS__ = 'TASK_RUNNER_PARAMETERS'
+__TASK_ENV_RESULT__ = 'TASK_RUNNER_RESULT_FILE'
+
+_STDOUT_CHUNK_SIZE = 1024 * 1024
+
+
+class _StdoutCapture(object):
+  """Copy the stdout data of a process to a stream,
+  and keep at most 'capture_size' bytes at the end of it.
+  """
+
+  def __init__(self, stream, encoding, capture_size=None):
+    self._m_encoding = encoding
+    self._m_capture_size = capture_size
+    self._m_chunks = collections.deque()
+    self._m_size = 0
+    self._m_truncated = False
+
+    # Write the raw bytes if the stream is encoded the same way.
+    self._m_stream = stream
+    self._m_raw_stream = None
+    self._m_decoder = None
+    if stream is not None:
+      stream_encoding = getattr(stream, "encoding", None)
+      if hasattr(stream, "buffer") and stream_encoding is not None and \
+          codecs.lookup(stream_encoding).name == codecs.lookup(encoding).name:
+        stream.flush()
+        self._m_raw_stream = stream.buffer
+      else:
+        self._m_decoder = codecs.getincrementaldecoder(encoding)()
+
+  def write(self, data):
+    if self._m_raw_stream is not None:
+      self._m_raw_stream.write(data)
+      self._m_raw_stream.flush()
+    elif self._m_decoder is not None:
+      self._m_stream.write(self._m_decoder.decode(data))
+      self._m_stream.flush()
+
+    self._m_chunks.append(data)
+    self._m_size += len(data)
+    if self._m_capture_size is None:
+      return
+    while self._m_size - len(self._m_chunks[0]) >= self._m_capture_size:
+      self._m_size -= len(self._m_chunks.popleft())
+      self._m_truncated = True
+
+  def close(self):
+    if self._m_decoder is not None:
+      self._m_stream.write(self._m_decoder.decode(b"", final=True))
+      self._m_stream.flush()
+
+  def getvalue(self):
+    """Returns the kept data and whether the data is truncated."""
+    data = b"".join(self._m_chunks)
+    truncated = self._m_truncated
+    if self._m_capture_size is not None and len(data) > self._m_capture_size:
+      data = data[len(data) - self._m_capture_size:]
+      truncated = True
+    return data.decode(self._m_encoding, errors="replace"), truncated
+
+
+class _CmdRunnerBase(Runner):
+  """The command execution shared by CmdRunner and AsyncCmdRunner."""
+
+  def __init__(self, target, *, name=None, retry=1, interval=5, daemon=None,
+                             hooks=None, context=None,
+                             stdin=None, stdout=None, stderr=None,
+                             encoding="utf-8", capture_size=8 * 1024 * 1024,
+                             capture_stdout=True, shared_server=None,
+                             **popen_kwargs):
+    if not isinstance(target, (str, list, tuple)):
+      raise TypeError("Parameter 'target' should be a string or a list.")
+
+    Runner.__init__(
+      self, target=target, name=name, retry=retry, interval=interval,
+      daemon=daemon, hooks=hooks, context=context,
+      stdin=stdin, stdout=stdout, stderr=stderr,
+      internal_scope=SharedScope.THREAD, shared_server=shared_server)
+
+    self._m_name = self.name
+    self._m_encoding = encoding
+    self._m_capture_size = capture_size
+    self._m_capture_stdout = capture_stdout
+    self._m_popen_kwargs = popen_kwargs
+    self._m_popen_kwargs.update(
+        {"stdin": stdin, "stdout": stdout, "stderr": stderr})
+
+    self._m_stop_event = threading.Event()
+    self._m_run_process = None
+
+  def _prepare_popen_kwargs(self, input_params):
+    """Get arguments of the process for an attempt.
+
+    Returns
+    -------
+    popen_kwargs: dict
+      Arguments of the process, whose stdout is a pipe if stdout
+      needs to be captured.
+
+    stdout_stream: stream
+      The stream the stdout data needs to be copied to, or None.
+
+    result_file: str
+      The file for the process to write its return value.
+    """
+    popen_kwargs = dict(self._m_popen_kwargs)
+    popen_kwargs['start_new_session'] = True
+    if "close_fds" not in popen_kwargs:
+      popen_kwargs["close_fds"] = True
 
+    # Reset stdout to get process return value.
+    stdout_stream = None
+    if not self._m_capture_stdout:
+      if popen_kwargs.get("stdout") == subprocess.PIPE:
+        popen_kwargs["stdout"] = subprocess.DEVNULL
+    else:
+      if popen_kwargs.get("stdout") in [subprocess.PIPE, subprocess.DEVNULL]:
+        stdout_stream = None
+      elif popen_kwargs.get("stdout") is None:
+        stdout_stream = sys.stdout
+      else:
+        stdout_stream = popen_kwargs.get("stdout")
+      popen_kwargs["stdout"] = subprocess.PIPE
 
-class CmdRunner(Runner, threading.Thread):
+    if "env" not in popen_kwargs:
+      popen_kwargs["env"] = copy.deepcopy(os.environ)
+    else:
+      popen_kwargs["env"] = dict(popen_kwargs["env"])
+
+    # Setup Shared Parameters
+    popen_kwargs["env"][__TASK_ENV_PARAMS__] = json.dumps(input_params)
+
+    fd, result_file = tempfile.mkstemp(prefix="task_result-", suffix=".json")
+    os.close(fd)
+    popen_kwargs["env"][__TASK_ENV_RESULT__] = result_file
+    return popen_kwargs, stdout_stream, result_file
+
+  def _load_return_value(self, result_file, capture):
+    with open(result_file, 'r', encoding=self._m_encoding) as fin:
+      result_data = fin.read().strip()
+    if len(result_data) > 0:
+      try:
+        return json.loads(result_data)
+      except BaseException as be:
+        logging.warning("Runner '%s' got invalid result file: %s",
+            self._m_name, be)
+        return {}
+
+    if capture is None:
+      return {}
+    return self._decode_stdout_value(*capture.getvalue())
+
+  def _decode_stdout_value(self, stdout_data, truncated=False):
+    stdout_data = stdout_data.strip()
+    candidates = [stdout_data.split('\n')[-1]]
+    if not truncated:
+      candidates.insert(0, stdout_data)
+    for data in candidates:
+      try:
+        return json.loads(data)
+      except BaseException as be:
+        pass
+    return {}
+
+  def _fetch_input_params(self, params):
+    return params
+
+  def stopped(self):
+    return self._m_stop_event.is_set()
+
+
+class CmdRunner(_CmdRunnerBase, threading.Thread):
   """Execute a command in an independent process
   and maintain the new created process in a thread.
 
@@ -40,6 +217,17 @@ class CmdRunner(Runner, threading.Thread):
     and is parsed as an json dump string using ecoding
     as 'encoding' specifies.
 
+  capture_size: int
+    Maximum bytes at the end of stdout kept in memory to parse the return
+    value, stdout is kept entirely if it's None. Only the last line is
+    parsed if the stdout is longer than 'capture_size'.
+
+  capture_stdout: boolean
+    Parse the return value from stdout if the command doesn't write the
+    result file. If it's False, the command inherits the stdout stream
+    directly without copying by this runner, and returns its value
+    only through the result file.
+
   popen_kwargs: dict
     Arguments which is supported by subprocess.Popen.
 
@@ -52,115 +240,327 @@ class CmdRunner(Runner, threading.Thread):
   Child process can access configuration parameters through
   the environment variable 'TASK_RUNNER_PARAMETERS',
   which is a json string.
+
+  Child process can return its value by writing a json string into
+  the file specified by the environment variable 'TASK_RUNNER_RESULT_FILE',
+  see 'dump_result'. Otherwise the return value is parsed from stdout.
   """
 
   __doc__ += "\nDocument of Runner\n" + ("-" * 20) + "\n" + Runner.__doc__
 
-  def __init__(self, target, *, name=None, retry=1, interval=5, daemon=None,
-                             hooks=None, context=None,
-                             stdin=None, stdout=None, stderr=None,
-                             encoding="utf-8", **popen_kwargs):
-    if not isinstance(target, (str, list, tuple)):
-      raise TypeError("Parameter 'target' should be a string or a list.")
-
+  def __init__(self, target, *, name=None, daemon=None, **runner_kwargs):
+    _CmdRunnerBase.__init__(
+        self, target, name=name, daemon=daemon, **runner_kwargs)
     threading.Thread.__init__(self, target=target, name=name, daemon=daemon)
 
-    Runner.__init__(
-      self, target=target, name=name, retry=retry, interval=interval,
-      daemon=daemon, hooks=hooks, context=context,
-      stdin=stdin, stdout=stdout, stderr=stderr,
-      internal_scope=SharedScope.THREAD)
-
-    self._m_name = self.name
-    self._m_encoding = encoding
-    self._m_popen_kwargs = popen_kwargs
-    self._m_popen_kwargs.update(
-        {"stdin": stdin, "stdout": stdout, "stderr": stderr})
+  def _execute_target(self, input_params):
+    popen_kwargs, stdout_stream, result_file = \
+        self._prepare_popen_kwargs(input_params)
+
+    try:
+      self._m_run_process = subprocess.Popen(self._m_target, **popen_kwargs)
+      # stop() may miss the process if it's called during spawning.
+      if self.stopped():
+        self.stop()
+
+      capture = None
+      if self._m_capture_stdout:
+        capture = _StdoutCapture(
+            stdout_stream, self._m_encoding, self._m_capture_size)
+        while True:
+          data = self._m_run_process.stdout.read1(_STDOUT_CHUNK_SIZE)
+          if len(data) == 0:
+            break
+          capture.write(data)
+        capture.close()
+
+      exitcode = self._wait_process()
+
+      for stream in [self._m_run_process.stdin,
+                     self._m_run_process.stdout,
+                     self._m_run_process.stderr]:
+        if stream is not None:
+          stream.close()
+
+      if exitcode != 0:
+        return exitcode, None
+      else:
+        return 0, self._load_return_value(result_file, capture)
+    finally:
+      os.remove(result_file)
+
+  def _wait_process(self):
+    """Wait for the process of an attempt and record its resource usage,
+    which includes the descendants it has waited for."""
+    process = self._m_run_process
+    try:
+      _, status, rusage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+      # The process is reaped by Popen.poll, e.g. in stop().
+      return process.wait()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    self._record_usage(resource_usage(rusage))
+    return process.returncode
 
-    self._m_stop_event = threading.Event()
-    self._m_run_process = None
+  def is_alive(self):
+    return threading.Thread.is_alive(self)
 
-  def _execute_target(self, input_params):
-    popen_kwargs = self._m_popen_kwargs
-    popen_kwargs['start_new_session'] = True
-    if "close_fds" not in popen_kwargs:
-      popen_kwargs["close_fds"] = True
+  def join(self, timeout=None):
+    return threading.Thread.join(self, timeout=timeout)
 
-    # Reset stdout temporarily to get process return value.
-    if popen_kwargs.get("stdout") in [subprocess.PIPE, subprocess.DEVNULL]:
-      stdout_stream = None
-    elif popen_kwargs.get("stdout") is None:
-      stdout_stream = sys.stdout
-    else:
-      stdout_stream = popen_kwargs.get("stdout")
-    backup_stdout = popen_kwargs.get("stdout")
-    popen_kwargs["stdout"] = subprocess.PIPE
+  def stop(self):
+    self._m_stop_event.set()
+    if self._m_run_process is not None and self._m_run_process.poll() is None:
+      os.killpg(self._m_run_process.pid, signal.SIGTERM)
 
-    if "env" not in popen_kwargs:
-      popen_kwargs["env"] = copy.deepcopy(os.environ)
 
-    # Setup Shared Parameters
-    popen_kwargs["env"][__TASK_ENV_PARAMS__] = json.dumps(input_params)
+class RunnerEventLoop(object):
+  """An asyncio event loop running in a daemon thread.
 
-    self._m_run_process = subprocess.Popen(self._m_target, **popen_kwargs)
-    while self._m_run_process.stdout is None:
-      time.sleep(0.1)
+  The thread is started when the first coroutine is submitted.
+  """
 
-    stdout_lines = []
-    while True:
-      line = self._m_run_process.stdout.readline()
-      if len(line) == 0 and self._m_run_process.poll() is not None:
-        break
+  def __init__(self):
+    self._m_loop = None
+    self._m_thread = None
+    self._m_lock = threading.Lock()
+
+  def submit(self, coroutine):
+    """Schedule a coroutine in the event loop.
+
+    Returns
+    -------
+    future: concurrent.futures.Future
+      The future of the result of the coroutine.
+    """
+    with self._m_lock:
+      if self._m_loop is None:
+        self._m_loop = asyncio.new_event_loop()
+        self._m_thread = threading.Thread(
+            target=self._run_loop, name="RunnerEventLoop", daemon=True)
+        self._m_thread.start()
+      return asyncio.run_coroutine_threadsafe(coroutine, self._m_loop)
+
+  def _run_loop(self):
+    asyncio.set_event_loop(self._m_loop)
+    self._m_loop.run_forever()
+
+  async def _cancel_tasks(self):
+    # The cancelled coroutines still finish on the loop, so their
+    # futures are done and their cleanup code is executed.
+    current_task = asyncio.current_task()
+    tasks = [task for task in asyncio.all_tasks() if task is not current_task]
+    for task in tasks:
+      task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+  def close(self):
+    """Cancel the pending coroutines, then stop the event loop and its
+    thread if it's started."""
+    with self._m_lock:
+      if self._m_loop is None:
+        return
+      asyncio.run_coroutine_threadsafe(
+          self._cancel_tasks(), self._m_loop).result()
+      self._m_loop.call_soon_threadsafe(self._m_loop.stop)
+      self._m_thread.join()
+      self._m_loop.close()
+      self._m_loop = None
+      self._m_thread = None
+
+
+_default_event_loop = RunnerEventLoop()
+
+
+class AsyncCmdRunner(_CmdRunnerBase):
+  """Execute a command in an independent process
+  which is maintained by an asyncio event loop.
 
-      if len(line) > 0:
-        line = line.decode(self._m_encoding)
-        stdout_lines.append(line)
-        if stdout_stream is not None:
-          stdout_stream.write(line)
-          stdout_stream.flush()
+  All the AsyncCmdRunner sharing the same event loop are driven by one
+  thread, instead of one thread for each runner as CmdRunner does.
+  The target, parameters and return value of the command are the same
+  as CmdRunner.
 
-    popen_kwargs["stdout"] = backup_stdout
-    exitcode = self._m_run_process.poll()
+  'start' schedules the coroutine 'run_async' in the event loop, while
+  'run' executes the command in the calling thread as other runners do.
 
-    for stream in [self._m_run_process.stdin,
-                   self._m_run_process.stdout,
-                   self._m_run_process.stderr]:
-      if stream is not None:
-        stream.close()
+  Parameters
+  ----------
+  event_loop: RunnerEventLoop
+    The event loop to run the command, a loop shared by the whole
+    process is used if it's None.
+  """
 
-    if exitcode != 0:
-      return exitcode, None
-    else:
-      ret_value = self.__decode_stdout_value(stdout_lines)
-      return 0, ret_value
+  __doc__ += "\nDocument of CmdRunner\n" + ("-" * 20)
+  __doc__ += "\n" + CmdRunner.__doc__
+
+  __counter__ = itertools.count()
+
+  def __init__(self, target, *, name=None, event_loop=None, **runner_kwargs):
+    if name is None:
+      name = "AsyncCmdRunner-%d" % (next(self.__counter__))
+    _CmdRunnerBase.__init__(self, target, name=name, **runner_kwargs)
+    self._m_event_loop = event_loop
+    if self._m_event_loop is None:
+      self._m_event_loop = _default_event_loop
+    self._m_future = None
+
+  @property
+  def ident(self):
+    return None if self._m_future is None else id(self._m_future)
+
+  def start(self):
+    if self._m_future is not None:
+      raise RuntimeError("runner can only be started once")
+    self._m_future = self._m_event_loop.submit(self.run_async())
+
+  async def run_async(self):
+    """The coroutine of 'run', which is scheduled by 'start'."""
+    try:
+      await self._run_async()
+    except SystemExit:
+      pass
+    except asyncio.CancelledError:
+      logging.warning("Runner '%s' is canceled since its event loop "
+          "is closed.", self.name)
+      self.stop()
+      if self._m_runner_status["exitcode"] is None:
+        self._m_runner_status["exitcode"] = 1
+    except BaseException as e:
+      logging.warning("Runner '%s' got exception %s: %s",
+          self.name, type(e), e)
+      if self._m_runner_status["exitcode"] is None:
+        self._m_runner_status["exitcode"] = 1
+    finally:
+      self._invoke_done_callbacks()
+
+  async def _run_async(self):
+    # The context, the config and the hooks may block, keep them out of
+    # the event loop which drives the other runners.
+    loop = asyncio.get_running_loop()
+    input_params = await loop.run_in_executor(None, self._begin_run)
+
+    # Run target
+    output_values = None
+    while not self.stopped() and \
+            self._m_runner_status["attempts"] < self._m_retry_limit:
+      if self._m_runner_status["attempts"] > 0:
+        logging.info("Wait %.2f seconds", self._m_retry_interval)
+        await asyncio.sleep(self._m_retry_interval)
+      self._m_runner_status["attempts"] += 1
+
+      start = time.time()
+      self._m_attempt_usage = None
+      exitcode, output_values = await self._execute_target_async(input_params)
+      self._record_span("execute", start, exitcode=exitcode,
+                        attempt=self._m_runner_status["attempts"],
+                        usage=self._m_attempt_usage)
+      if exitcode == 0:
+        self._m_runner_status["exitcode"] = exitcode
+        break
+      elif self._m_runner_status["attempts"] >= self._m_retry_limit:
+        self._end_failed_run(exitcode)
+        return
 
-  def __decode_stdout_value(self, stdout_lines):
-    stdout_data = "".join(stdout_lines).strip()
-    for data in [stdout_data, stdout_data.split('\n')[-1]]:
-      try:
-        return json.loads(data)
-      except TypeError as te:
-        return json.loads(data.decode(self._m_encoding))
-      except BaseException as be:
-        pass
-    return {}
+    await loop.run_in_executor(
+        None, self._end_run, input_params, output_values)
 
-  def _fetch_input_params(self, params):
-    return params
+  def _execute_target(self, input_params):
+    return asyncio.run(self._execute_target_async(input_params))
+
+  async def _execute_target_async(self, input_params):
+    loop = asyncio.get_running_loop()
+    prepare = loop.run_in_executor(
+        None, self._prepare_popen_kwargs, input_params)
+    try:
+      popen_kwargs, stdout_stream, result_file = await asyncio.shield(prepare)
+    except asyncio.CancelledError:
+      # The result file is still created after being cancelled.
+      prepare.add_done_callback(_remove_result_file)
+      raise
+
+    # The same program arguments as subprocess.Popen.
+    if isinstance(self._m_target, str):
+      args = [self._m_target]
+    else:
+      args = list(self._m_target)
+    if popen_kwargs.pop("shell", False):
+      args = ["/bin/sh", "-c"] + args
+
+    async def call_blocking(func, *func_args):
+      # Writing into the stream may block, keep it out of the event loop.
+      if stdout_stream is None:
+        return func(*func_args)
+      return await loop.run_in_executor(None, func, *func_args)
+
+    try:
+      self._m_run_process = await asyncio.create_subprocess_exec(
+          *args, **popen_kwargs)
+      # stop() may miss the process if it's called during spawning.
+      if self.stopped():
+        self.stop()
+
+      capture = None
+      if self._m_capture_stdout:
+        capture = await call_blocking(_StdoutCapture,
+            stdout_stream, self._m_encoding, self._m_capture_size)
+        while True:
+          data = await self._m_run_process.stdout.read(_STDOUT_CHUNK_SIZE)
+          if len(data) == 0:
+            break
+          await call_blocking(capture.write, data)
+        await call_blocking(capture.close)
+
+      exitcode = await self._m_run_process.wait()
+      if exitcode != 0:
+        return exitcode, None
+      else:
+        return 0, await loop.run_in_executor(
+            None, self._load_return_value, result_file, capture)
+    finally:
+      os.remove(result_file)
 
   def is_alive(self):
-    return threading.Thread.is_alive(self)
+    return self._m_future is not None and not self._m_future.done()
 
   def join(self, timeout=None):
-    return threading.Thread.join(self, timeout=timeout)
+    if self._m_future is None:
+      raise RuntimeError("cannot join runner before it is started")
+    concurrent.futures.wait([self._m_future], timeout=timeout)
 
   def stop(self):
     self._m_stop_event.set()
-    if self._m_run_process is not None and self._m_run_process.poll() is None:
-      os.killpg(self._m_run_process.pid, signal.SIGTERM)
+    if self._m_run_process is not None and \
+        self._m_run_process.returncode is None:
+      try:
+        os.killpg(self._m_run_process.pid, signal.SIGTERM)
+      except ProcessLookupError:
+        pass
 
-  def stopped(self):
-    return self._m_stop_event.is_set()
+
+def _remove_result_file(future):
+  if not future.cancelled() and future.exception() is None:
+    os.remove(future.result()[2])
+
+
+def dump_result(value):
+  """Return a value from a command executed by CmdRunner.
+
+  The value is written into the result file given by the runner,
+  or printed as the last line of stdout if there's no such file.
+
+  Parameters
+  ----------
+  value: dict
+    The return value which can be serialized by json.
+  """
+  result_file = os.environ.get(__TASK_ENV_RESULT__)
+  if result_file is None:
+    print(json.dumps(value))
+    sys.stdout.flush()
+  else:
+    with open(result_file, 'w') as fout:
+      json.dump(value, fout)
 
 
 class ArgumentParser(argparse.ArgumentParser):
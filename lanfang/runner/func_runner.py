@@ -1,12 +1,18 @@
 from lanfang.runner.base import Runner, SharedScope
+from lanfang.runner.base import resource_usage
+from lanfang.runner import output_store
+from lanfang import utils
 
+import os
 import sys
 import logging
-import copy
 import inspect
 import signal
+import atexit
+import queue
 import multiprocessing
 import threading
+import resource
 
 
 class FuncRunner(Runner):
@@ -32,45 +38,76 @@ class FuncRunner(Runner):
   __doc__ += "\nDocument of Runner\n" + ("-" * 20) + "\n" + Runner.__doc__
 
   def _execute_target(self, input_params):
-    try:
-      if self._target:
-        kwargs = copy.deepcopy(input_params)
-        positional_only_args = []
-        for name, param in inspect.signature(self._target).parameters.items():
-          if param.kind == inspect.Parameter.POSITIONAL_ONLY \
-                  and param.name in input_params:
-            positional_only_args.append(kwargs.pop(param.name))
-
-        ret_value = self._target(*positional_only_args, **kwargs)
-      else:
-        ret_value = None
-      return 0, ret_value
-
-    except SystemExit as se:
-      if se.code != 0:
-        logging.warning("Runner '%s' exit with code '%d' on attempts %d/%d",
-            self._m_name, se.code, self._m_runner_status["attempts"],
-            self._m_retry_limit)
-      return se.code, None
+    if not self._target:
+      return 0, None
 
+    try:
+      kwargs = utils.frozen.thaw(input_params, dict(self._m_shared_values))
+      positional_only_args = []
+      for name, param in inspect.signature(self._target).parameters.items():
+        if param.kind == inspect.Parameter.POSITIONAL_ONLY \
+                and param.name in input_params:
+          positional_only_args.append(kwargs.pop(param.name))
     except BaseException as be:
-      logging.warning("Runner '%s' got exception %s' on attempts %d/%d: %s",
-          self._m_name, type(be),
-          self._m_runner_status["attempts"], self._m_retry_limit, be)
-      return 1, None
+      exitcode, ret_value, error = 1, None, _exception_message(be)
+    else:
+      exitcode, ret_value, error = self._invoke_target(
+          positional_only_args, kwargs)
+
+    if error is not None:
+      logging.warning("Runner '%s' %s on attempts %d/%d", self._m_name, error,
+          self._m_runner_status["attempts"], self._m_retry_limit)
+    return exitcode, ret_value
+
+  def _invoke_target(self, args, kwargs):
+    """Invoke the target, returns (exitcode, return value, error message).
+    """
+    return _invoke_target(self._target, args, kwargs)
 
   def _fetch_input_params(self, params):
-    input_params = copy.deepcopy(params)
+    # Values of the context are read-only, share them with the input.
+    input_params = dict(params)
     for param_name, param_value in zip(
             inspect.signature(self._target).parameters, self._args):
       input_params[param_name] = param_value
 
     for param_name, param_value in self._kwargs.items():
       input_params[param_name] = param_value
-    return input_params
+    return self._load_outputs(input_params)
+
+  def _load_outputs(self, input_params):
+    """Load the values of the handles in the input, see OutputStore."""
+    loaded_params = output_store.resolve(input_params)
+    # Loaded values are read-only views of the store,
+    # so they're shared instead of copied.
+    self._m_shared_values = {
+      id(value): value for name, value in loaded_params.items()
+          if value is not input_params[name]}
+    return loaded_params
 
   def stopped(self):
-    return "need_stop" in self._m_runner_status
+    return self._m_runner_status["need_stop"]
+
+
+def _exception_message(exception):
+  return "got exception %s: %s" % (type(exception), exception)
+
+
+def _invoke_target(target, args, kwargs):
+  try:
+    return 0, target(*args, **kwargs), None
+
+  except SystemExit as se:
+    error = None
+    if se.code != 0:
+      error = "exit with code '%s'" % (se.code)
+    if se.code is not None and not isinstance(se.code, int):
+      # The same as the exit status of the interpreter, e.g. sys.exit("msg")
+      return 1, None, error
+    return se.code, None, error
+
+  except BaseException as be:
+    return 1, None, _exception_message(be)
 
 
 class FuncThreadRunner(FuncRunner, threading.Thread):
@@ -150,6 +187,17 @@ class FuncProcessRunner(FuncRunner, multiprocessing.Process):
         setattr(sys, stream, stream_value)
     return FuncRunner.run(self)
 
+  def _execute_target(self, input_params):
+    # All the attempts are executed in this process.
+    before = _process_usage()
+    try:
+      return FuncRunner._execute_target(self, input_params)
+    finally:
+      after = _process_usage()
+      usage = {key: after[key] - before[key] for key in after}
+      usage["max_rss"] = after["max_rss"]
+      self._record_usage(usage)
+
   def is_alive(self):
     return multiprocessing.Process.is_alive(self)
 
@@ -159,3 +207,325 @@ class FuncProcessRunner(FuncRunner, multiprocessing.Process):
   def stop(self):
     self._m_runner_status["need_stop"] = True
     multiprocessing.Process.terminate(self)
+
+
+def _process_usage():
+  """Return the resource usage of this process and its waited children,
+  'max_rss' is the larger peak of them."""
+  usage = resource_usage(resource.getrusage(resource.RUSAGE_SELF))
+  children = resource_usage(resource.getrusage(resource.RUSAGE_CHILDREN))
+  for key, value in children.items():
+    usage[key] = max(usage[key], value) if key == "max_rss" else \
+        usage[key] + value
+  return usage
+
+
+def _stream_file(stream):
+  """Return (path, encoding) of a stream which is a file on disk."""
+  path = getattr(stream, "name", None)
+  if not isinstance(path, str) or not os.path.isfile(path):
+    return None
+  return path, getattr(stream, "encoding", None)
+
+
+def _pool_worker_main(conn, targets):
+  signal.signal(signal.SIGINT, signal.default_int_handler)
+  signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+  while True:
+    try:
+      job = conn.recv()
+    except (EOFError, OSError):
+      break
+    if job is None:
+      break
+
+    target_id, args, kwargs, stream_files, store = job
+    redirected_streams = {}
+    for stream, stream_file in stream_files.items():
+      if stream_file is None:
+        continue
+      redirected_streams[stream] = getattr(sys, stream)
+      path, encoding = stream_file
+      setattr(sys, stream, open(path, 'a', encoding=encoding))
+
+    try:
+      args = [output_store.load(arg) if output_store.is_handle(arg) else arg
+                  for arg in args]
+      result = _invoke_target(
+          targets[target_id], args, output_store.resolve(kwargs))
+      if store is not None and result[0] == 0:
+        # Large values are passed back by handles instead of the pipe.
+        result = (result[0], store.offload(result[1]), result[2])
+    finally:
+      for stream, original_stream in redirected_streams.items():
+        getattr(sys, stream).close()
+        setattr(sys, stream, original_stream)
+
+    try:
+      conn.send(result)
+    except BaseException as be:
+      # The return value can not be pickled.
+      conn.send((1, None, _exception_message(be)))
+
+
+class _PoolWorker(object):
+  """A process which executes the targets forked with it one by one."""
+
+  def __init__(self, targets):
+    self._m_conn, child_conn = multiprocessing.Pipe()
+    self._m_process = multiprocessing.Process(
+        target=_pool_worker_main, args=(child_conn, targets))
+    self._m_process.start()
+    child_conn.close()
+    self._m_num_targets = len(targets)
+
+  def knows(self, target_id):
+    return target_id < self._m_num_targets
+
+  def is_alive(self):
+    return self._m_process.is_alive()
+
+  def execute(self, target_id, args, kwargs, stream_files, store=None):
+    try:
+      self._m_conn.send((target_id, args, kwargs, stream_files, store))
+    except BaseException as be:
+      # The arguments can not be pickled, nothing has been sent.
+      return 1, None, _exception_message(be)
+
+    try:
+      return self._m_conn.recv()
+    except (EOFError, OSError):
+      self._m_process.join()
+      return self._m_process.exitcode, None, \
+          "worker process exit with code '%s'" % (self._m_process.exitcode)
+
+  def kill(self):
+    self._m_process.terminate()
+
+  def close(self, timeout=None):
+    if self._m_process.is_alive():
+      try:
+        self._m_conn.send(None)
+      except (BrokenPipeError, OSError):
+        pass
+      self._m_process.join(timeout=timeout)
+    if self._m_process.is_alive():
+      self._m_process.terminate()
+      self._m_process.join()
+    self._m_conn.close()
+
+
+class FuncWorkerPool(object):
+  """A fixed number of long-lived processes to execute callable objects.
+
+  Targets are registered in the pool before they are executed, and are
+  inherited by the worker processes when they're forked. A worker process
+  is forked when it's first needed, and is forked again if it was killed
+  or doesn't know the target, so modules imported by the targets stay
+  loaded between executions.
+
+  Parameters
+  ----------
+  size: int
+    Number of worker processes, default to be the number of CPUs.
+  """
+
+  def __init__(self, size=None):
+    self._m_size = os.cpu_count() if size is None else size
+    if self._m_size <= 0:
+      raise ValueError("Parameter 'size' must be a positive integer.")
+
+    self._m_targets = []
+    self._m_target_ids = {}
+    self._m_lock = threading.Lock()
+    self._m_idle_workers = queue.Queue()
+    for i in range(self._m_size):
+      self._m_idle_workers.put(None)
+    self._m_workers = set()
+    self._m_closed = False
+    self._m_exit_registered = False
+
+  @property
+  def size(self):
+    return self._m_size
+
+  def register(self, target):
+    """Register a target, returns the id to execute it."""
+    if not callable(target):
+      raise TypeError("Parameter 'target' must be callable object.")
+
+    with self._m_lock:
+      if id(target) not in self._m_target_ids:
+        self._m_target_ids[id(target)] = len(self._m_targets)
+        self._m_targets.append(target)
+      return self._m_target_ids[id(target)]
+
+  def acquire(self, target_id, stopped=None):
+    """Take an idle worker process which knows the target.
+
+    Parameters
+    ----------
+    target_id: int
+      Id of the target returned by 'register'.
+
+    stopped: callable object
+      Give up waiting for an idle worker if it returns True.
+
+    Returns
+    -------
+    worker: object
+      The worker process, or None if given up.
+    """
+    while True:
+      if self._m_closed:
+        raise RuntimeError("Can't operate on a closed FuncWorkerPool.")
+      if stopped is not None and stopped():
+        return None
+      try:
+        worker = self._m_idle_workers.get(timeout=0.1)
+        break
+      except queue.Empty:
+        pass
+
+    try:
+      with self._m_lock:
+        if worker is not None and \
+            (not worker.is_alive() or not worker.knows(target_id)):
+          self._m_workers.discard(worker)
+          worker.close()
+          worker = None
+
+        if worker is None:
+          if not self._m_exit_registered:
+            # Non-daemon processes are joined at exit, stop them first.
+            atexit.register(self.shutdown)
+            self._m_exit_registered = True
+          worker = _PoolWorker(list(self._m_targets))
+          self._m_workers.add(worker)
+    except BaseException as e:
+      self._m_idle_workers.put(None)
+      raise e
+    return worker
+
+  def release(self, worker):
+    """Give back a worker taken by 'acquire'."""
+    self._m_idle_workers.put(worker)
+
+  def shutdown(self, timeout=None):
+    """Stop all the worker processes."""
+    with self._m_lock:
+      self._m_closed = True
+      workers, self._m_workers = self._m_workers, set()
+      for worker in workers:
+        worker.close(timeout=timeout)
+      if self._m_exit_registered:
+        atexit.unregister(self.shutdown)
+        self._m_exit_registered = False
+
+
+class FuncPoolRunner(FuncRunner, threading.Thread):
+  """Execute a callable object in a process of a FuncWorkerPool.
+
+  The runner itself is a thread which waits for the worker process,
+  stopping the runner kills the worker process executing the target.
+
+  Parameters
+  ----------
+  worker_pool: FuncWorkerPool
+    The pool to execute the target,
+    a pool with only one process is created if it's None.
+  """
+
+  __doc__ += "\nDocument of FuncRunner\n" + ("-" * 20)
+  __doc__ += "\n" + FuncRunner.__doc__
+
+  def __init__(self, target, *, name=None, args=(), kwargs={},
+                             daemon=None, worker_pool=None, **runner_kwargs):
+    if not callable(target):
+      raise TypeError("Parameter 'target' must be callable object.")
+
+    threading.Thread.__init__(
+      self, target=target, name=name, args=args, kwargs=kwargs, daemon=daemon)
+
+    FuncRunner.__init__(
+      self, target=target, name=name, daemon=daemon,
+      internal_scope=SharedScope.THREAD, **runner_kwargs)
+
+    self._m_name = self.name
+    if worker_pool is None:
+      self._m_worker_pool = FuncWorkerPool(1)
+      self._m_own_worker_pool = True
+    else:
+      self._m_worker_pool = worker_pool
+      self._m_own_worker_pool = False
+    self._m_target_id = self._m_worker_pool.register(target)
+    self._m_worker = None
+    # Handles of the loaded input values keyed by the ids of the values.
+    self._m_handles = {}
+
+  def run(self):
+    try:
+      return FuncRunner.run(self)
+    finally:
+      if self._m_own_worker_pool:
+        self._m_worker_pool.shutdown()
+
+  def _load_outputs(self, input_params):
+    # The worker process is sent the handles and loads the values itself,
+    # instead of receiving them through the pipe. They're only loaded here
+    # for the hooks, which see the values as in FuncRunner.
+    if len(self._m_hooks) == 0:
+      return input_params
+    loaded_params = FuncRunner._load_outputs(self, input_params)
+    self._m_handles = {
+      id(value): input_params[name] for name, value in loaded_params.items()
+          if value is not input_params[name]}
+    return loaded_params
+
+  def _execute_hooks_end(self, input_params, output_values):
+    # Large values are returned by the worker process as handles, which
+    # are published as they are, the hooks see the loaded values.
+    if len(self._m_hooks) == 0:
+      return
+    loaded_values = output_store.resolve(output_values)
+    if loaded_values is not output_values:
+      self._m_shared_values.update({
+        id(value): value for name, value in loaded_values.items()
+            if value is not output_values[name]})
+    return FuncRunner._execute_hooks_end(self, input_params, loaded_values)
+
+  def _invoke_target(self, args, kwargs):
+    args = [self._m_handles.get(id(arg), arg) for arg in args]
+    kwargs = {name: self._m_handles.get(id(value), value)
+                  for name, value in kwargs.items()}
+    worker = self._m_worker_pool.acquire(
+        self._m_target_id, stopped=self.stopped)
+    if worker is None:
+      return 1, None, "stopped before execution"
+
+    self._m_worker = worker
+    try:
+      if self.stopped():
+        worker.kill()
+      stream_files = {
+        "stdout": _stream_file(self.stdout),
+        "stderr": _stream_file(self.stderr),
+      }
+      return worker.execute(self._m_target_id, args, kwargs, stream_files,
+                            store=self._m_output_store)
+    finally:
+      self._m_worker = None
+      self._m_worker_pool.release(worker)
+
+  def is_alive(self):
+    return threading.Thread.is_alive(self)
+
+  def join(self, timeout=None):
+    return threading.Thread.join(self, timeout=timeout)
+
+  def stop(self):
+    self._m_runner_status["need_stop"] = True
+    worker = self._m_worker
+    if worker is not None:
+      worker.kill()
@@ -0,0 +1,333 @@
+from lanfang.runner import output_store
+from lanfang.utils import disk
+
+import os
+import json
+import time
+import hashlib
+import inspect
+import logging
+import tempfile
+import threading
+
+
+def _canonical_json(value):
+  # No fallback for other objects, whose repr may differ between runs.
+  return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+
+def target_fingerprint(target, kwargs=None):
+  """Fingerprint of a task target.
+
+  Parameters
+  ----------
+  target: list, str, callable object
+    The target of the task. The source code is used for a callable object,
+    and the content of the files in a command is used as well.
+
+  kwargs: dict
+    Other arguments of the runner which affect the result, e.g. 'args'.
+
+  Returns
+  -------
+  fingerprint: str
+    The sha256 hexdigest of the target.
+
+  Raises
+  ------
+  TypeError
+    If the command or 'kwargs' can't be serialized into json.
+  """
+  sha256 = hashlib.sha256()
+  if callable(target):
+    target = inspect.unwrap(target)
+    sha256.update(("%s.%s" % (getattr(target, "__module__", None),
+        getattr(target, "__qualname__", repr(target)))).encode("utf-8"))
+    try:
+      sha256.update(inspect.getsource(target).encode("utf-8"))
+    except (OSError, TypeError):
+      code = getattr(target, "__code__", None)
+      if code is not None:
+        sha256.update(code.co_code)
+        sha256.update(repr(code.co_consts).encode("utf-8"))
+  else:
+    sha256.update(_canonical_json(target).encode("utf-8"))
+    arguments = target.split() if isinstance(target, str) else target
+    for argument in arguments:
+      if isinstance(argument, str) and os.path.isfile(argument):
+        sha256.update(disk.md5(argument, chunk_size=1 << 20).encode("utf-8"))
+
+  sha256.update(_canonical_json(kwargs).encode("utf-8"))
+  return sha256.hexdigest()
+
+
+def artifact_fingerprint(path, previous=None):
+  """Fingerprint of a file artifact.
+
+  The md5 value is computed only if the size or the modification time
+  of the artifact differs from 'previous'.
+
+  Parameters
+  ----------
+  path: str
+    Path of a file or a directory.
+
+  previous: dict
+    A previous fingerprint of the artifact.
+
+  Returns
+  -------
+  fingerprint: dict
+    The 'size', 'mtime' and 'md5' of the artifact, None if it's missing.
+    The size and the latest mtime of all the files are used
+    for a directory.
+  """
+  if os.path.isdir(path):
+    files = []
+    for dir_path, dir_names, file_names in os.walk(path):
+      dir_names.sort()
+      files.extend(os.path.join(dir_path, fname) for fname in file_names)
+  elif os.path.isfile(path):
+    files = [path]
+  else:
+    return None
+
+  size, mtime = 0, 0
+  for fname in files:
+    stat = os.stat(fname)
+    size += stat.st_size
+    mtime = max(mtime, stat.st_mtime_ns)
+
+  if previous is not None and previous["size"] == size and \
+      previous["mtime"] == mtime:
+    return dict(previous)
+  return {"size": size, "mtime": mtime, "md5": disk.md5(files)}
+
+
+class TaskResultCache(object):
+  """A persistent cache of task outputs, addressed by the content
+  which determines the output.
+
+  Each entry is a json file in 'cache_dir', the least recently used
+  entries are evicted when the cache exceeds its limits.
+
+  The file artifacts of an entry are checked on each lookup,
+  the entry is ignored if any of them is missing or modified,
+  or any output value saved in an OutputStore is removed.
+
+  Parameters
+  ----------
+  cache_dir: str
+    The directory to save the cache entries.
+
+  max_size: int
+    Maximum total bytes of the entries, no limit if it's None.
+
+  max_entries: int
+    Maximum number of the entries, no limit if it's None.
+  """
+
+  def __init__(self, cache_dir, *, max_size=None, max_entries=None):
+    self._m_cache_dir = cache_dir
+    if not os.path.exists(self._m_cache_dir):
+      os.makedirs(self._m_cache_dir)
+    self._m_max_size = max_size
+    self._m_max_entries = max_entries
+
+    self._m_lock = threading.Lock()
+    self._m_entries = None
+    self._m_stats = {"hits": 0, "misses": 0, "puts": 0, "evictions": 0}
+
+  @property
+  def cache_dir(self):
+    return self._m_cache_dir
+
+  def stats(self):
+    """Return the counters of hits, misses, puts and evictions."""
+    with self._m_lock:
+      return dict(self._m_stats)
+
+  def key(self, name, fingerprint, input_params, upstream_outputs,
+          upstream_artifacts=None):
+    """Compute the key of a task result.
+
+    Parameters
+    ----------
+    name: str
+      The name of the task.
+
+    fingerprint: str
+      The fingerprint of the task target, see 'target_fingerprint'.
+
+    input_params: dict
+      The input parameters of the task.
+
+    upstream_outputs: dict
+      Outputs of the dependent tasks, keyed by the task names.
+
+    upstream_artifacts: dict
+      Fingerprints of the file artifacts of the dependent tasks,
+      see 'get_entry'. Only the md5 values are used.
+
+    Returns
+    -------
+    key: str
+    """
+    upstream_hashes = {}
+    for upstream_name, output in upstream_outputs.items():
+      upstream_hashes[upstream_name] = hashlib.sha256(
+          _canonical_json(output).encode("utf-8")).hexdigest()
+
+    key_parts = [name, fingerprint, input_params, upstream_hashes]
+    if upstream_artifacts:
+      key_parts.append({
+        upstream_name: {field: fp and fp["md5"] for field, fp in
+            artifacts.items()}
+        for upstream_name, artifacts in upstream_artifacts.items()})
+    return hashlib.sha256(
+        _canonical_json(key_parts).encode("utf-8")).hexdigest()
+
+  def get(self, key):
+    """Get the cached output, or None if it's missing."""
+    entry = self.get_entry(key)
+    return None if entry is None else entry["output"]
+
+  def get_entry(self, key):
+    """Get the cached entry.
+
+    Returns
+    -------
+    entry: dict
+      A dict with the 'output' and the fingerprints of the 'artifacts'
+      keyed by the output fields, None if it's missing or any artifact
+      is changed.
+    """
+    path = self._entry_path(key)
+    try:
+      with open(path, 'r') as fin:
+        entry = json.load(fin)
+      output = entry["output"]
+      artifacts = entry.get("artifacts") or {}
+      os.utime(path)
+    except (OSError, ValueError, KeyError):
+      with self._m_lock:
+        self._m_stats["misses"] += 1
+      return None
+
+    if isinstance(output, dict) and any(
+        output_store.is_handle(value) and not output_store.exists(value)
+            for value in output.values()):
+      logging.info("Saved output of task '%s' is removed.", entry.get("name"))
+      with self._m_lock:
+        self._m_stats["misses"] += 1
+      return None
+
+    current_artifacts = {}
+    for field, fingerprint in artifacts.items():
+      current = None
+      if isinstance(output, dict) and isinstance(output.get(field), str):
+        current = artifact_fingerprint(output[field], fingerprint)
+      if (current and current["md5"]) != (fingerprint and fingerprint["md5"]):
+        logging.info("Artifact '%s' of task '%s' is changed.",
+                     field, entry.get("name"))
+        with self._m_lock:
+          self._m_stats["misses"] += 1
+        return None
+      current_artifacts[field] = current
+
+    # Save the new size and mtime to take the fast path next time.
+    if current_artifacts != artifacts:
+      self.put(key, output, name=entry.get("name"),
+               artifacts=current_artifacts)
+
+    with self._m_lock:
+      self._m_stats["hits"] += 1
+      if self._m_entries is not None and key in self._m_entries:
+        self._m_entries[key] = (time.time(), self._m_entries[key][1])
+    return {"output": output, "artifacts": current_artifacts}
+
+  def put(self, key, output, name=None, artifacts=None):
+    """Save the output of a task.
+
+    Parameters
+    ----------
+    artifacts: dict
+      Fingerprints of the file artifacts in the output,
+      keyed by the output fields, see 'artifact_fingerprint'.
+
+    Returns
+    -------
+    saved: boolean
+      False if the output can not be serialized by json.
+    """
+    try:
+      data = json.dumps(
+          {"name": name, "output": output, "artifacts": artifacts})
+    except (TypeError, ValueError) as e:
+      logging.warning("Can't cache the output of task '%s': %s", name, e)
+      return False
+
+    path = self._entry_path(key)
+    if not os.path.exists(os.path.dirname(path)):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, 'w') as fout:
+      fout.write(data)
+    os.replace(tmp_path, path)
+
+    with self._m_lock:
+      self._m_stats["puts"] += 1
+      self._load_entries()
+      self._m_entries[key] = (time.time(), len(data))
+      self._evict()
+    return True
+
+  def clear(self):
+    """Remove all the entries."""
+    with self._m_lock:
+      self._load_entries()
+      for key in list(self._m_entries):
+        self._remove_entry(key)
+
+  def _entry_path(self, key):
+    return os.path.join(self._m_cache_dir, key[:2], key + ".json")
+
+  def _load_entries(self):
+    if self._m_entries is not None:
+      return
+    self._m_entries = {}
+    for sub_dir in os.listdir(self._m_cache_dir):
+      sub_path = os.path.join(self._m_cache_dir, sub_dir)
+      if not os.path.isdir(sub_path):
+        continue
+      for fname in os.listdir(sub_path):
+        if not fname.endswith(".json"):
+          continue
+        try:
+          stat = os.stat(os.path.join(sub_path, fname))
+        except OSError:
+          continue
+        self._m_entries[fname[:-len(".json")]] = (stat.st_mtime, stat.st_size)
+
+  def _remove_entry(self, key):
+    try:
+      os.remove(self._entry_path(key))
+    except OSError:
+      pass
+    self._m_entries.pop(key, None)
+
+  def _evict(self):
+    total_size = sum(size for mtime, size in self._m_entries.values())
+    if (self._m_max_size is None or total_size <= self._m_max_size) and \
+        (self._m_max_entries is None or \
+            len(self._m_entries) <= self._m_max_entries):
+      return
+
+    for key in sorted(self._m_entries, key=lambda k: self._m_entries[k][0]):
+      if (self._m_max_size is None or total_size <= self._m_max_size) and \
+          (self._m_max_entries is None or \
+              len(self._m_entries) <= self._m_max_entries):
+        break
+      total_size -= self._m_entries[key][1]
+      self._remove_entry(key)
+      self._m_stats["evictions"] += 1
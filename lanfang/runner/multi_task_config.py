@@ -7,9 +7,15 @@ import collections
 import json
 import threading
 import copy
+import hashlib
 import logging
 
-import _jsonnet as jsonnet
+
+def _evaluate_snippet(snippet):
+  """Evaluate a jsonnet snippet, '_jsonnet' is imported on first use
+  since it's only needed by jsonnet configs."""
+  import _jsonnet
+  return _jsonnet.evaluate_snippet("snippet", snippet)
 
 
 class MultiTaskConfig(abc.ABC):
@@ -77,14 +83,33 @@ class MultiTaskConfig(abc.ABC):
   @abc.abstractmethod
   def get_config(self):
     """Get the latest configuration.
+
+    Returns
+    -------
+    config: FrozenDict
+      A read-only snapshot of the configuration, see 'utils.frozen'.
+      It's never changed, and shares the unchanged tasks with the
+      snapshots returned before.
     """
     pass
 
 
 class MultiTaskJsonnetConfig(MultiTaskConfig):
   """Jsonnet format configuration for multiple tasks.
+
+  After the outputs of some tasks are updated, only the templates refer to
+  them are resolved again, e.g. '<%= $.task.output.key %>'. The fields
+  which take a resolved value as it is are updated in place, and the config
+  is evaluated again only if other fields depend on the changed values.
+
+  The config is kept as a frozen snapshot, which is returned by
+  'get_config' without copying.
   """
 
+  # Parsed templates keyed by the hash of the file content.
+  __template_cache__ = {}
+  __template_cache_lock__ = threading.Lock()
+
   def __init__(self, config_file, fake_values=None):
     self._m_template = re.compile(r"\<\%=(.*?)\%\>")
     self._m_fake_values = fake_values
@@ -92,15 +117,19 @@ class MultiTaskJsonnetConfig(MultiTaskConfig):
     self._m_config_updated = True
     # Save all the update values
     self._m_config_output_update_values = collections.defaultdict(dict)
+    # Tasks whose outputs are updated after the config is evaluated.
+    self._m_updated_tasks = set()
+    self._m_reference_values = {}
     with open(config_file, 'r') as fin:
-      (self._m_all_params, self._m_internal_text,
-          self._m_jsonnet_text) = self._initialize(fin.read())
-      self._check_config()
+      (self._m_all_params, self._m_internal_text, self._m_jsonnet_text,
+          self._m_reference_fields) = self._load_template(fin.read())
 
     self._m_required_params = {}
+    self._m_references = {}
     for uniq_id, reg_match in self._m_all_params.items():
       template_value = reg_match.group(1).strip()
       if template_value[0] == '$':
+        self._m_references[uniq_id] = self._parse_reference(template_value)
         continue
       self._m_required_params[uniq_id] = template_value
     self._m_required_params_values = {}
@@ -157,7 +186,7 @@ class MultiTaskJsonnetConfig(MultiTaskConfig):
     self._m_lock.acquire()
     try:
       if not self._m_config_updated:
-        return copy.deepcopy(self._m_config)
+        return self._m_config
 
       missing_params = self.get_params() - set(self._m_required_params_values)
       if len(missing_params) > 0:
@@ -167,23 +196,23 @@ class MultiTaskJsonnetConfig(MultiTaskConfig):
       self._m_config_updated = False
 
       # step 1. Fetch jsonnet syntax template values.
-      snippet = ""
-      def _insert_snippet(text, snippet):
-        right_brace_idx = text.rindex('}')
-        return text[:right_brace_idx] + ", " + snippet + text[right_brace_idx:]
-
-      if self._m_config is None:
-        for param_name, param_value in self._m_required_params_values.items():
-          snippet += "local {} = {};\n".format(
-              param_name, json.dumps(param_value))
-        snippet += _insert_snippet(
-            self._m_jsonnet_text, self._m_fetcher_snippet)
-      else:
-        snippet += _insert_snippet(
-            json.dumps(self._m_config), self._m_fetcher_snippet)
-
-      refvalues = json.loads(
-          jsonnet.evaluate_snippet("snippet", snippet))[self._m_fetcher_key]
+      refvalues = self._resolve_references()
+      self._m_updated_tasks.clear()
+      if refvalues is None:
+        # The updated outputs are in the config already.
+        return self._m_config
+
+      if self._m_config is not None and self._m_reference_fields is not None:
+        changed_ids = [uniq_id for uniq_id, value in refvalues.items()
+                           if value != self._m_reference_values.get(uniq_id)]
+        if all(uniq_id in self._m_reference_fields for uniq_id in changed_ids):
+          for uniq_id in changed_ids:
+            for path in self._m_reference_fields[uniq_id]:
+              self._m_config = utils.frozen.set_in(
+                  self._m_config, path, refvalues[uniq_id])
+          self._m_reference_values = refvalues
+          return self._m_config
+      self._m_reference_values = refvalues
 
       # step 2. Generate new created dependent config.
       snippet = ""
@@ -194,15 +223,59 @@ class MultiTaskJsonnetConfig(MultiTaskConfig):
         snippet += "local {} = {};\n".format(uniq_id, json.dumps(param_value))
       snippet += self._m_internal_text
 
-      self._m_config = json.loads(jsonnet.evaluate_snippet("snippet", snippet))
+      config = json.loads(_evaluate_snippet(snippet))
 
       # step 3. Re-update all the update history values.
       for task_name, output in self._m_config_output_update_values.items():
-        self._m_config[task_name]["output"].update(output)
+        config[task_name]["output"].update(output)
+      self._m_config = utils.frozen.freeze(config)
 
     finally:
       self._m_lock.release()
-    return copy.deepcopy(self._m_config)
+    return self._m_config
+
+  def _resolve_references(self):
+    """Return the values of all the references, or None if none of them
+    is changed since last evaluation."""
+    if self._m_config is not None:
+      affected = []
+      for uniq_id, (depends, path) in self._m_references.items():
+        if depends is None or len(depends & self._m_updated_tasks) > 0:
+          affected.append(uniq_id)
+      if len(affected) == 0:
+        return None
+
+      # Simple paths are read from the config without evaluation.
+      if all(self._m_references[uniq_id][1] is not None
+                 for uniq_id in affected):
+        refvalues = dict(self._m_reference_values)
+        for uniq_id in affected:
+          task_name, key = self._m_references[uniq_id][1]
+          refvalues[uniq_id] = self._m_config[task_name]["output"][key]
+        if refvalues == self._m_reference_values:
+          return None
+        return refvalues
+
+    def _insert_snippet(text, snippet):
+      right_brace_idx = text.rindex('}')
+      return text[:right_brace_idx] + ", " + snippet + text[right_brace_idx:]
+
+    snippet = ""
+    if self._m_config is None:
+      for param_name, param_value in self._m_required_params_values.items():
+        snippet += "local {} = {};\n".format(
+            param_name, json.dumps(param_value))
+      snippet += _insert_snippet(
+          self._m_jsonnet_text, self._m_fetcher_snippet)
+    else:
+      snippet += _insert_snippet(
+          json.dumps(self._m_config), self._m_fetcher_snippet)
+
+    refvalues = json.loads(
+        _evaluate_snippet(snippet))[self._m_fetcher_key]
+    if self._m_config is not None and refvalues == self._m_reference_values:
+      return None
+    return refvalues
 
   def update_output(self, task_name, output_values):
     if not isinstance(output_values, dict):
@@ -223,11 +296,112 @@ class MultiTaskJsonnetConfig(MultiTaskConfig):
     self._m_lock.acquire()
     try:
       self._m_config_updated = True
-      self._m_config[task_name]["output"].update(output_values)
-      self._m_config_output_update_values[task_name].update(output_values)
+      self._m_updated_tasks.add(task_name)
+      output = dict(self._m_config[task_name]["output"])
+      output.update(output_values)
+      self._m_config = utils.frozen.set_in(
+          self._m_config, (task_name, "output"), output)
+      self._m_config_output_update_values[task_name].update(
+          utils.frozen.freeze(output_values))
     finally:
       self._m_lock.release()
 
+  def _load_template(self, text):
+    cache_key = (hashlib.sha256(text.encode("utf-8")).hexdigest(),
+                 repr(self._m_fake_values))
+    cls = self.__class__
+    with cls.__template_cache_lock__:
+      if cache_key in cls.__template_cache__:
+        return cls.__template_cache__[cache_key]
+
+    (self._m_all_params, self._m_internal_text,
+        self._m_jsonnet_text) = self._initialize(text)
+    self._check_config()
+    template = (self._m_all_params, self._m_internal_text,
+                self._m_jsonnet_text, self._find_reference_fields())
+    with cls.__template_cache_lock__:
+      cls.__template_cache__[cache_key] = template
+    return template
+
+  def _find_reference_fields(self):
+    """Find the fields which take the value of a reference as it is.
+
+    A reference is a candidate if it's a whole field value, and the field
+    is never accessed, e.g. by 'self.field', so nothing else depends on
+    its value. Evaluate the config with a marker string for each candidate
+    to find the paths of the fields.
+
+    Returns
+    -------
+    reference_fields: dict
+      The paths of the fields keyed by the ids of the references,
+      None if the value of any reference affects the config otherwise.
+    """
+    text = self._m_internal_text
+    words = collections.Counter(re.findall(r"\w+", text))
+    definitions = collections.Counter(
+        m.group(2) or m.group(3) for m in
+            re.finditer(r"(?:([\"'])(\w+)\1|\b(\w+))\s*:", text))
+    fields = {m.group(4): m.group(2) or m.group(3) for m in re.finditer(
+        r"(?:([\"'])(\w+)\1|\b(\w+))\s*:\s*(\w+)\s*[,}]", text)}
+    def _is_plain_field(var):
+      # The field is only defined, and never accessed.
+      return words[var] == 1 and var in fields and \
+          words[fields[var]] == definitions[fields[var]]
+
+    markers = {}
+    setting_1, setting_2 = "", ""
+    for var, reg_match in self._m_all_params.items():
+      fake_value = self._get_fake_values(reg_match.group(1).strip(), 0)
+      setting_1 += "local %s = %s;\n" % (var, json.dumps(fake_value))
+      if self._parse_reference(reg_match.group(1).strip())[1] is not None \
+          and _is_plain_field(var):
+        markers[var] = "<%%= %s %%>" % (var)
+        fake_value = markers[var]
+      setting_2 += "local %s = %s;\n" % (var, json.dumps(fake_value))
+
+    try:
+      config_1 = json.loads(
+          _evaluate_snippet(setting_1 + self._m_internal_text))
+      config_2 = json.loads(
+          _evaluate_snippet(setting_2 + self._m_internal_text))
+    except RuntimeError:
+      return None
+
+    marker_ids = {marker: var for var, marker in markers.items()}
+    reference_fields = {var: [] for var in markers}
+    def _compare(value_1, value_2, path):
+      if isinstance(value_2, str) and value_2 in marker_ids:
+        reference_fields[marker_ids[value_2]].append(path)
+        return True
+      if type(value_1) != type(value_2):
+        return False
+      if isinstance(value_2, dict):
+        return set(value_1) == set(value_2) and all(
+            _compare(value_1[k], value_2[k], path + (k,)) for k in value_2)
+      if isinstance(value_2, list):
+        return len(value_1) == len(value_2) and all(
+            _compare(v_1, v_2, path + (i,))
+                for i, (v_1, v_2) in enumerate(zip(value_1, value_2)))
+      return value_1 == value_2
+
+    if not _compare(config_1, config_2, ()):
+      return None
+    return reference_fields
+
+  def _parse_reference(self, template_value):
+    """Return the tasks a reference depends on, None if it's unknown,
+    and (task_name, key) if it's a simple path of an output value."""
+    path = re.fullmatch(
+        r"\$\.([A-Za-z_]\w*)\.output\.([A-Za-z_]\w*)", template_value)
+    if path is not None:
+      return {path.group(1)}, (path.group(1), path.group(2))
+
+    depends = re.findall(r"\$\s*\.\s*([A-Za-z_]\w*)", template_value)
+    if len(depends) != template_value.count('$'):
+      return None, None
+    return set(depends), None
+
   def _initialize(self, text):
     candidate_arguments = {} # record all possible arguments
     def record_lookup(reg_match):
@@ -242,7 +416,7 @@ class MultiTaskJsonnetConfig(MultiTaskConfig):
     for var, reg_match in candidate_arguments.items():
       fake_vars += "local %s = %s;\n" % (
           var, json.dumps(self._get_fake_values(reg_match.group(1).strip(), 0)))
-    fake_text = jsonnet.evaluate_snippet("snippet", fake_vars + candidate_text)
+    fake_text = _evaluate_snippet(fake_vars + candidate_text)
 
     arguments = {}
     for local_var, reg_match in candidate_arguments.items():
@@ -295,10 +469,8 @@ class MultiTaskJsonnetConfig(MultiTaskConfig):
       setting_2 += "local %s = %s;\n" % (var, json.dumps(
           self._get_fake_values(reg_match.group(1).strip(), 1)))
 
-    config_1 = jsonnet.evaluate_snippet(
-        "snippet", setting_1 + self._m_internal_text)
-    config_2 = jsonnet.evaluate_snippet(
-        "snippet", setting_2 + self._m_internal_text)
+    config_1 = _evaluate_snippet(setting_1 + self._m_internal_text)
+    config_2 = _evaluate_snippet(setting_2 + self._m_internal_text)
 
     output_1 = {t: p["output"] for t, p in json.loads(config_1).items()}
     for task, params in json.loads(config_2).items():
@@ -11,10 +11,23 @@ import json
 
 class RecordRunnerContext(RunnerContext):
   """Context for runner to record input/output parameters.
+
+  The input and the output of each task are saved as separate items
+  of the shared data, keyed by (task_name, "input") and
+  (task_name, "output"). So a task only fetches its own input, and
+  only its output is sent when it's set, instead of the data of
+  all the tasks.
+
+  Parameters
+  ----------
+  shared_server: SharedDataServer
+    The server to hold the recorded data, a new manager process
+    is started if it's None.
   """
 
-  def __init__(self):
-    self._m_data = SharedData(shared_scope=SharedScope.PROCESS)
+  def __init__(self, *, shared_server=None):
+    self._m_data = SharedData(
+        shared_scope=SharedScope.PROCESS, server=shared_server)
 
   def get_params(self):
     return {}
@@ -30,7 +43,7 @@ class RecordRunnerContext(RunnerContext):
 
   def get_input(self, name):
     try:
-      return self._m_data[name]["input"]
+      return self._m_data[(name, "input")]
     except KeyError as ke:
       return {}
 
@@ -38,14 +51,11 @@ class RecordRunnerContext(RunnerContext):
     if not isinstance(value, dict):
       raise TypeError("Parameter 'value' must be a dict, "
           "but received %s(%s)" % (type(value), value))
-
-    params = self._m_data.get(name, {})
-    params.update({"input": value})
-    self._m_data.update({name: params})
+    self._m_data[(name, "input")] = value
 
   def get_output(self, name):
     try:
-      return self._m_data[name]["output"]
+      return self._m_data[(name, "output")]
     except KeyError as ke:
       return {}
 
@@ -53,10 +63,28 @@ class RecordRunnerContext(RunnerContext):
     if not isinstance(value, dict):
       raise TypeError("Parameter 'value' must be a dict, "
           "but received %s(%s)" % (type(value), value))
-
-    params = self._m_data.get(name, {})
-    params.update({"output": value})
-    self._m_data.update({name: params})
+    self._m_data[(name, "output")] = value
+
+  def get_data(self, names=None):
+    """Return the input/output parameters of the tasks
+    keyed by the task names.
+
+    Parameters
+    ----------
+    names: iterable object
+      Names of the tasks to fetch, all the tasks are fetched at once
+      if it's None.
+    """
+    if names is None:
+      items = self._m_data.copy().items()
+    else:
+      items = self._m_data.get_items(
+          (name, part) for name in names for part in ["input", "output"]).items()
+
+    data = {}
+    for (name, part), value in items:
+      data.setdefault(name, {})[part] = value
+    return data
 
   def save(self, checkpoint_path, max_checkpoint_num=5):
     if checkpoint_path is None:
@@ -73,7 +101,7 @@ class RecordRunnerContext(RunnerContext):
     checkpoint_file = os.path.join(
         checkpoint_path, "record_context-{}.json".format(timestamp))
     with open(checkpoint_file, 'w') as fout:
-      json.dump(dict(self._m_data), fout, indent=2, sort_keys=True)
+      json.dump(self.get_data(), fout, indent=2, sort_keys=True)
 
     disk.keep_files_with_pattern(
         path_dir=checkpoint_path,
@@ -85,12 +113,16 @@ class RecordRunnerContext(RunnerContext):
 
   def restore(self, checkpoint_path):
     with open(checkpoint_path, 'r') as fin:
-      for task_name, params in json.load(fin).items():
-        if "input" in self._m_data:
-          self.set_input(task_name, params["input"])
+      return self.restore_data(json.load(fin))
+
+  def restore_data(self, data):
+    """Restore the input/output parameters keyed by the task names."""
+    for task_name, params in data.items():
+      if "input" in params:
+        self.set_input(task_name, params["input"])
 
-        if "output" in self._m_data:
-          self.set_output(task_name, params["output"])
+      if "output" in params:
+        self.set_output(task_name, params["output"])
     return self
 
 
@@ -101,11 +133,16 @@ class DependentRunnerContext(RecordRunnerContext):
   ----------
   task_config_file: str
     Config file path.
+
+  shared_server: SharedDataServer
+    The server to hold the shared data.
   """
 
-  def __init__(self, *, task_config_file, **params):
-    super(self.__class__, self).__init__()
+  def __init__(self, *, task_config_file, shared_server=None, **params):
+    super(self.__class__, self).__init__(shared_server=shared_server)
     self._m_config = MultiTaskConfig.create(task_config_file, **params)
+    # The config snapshot which is saved into the shared data.
+    self._m_snapshot = {}
 
   @property
   def params(self):
@@ -116,7 +153,7 @@ class DependentRunnerContext(RecordRunnerContext):
 
   def set_params(self, params):
     self._m_config.set_params(params)
-    self._m_data.update(self._m_config.get_config())
+    self._update_data(self._m_config.get_config())
 
   def set_input(self, name, value):
     raise RuntimeError(
@@ -125,7 +162,20 @@ class DependentRunnerContext(RecordRunnerContext):
 
   def set_output(self, name, value):
     self._m_config.update_output(name, value)
-    self._m_data.update(self._m_config.get_config())
+    self._update_data(self._m_config.get_config())
+
+  def _update_data(self, config):
+    # Unchanged values are shared by the snapshots, so only the changed
+    # ones are saved.
+    changes = {}
+    for task_name, params in config.items():
+      previous = self._m_snapshot.get(task_name, {})
+      for part, value in params.items():
+        if previous.get(part) is not value:
+          changes[(task_name, part)] = value
+    if len(changes) > 0:
+      self._m_data.update(changes)
+    self._m_snapshot = config
 
   def save(self, checkpoint_path, max_checkpoint_num=5):
     if checkpoint_path is None:
@@ -154,8 +204,12 @@ class DependentRunnerContext(RecordRunnerContext):
 
   def restore(self, checkpoint_path):
     with open(checkpoint_path, 'r') as fin:
-      for task_name, params in json.load(fin).items():
-        if task_name not in self._m_data:
-          raise KeyError("Can't find task '%s'" % (task_name))
+      return self.restore_data(json.load(fin))
+
+  def restore_data(self, data):
+    for task_name, params in data.items():
+      if task_name not in self._m_snapshot:
+        raise KeyError("Can't find task '%s'" % (task_name))
+      if "output" in params:
         self.set_output(task_name, params["output"])
     return self
@@ -1,10 +1,21 @@
 import copy
 import collections
+import functools
 import re
 import logging
+import heapq
 import abc
 
 
+# Characters which make a node selector a regular expression.
+_PATTERN_CHARS = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_pattern(pattern_str):
+  return re.compile(pattern_str)
+
+
 class TopologicalGraph(object):
   """Manage a bunch of nodes with topological relations.
   """
@@ -13,6 +24,11 @@ class TopologicalGraph(object):
     self._m_node_info = collections.defaultdict(dict)
     self._m_node_initial_id = 0
     self._m_is_valid = None
+    self._m_ordered_nodes = []
+    # Offspring of the nodes as bitsets, built lazily and reset by 'add'.
+    self._m_offspring_bits = None
+    self._m_node_bits = None
+    self._m_bit_nodes = None
 
   @classmethod
   def from_data(cls, nodes):
@@ -77,6 +93,7 @@ class TopologicalGraph(object):
         }
 
     self._m_is_valid = None
+    self._m_offspring_bits = None
     if self._m_node_info[node_name]["initial_id"] is None:
       self._m_node_info[node_name]["initial_id"] = self._m_node_initial_id
       self._m_node_initial_id += 1
@@ -139,15 +156,57 @@ class TopologicalGraph(object):
 
     recursive: bool
       Return all offspring if set True, otherwise return child nodes.
+
+    Returns
+    -------
+    reverse_nodes: set
+      Names of the offspring nodes.
+
+    Raises
+    ------
+    KeyError: Can't find the node.
     """
 
-    reverse_nodes = self._m_node_info[node]["reverse_depends"]
-    if recursive is True:
-      offspring = set()
-      for rn in reverse_nodes:
-        offspring |= self.reverse_depends(rn, recursive=True)
-      reverse_nodes |= offspring
-    return reverse_nodes
+    if node not in self._m_node_info:
+      raise KeyError("Cannot find node '%s'" % (node))
+    if recursive is not True:
+      return set(self._m_node_info[node]["reverse_depends"])
+
+    bits = bin(self._offspring_bits(node))[:1:-1]
+    return {self._m_bit_nodes[index] for index, bit in enumerate(bits)
+                                     if bit == '1'}
+
+  def _offspring_bits(self, node):
+    if self._m_offspring_bits is None:
+      self._m_offspring_bits = {}
+      self._m_bit_nodes = list(self._m_node_info)
+      self._m_node_bits = {
+        name: 1 << index for index, name in enumerate(self._m_bit_nodes)}
+
+    # Post-order traversal, the offspring of a node is the union of
+    # its children and their offspring, each node is computed once.
+    memo = self._m_offspring_bits
+    visiting = set()
+    stack = [node]
+    while len(stack) > 0:
+      name = stack[-1]
+      if name in memo:
+        stack.pop()
+        continue
+
+      children = self._m_node_info[name]["reverse_depends"]
+      if name not in visiting:
+        visiting.add(name)
+        stack.extend(child for child in children if child not in memo)
+        continue
+
+      # Children in a cycle are not computed yet, they are skipped.
+      bits = 0
+      for child in children:
+        bits |= self._m_node_bits[child] | memo.get(child, 0)
+      memo[name] = bits
+      stack.pop()
+    return memo[node]
 
   def is_valid(self, raises=False):
     """Evaluate the validation of this graph.
@@ -163,35 +222,43 @@ class TopologicalGraph(object):
         self._m_is_valid = False
 
       else:
-        node_info = copy.deepcopy(self._m_node_info)
+        # Assign order ids level by level, ordered by initial ids in a level.
+        in_degree = {}
+        ready_list = []
+        for name, info in self._m_node_info.items():
+          in_degree[name] = len(info["depends"])
+          if in_degree[name] == 0:
+            ready_list.append(name)
+
         cur_node_id = 0
-        while len(node_info) > 0:
-          ready_list = []
-          for name in node_info:
-            if len(node_info[name]["depends"]) == 0:
-              ready_list.append(name)
-          if len(ready_list) == 0:
-            self._m_is_valid = False
-            break
-
-          for name in sorted(
-                  ready_list, key=lambda n: node_info[n]["initial_id"]):
+        self._m_ordered_nodes = []
+        while len(ready_list) > 0:
+          next_ready_list = []
+          for name in sorted(ready_list,
+                  key=lambda n: self._m_node_info[n]["initial_id"]):
             self._m_node_info[name]["order_id"] = cur_node_id
+            self._m_ordered_nodes.append(name)
             cur_node_id += 1
-            for depend_name in node_info[name]["reverse_depends"]:
-              node_info[depend_name]["depends"].remove(name)
-            node_info.pop(name)
-
-        if self._m_is_valid is None:
-          self._m_is_valid = True
+            for depend_name in self._m_node_info[name]["reverse_depends"]:
+              in_degree[depend_name] -= 1
+              if in_degree[depend_name] == 0:
+                next_ready_list.append(depend_name)
+          ready_list = next_ready_list
+        self._m_is_valid = cur_node_id == len(self._m_node_info)
 
     if raises and not self._m_is_valid:
       raise ValueError("Current graph is not topological")
     return self._m_is_valid
 
   def __find_match_nodes(self, pattern_str):
+    # A plain name matches itself only, no need to scan all the nodes.
+    if _PATTERN_CHARS.search(pattern_str) is None:
+      if pattern_str in self._m_node_info:
+        return [self._m_node_info[pattern_str]["order_id"]]
+      return []
+
     nodes = []
-    pattern = re.compile(pattern_str)
+    pattern = _compile_pattern(pattern_str)
     for nd in self._m_node_info:
       if pattern.fullmatch(nd):
         nodes.append(self._m_node_info[nd]["order_id"])
@@ -247,13 +314,43 @@ class TopologicalGraph(object):
     return self.__find_range_nodes(node)
 
   def _parse_nodes_from_str(self, string):
+    nodes, upstream_seeds, downstream_seeds = self.__parse_selectors(string)
+    return nodes | upstream_seeds | downstream_seeds
+
+  def __parse_selectors(self, string):
     nodes = set()
+    upstream_seeds = set()
+    downstream_seeds = set()
     for seg in string.split(','):
       seg = seg.strip()
+      upstream = seg.startswith('+')
+      if upstream:
+        seg = seg[1:]
+      downstream = seg.endswith('+') and \
+          _PATTERN_CHARS.search(seg[:-1]) is None
+      if downstream:
+        seg = seg[:-1]
       if seg == "":
         continue
-      nodes |= set(self.__parse_node(seg))
-    return nodes
+
+      node_ids = self.__parse_node(seg)
+      if upstream:
+        upstream_seeds.update(node_ids)
+      if downstream:
+        downstream_seeds.update(node_ids)
+      if not upstream and not downstream:
+        nodes.update(node_ids)
+    return nodes, upstream_seeds, downstream_seeds
+
+  def __expand_closure(self, seeds, relation):
+    visited = set(seeds)
+    queue = collections.deque(seeds)
+    while len(queue) > 0:
+      for name in self._m_node_info[queue.popleft()][relation]:
+        if name not in visited:
+          visited.add(name)
+          queue.append(name)
+    return visited
 
   def subset(self, nodes):
     """Return a topological graph with a subset nodes.
@@ -278,6 +375,14 @@ class TopologicalGraph(object):
         "z" mean node 'z', node id is 25.
         So, above string mean jobs "1,2,3,4,23,24,25".
 
+      (3) "+x,y+,+z+"
+        "+x" mean node 'x' and all the nodes it depends on.
+        "y+" mean node 'y' and all the nodes depend on it.
+        "+z+" mean both of them for node 'z'.
+        A leading '+' works for any format above, but a trailing '+'
+        only works for a name or a node id, since it's a part of
+        the regular expression for a pattern.
+
     Returns
     -------
     instance: TopologicalGraph
@@ -292,20 +397,29 @@ class TopologicalGraph(object):
     if not isinstance(nodes, (list, tuple)):
       nodes = [nodes]
 
-    node_ids = []
+    node_ids = set()
+    upstream_ids = set()
+    downstream_ids = set()
     for node in nodes:
       if isinstance(node, str):
-        node_ids.extend(self._parse_nodes_from_str(node))
+        for ids, parsed_ids in zip(
+            [node_ids, upstream_ids, downstream_ids],
+            self.__parse_selectors(node)):
+          ids |= parsed_ids
       elif isinstance(node, int):
-        node_ids.append(node)
+        node_ids.add(node)
       else:
         raise ValueError("Unsupported node value type %s" % (node))
 
-    valid_nodes = []
-    for node, node_info in self._m_node_info.items():
-      if node_info["order_id"] in node_ids:
-        valid_nodes.append(node)
-    valid_nodes.sort(key=lambda t: self._m_node_info[t]["initial_id"])
+    node_names = {self._m_ordered_nodes[i] for i in node_ids
+                      if 0 <= i < len(self._m_ordered_nodes)}
+    node_names |= self.__expand_closure(
+        [self._m_ordered_nodes[i] for i in upstream_ids], "depends")
+    node_names |= self.__expand_closure(
+        [self._m_ordered_nodes[i] for i in downstream_ids], "reverse_depends")
+
+    valid_nodes = sorted(node_names,
+                         key=lambda t: self._m_node_info[t]["initial_id"])
 
     valid_nodes_set = set(valid_nodes)
     valid_nodes_depends = []
@@ -331,33 +445,52 @@ class DynamicGraph(abc.ABC):
 
 
 class DynamicTopologicalGraph(TopologicalGraph, DynamicGraph):
+  """Topological graph which fetches ready nodes dynamically.
+
+  Every node keeps a counter of its dependent nodes which are not removed.
+  Removing a node decreases the counters of its reverse dependent nodes,
+  and the nodes whose counter drops to zero are pushed into a heap
+  ordered by 'order_id'.
+  """
+
   def __init__(self):
     super(self.__class__, self).__init__()
 
-    self._m_is_latest = False # keep track of current status
     self._m_remove_nodes = set()
-    self._m_ready_nodes = []
+    self._m_in_degree = None # built lazily when the graph is complete
+    self._m_ready_heap = []
+    self._m_ready_nodes = set()
+
+  def add(self, node_name, depends=None):
+    TopologicalGraph.add(self, node_name, depends)
+    self._m_in_degree = None
+
+  def depends(self, node_name):
+    """Get dependent nodes which are not removed yet.
+    """
+    return TopologicalGraph.depends(self, node_name) - self._m_remove_nodes
 
   def remove(self, node):
-    self.is_valid(raises=True)
+    self._update_queue()
     if node not in self._m_node_info:
       raise ValueError("node '%s' does not exist" % node)
 
     if node in self._m_remove_nodes:
       raise ValueError("node '%s' was deleted already" % node)
 
-    if len(self._m_node_info[node]["depends"]) > 0:
+    if self._m_in_degree[node] > 0:
+      depends = self.depends(node)
       raise ValueError("node '%s' depends to %d nodes, including %s" % (
-          node, len(self._m_node_info[node]["depends"]),
-          ",".join(self._m_node_info[node]["depends"])))
+          node, len(depends), ",".join(depends)))
 
     self._m_remove_nodes.add(node)
-    if node in self._m_ready_nodes:
-      self._m_ready_nodes.remove(node)
+    self._m_ready_nodes.discard(node)
+    self._m_in_degree.pop(node)
 
     for depend_node in self._m_node_info[node]["reverse_depends"]:
-      self._m_node_info[depend_node]["depends"].remove(node)
-    self._m_is_latest = False
+      self._m_in_degree[depend_node] -= 1
+      if self._m_in_degree[depend_node] == 0:
+        self._push_ready_node(depend_node)
 
   def top(self, max_nodes_num=-1):
     """Fetch max_nodes_num of ready nodes.
@@ -369,23 +502,46 @@ class DynamicTopologicalGraph(TopologicalGraph, DynamicGraph):
     """
 
     self._update_queue()
+    heap = self._m_ready_heap
+    # Removed nodes are dropped from the heap lazily.
+    while len(heap) > 0 and heap[0][1] not in self._m_ready_nodes:
+      heapq.heappop(heap)
+    if len(heap) > 2 * len(self._m_ready_nodes):
+      heap[:] = [item for item in heap if item[1] in self._m_ready_nodes]
+      heapq.heapify(heap)
+
     if max_nodes_num < 0:
-      return self._m_ready_nodes[:]
-    return self._m_ready_nodes[:max_nodes_num]
+      ready_items = sorted(heap)
+    else:
+      # Visit the heap tree in order until enough ready nodes are found.
+      ready_items = []
+      candidates = [(heap[0], 0)] if len(heap) > 0 else []
+      while len(candidates) > 0 and len(ready_items) < max_nodes_num:
+        item, index = heapq.heappop(candidates)
+        if item[1] in self._m_ready_nodes:
+          ready_items.append(item)
+        for child in (2 * index + 1, 2 * index + 2):
+          if child < len(heap):
+            heapq.heappush(candidates, (heap[child], child))
+    return [node for order_id, node in ready_items
+                 if node in self._m_ready_nodes]
+
+  def _push_ready_node(self, node):
+    heapq.heappush(
+        self._m_ready_heap, (self._m_node_info[node]["order_id"], node))
+    self._m_ready_nodes.add(node)
 
   def _update_queue(self):
-    if self._m_is_valid is not None and self._m_is_latest:
+    if self._m_in_degree is not None:
       return
     self.is_valid(raises=True)
 
-    ready_nodes_set = set(self._m_ready_nodes)
-    new_ready_nodes = []
-    for node in self._m_node_info:
-      if len(self._m_node_info[node]["depends"]) == 0 \
-          and node not in self._m_remove_nodes \
-          and node not in ready_nodes_set:
-        new_ready_nodes.append(node)
-    new_ready_nodes.sort(key=lambda n: self._m_node_info[n]["order_id"])
-    self._m_ready_nodes.extend(new_ready_nodes)
-    self._m_is_latest = True
-
+    self._m_in_degree = {}
+    self._m_ready_heap = []
+    self._m_ready_nodes = set()
+    for node, node_info in self._m_node_info.items():
+      if node in self._m_remove_nodes:
+        continue
+      self._m_in_degree[node] = len(node_info["depends"] - self._m_remove_nodes)
+      if self._m_in_degree[node] == 0:
+        self._push_ready_node(node)
@@ -0,0 +1,156 @@
+import os
+import json
+import logging
+import tempfile
+
+
+class CheckpointJournal(object):
+  """An append-only journal of the task status and context.
+
+  Each change is appended to 'journal.jsonl' as a json line, and the
+  lines are merged into 'journal_snapshot.json' when the journal grows
+  larger than the snapshot. The state is the snapshot with all the
+  lines replayed in order.
+
+  Parameters
+  ----------
+  checkpoint_path: str
+    The directory to save the journal.
+
+  compact_size: int
+    Minimum number of lines to compact the journal.
+
+  sync: boolean
+    Call os.fsync after each append if it's True.
+  """
+
+  __JOURNAL_FILE__ = "journal.jsonl"
+  __SNAPSHOT_FILE__ = "journal_snapshot.json"
+
+  def __init__(self, checkpoint_path, *, compact_size=1000, sync=True):
+    if not os.path.exists(checkpoint_path):
+      os.makedirs(checkpoint_path)
+
+    if not os.path.isdir(checkpoint_path):
+      raise IOError("Target checkpoint path '%s' is not a directory." % (
+          checkpoint_path))
+
+    self._m_checkpoint_path = checkpoint_path
+    self._m_compact_size = compact_size
+    self._m_sync = sync
+    self._m_journal_file = os.path.join(
+        checkpoint_path, self.__JOURNAL_FILE__)
+    self._m_snapshot_file = os.path.join(
+        checkpoint_path, self.__SNAPSHOT_FILE__)
+
+    self._m_state, self._m_journal_size = self._load()
+    self._m_fout = open(self._m_journal_file, 'a')
+
+  @classmethod
+  def exists(cls, checkpoint_path):
+    """Return the latest modified time of the journal,
+    None if there is no journal."""
+    mtimes = []
+    for fname in [cls.__JOURNAL_FILE__, cls.__SNAPSHOT_FILE__]:
+      path = os.path.join(checkpoint_path, fname)
+      if os.path.isfile(path):
+        mtimes.append(os.path.getmtime(path))
+    return max(mtimes) if len(mtimes) > 0 else None
+
+  @property
+  def path(self):
+    return self._m_checkpoint_path
+
+  @property
+  def params(self):
+    return self._m_state["params"]
+
+  @property
+  def tasks(self):
+    """The status and context of the tasks, keyed by the task names."""
+    return self._m_state["tasks"]
+
+  def append(self, records):
+    """Append records into the journal.
+
+    Parameters
+    ----------
+    records: list
+      Each record is either {"params": params} which resets the state,
+      or {"name": task_name, "status": task_info, "context": task_context}
+      which updates a task.
+    """
+    if len(records) == 0:
+      return
+
+    lines = []
+    for record in records:
+      lines.append(json.dumps(record, sort_keys=True) + "\n")
+      self._apply(self._m_state, record)
+    self._m_fout.write("".join(lines))
+    self._m_fout.flush()
+    if self._m_sync:
+      os.fsync(self._m_fout.fileno())
+
+    self._m_journal_size += len(lines)
+    if self._m_journal_size >= max(
+        self._m_compact_size, len(self._m_state["tasks"])):
+      self.compact()
+
+  def compact(self):
+    """Merge the journal into the snapshot."""
+    fd, tmp_path = tempfile.mkstemp(
+        dir=self._m_checkpoint_path, suffix=".tmp")
+    with os.fdopen(fd, 'w') as fout:
+      json.dump(self._m_state, fout, sort_keys=True)
+      fout.flush()
+      if self._m_sync:
+        os.fsync(fout.fileno())
+    os.replace(tmp_path, self._m_snapshot_file)
+
+    # Replaying the journal again on the new snapshot gets the same state,
+    # so it doesn't matter if the process dies before truncated.
+    self._m_fout.close()
+    self._m_fout = open(self._m_journal_file, 'w')
+    self._m_journal_size = 0
+
+  def close(self):
+    self._m_fout.close()
+
+  def _load(self):
+    state = {"params": None, "tasks": {}}
+    if os.path.isfile(self._m_snapshot_file):
+      with open(self._m_snapshot_file, 'r') as fin:
+        state = json.load(fin)
+
+    journal_size = 0
+    if os.path.isfile(self._m_journal_file):
+      valid_size = 0
+      with open(self._m_journal_file, 'rb') as fin:
+        for line in fin:
+          try:
+            if not line.endswith(b"\n"):
+              raise ValueError("Incomplete line")
+            record = json.loads(line.decode("utf-8"))
+          except ValueError:
+            # The last line may be partially written when the process died.
+            logging.warning("Drop broken journal line in '%s': %s",
+                            self._m_journal_file, line)
+            break
+          self._apply(state, record)
+          journal_size += 1
+          valid_size += len(line)
+      if valid_size < os.path.getsize(self._m_journal_file):
+        with open(self._m_journal_file, 'r+b') as fout:
+          fout.truncate(valid_size)
+    return state, journal_size
+
+  def _apply(self, state, record):
+    if "params" in record:
+      state["params"] = record["params"]
+      state["tasks"] = {}
+    else:
+      state["tasks"][record["name"]] = {
+        "status": record["status"],
+        "context": record["context"],
+      }
@@ -6,8 +6,23 @@ import time
 import abc
 
 
+def _format_bytes(size):
+  """Format a number of bytes with a binary unit, e.g. '1.5G'."""
+  for unit in ["B", "K", "M", "G"]:
+    if size < 1024:
+      return "%d%s" % (size, unit) if unit == "B" else \
+          "%.1f%s" % (size, unit)
+    size /= 1024.0
+  return "%.1fT" % (size)
+
+
 class MultiTaskProgressUI(abc.ABC):
 
+  @property
+  def update_interval(self):
+    """Seconds between two refreshes, None if no refreshing is needed."""
+    return None
+
   @abc.abstractmethod
   def display(self, reuse=True):
     pass
@@ -19,6 +34,10 @@ class MultiTaskProgressUI(abc.ABC):
 
 class MultiTaskTableProgressUI(MultiTaskProgressUI):
   """Display multiple task status as a table.
+
+  Besides the status and timing, the CPU seconds (user + sys), the peak
+  RSS and the bytes read/written of the tasks are displayed for runners
+  which measure them, see 'Runner.usage'.
   """
 
   color = {
@@ -51,11 +70,20 @@ class MultiTaskTableProgressUI(MultiTaskProgressUI):
       'task_name': min(32, max(map(len, self._m_task_names + [""]))),
       'start_time': 14, # format: mm.dd HH:MM:SS
       'elapsed_time': 8,
-      'attempts': 3
+      'attempts': 3,
+      'cpu_time': 8,
+      'max_rss': 7,
+      'io_bytes': 15, # format: read/write
     }
-    self._m_row_separator = '-' * (sum(self._m_column_length.values()) + 26)
+    self._m_row_separator = '-' * (sum(self._m_column_length.values()) + 35)
     self._m_last_update = 0
 
+  @property
+  def update_interval(self):
+    if not self._m_dynamic_display:
+      return None
+    return self._m_update_interval
+
   def display(self, reuse=True):
     if not self._m_dynamic_display:
       return
@@ -118,7 +146,20 @@ class MultiTaskTableProgressUI(MultiTaskProgressUI):
       attempts_info = "{}/{}".format(*task_info["attempts"])
       task_str += " | " + attempts_info.ljust(self._m_column_length['attempts'])
 
-    # column 7. Task Depends.
+      # column 7-9. Resource Usage.
+      usage = task_info.get("usage")
+      if usage is None:
+        cpu_time = max_rss = io_bytes = "-"
+      else:
+        cpu_time = "%.2f" % (usage["cpu_user"] + usage["cpu_sys"])
+        max_rss = _format_bytes(usage["max_rss"])
+        io_bytes = "%s/%s" % (_format_bytes(usage["read_bytes"]),
+                              _format_bytes(usage["write_bytes"]))
+      task_str += " | " + cpu_time.ljust(self._m_column_length['cpu_time'])
+      task_str += " | " + max_rss.ljust(self._m_column_length['max_rss'])
+      task_str += " | " + io_bytes.ljust(self._m_column_length['io_bytes'])
+
+    # column 10. Task Depends.
     if task_info["status"] in [RunnerStatus.WAITING, RunnerStatus.CANCELED]:
       if task_name not in self._m_unrelated_tasks:
         depends = self._m_runner_dependency.depends(task_name)
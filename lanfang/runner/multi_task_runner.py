@@ -1,13 +1,23 @@
 from lanfang.runner.base import RunnerStatus
+from lanfang.runner.base import SharedDataServer
 from lanfang.runner.cmd_runner import CmdRunner
+from lanfang.runner.cmd_runner import AsyncCmdRunner
+from lanfang.runner.cmd_runner import RunnerEventLoop
+from lanfang.runner.func_runner import FuncRunner
 from lanfang.runner.func_runner import FuncProcessRunner
+from lanfang.runner.func_runner import FuncPoolRunner
+from lanfang.runner.func_runner import FuncWorkerPool
+from lanfang.runner.remote_runner import RemoteRunner
 from lanfang.runner.multi_task_progress_ui import MultiTaskTableProgressUI
 from lanfang.runner.multi_task_dependency import DynamicTopologicalGraph
 from lanfang.runner.multi_task_context import RecordRunnerContext
 from lanfang.runner.multi_task_context import DependentRunnerContext
+from lanfang.runner.multi_task_cache import target_fingerprint
+from lanfang.runner.multi_task_cache import artifact_fingerprint
+from lanfang.runner.multi_task_journal import CheckpointJournal
+from lanfang.runner import multi_task_trace
 from lanfang.utils import disk
 
-import time
 import signal
 import os
 import sys
@@ -16,21 +26,171 @@ import copy
 import json
 import logging
 import datetime
+import time
 import hashlib
 import threading
 import functools
+import multiprocessing
+import multiprocessing.connection
 
 
 class MultiTaskManager(object):
   pass
 
 
+def _use_journal(checkpoint_path):
+  """Whether the journal in 'checkpoint_path' is newer than the snapshots."""
+  if not os.path.isdir(checkpoint_path):
+    return False
+  journal_mtime = CheckpointJournal.exists(checkpoint_path)
+  all_checkpoints_file = os.path.join(checkpoint_path, "all_checkpoints.json")
+  return journal_mtime is not None and (
+      not os.path.isfile(all_checkpoints_file) or
+      journal_mtime >= os.path.getmtime(all_checkpoints_file))
+
+
 class Scheduler(object):
-  pass
+  """Decide the order to start ready tasks.
+
+  MultiTaskRunner calls 'prepare' once before running a bunch of tasks,
+  then starts the ready tasks in the order returned by 'sort'.
+  The default scheduler keeps the topological order.
+  """
+
+  def prepare(self, dependency, runner_inventory):
+    """Prepare for scheduling the tasks of a run.
+
+    Parameters
+    ----------
+    dependency: TopologicalGraph
+      The dependent relations of the tasks to run.
+
+    runner_inventory: RunnerInventory
+      The inventory which holds the runners of the tasks.
+    """
+    pass
+
+  def sort(self, tasks):
+    """Sort ready tasks by the order to start.
+
+    Parameters
+    ----------
+    tasks: list
+      Ready tasks in topological order.
+
+    Returns
+    -------
+    tasks: list
+      Tasks in the order to start.
+    """
+    return list(tasks)
 
 
 class ParallelScheduler(Scheduler):
-  pass
+  """Start the ready tasks on the longest remaining path first.
+
+  The priority of a task is the estimated cost of itself plus the
+  heaviest chain of its offspring, so that long chains get started early
+  when 'parallel_degree' limits the simultaneously running tasks, which
+  shortens the total time of the run.
+
+  Costs are estimated by elapsed time of previous runs, which are
+  recorded by the runner inventory, restored from checkpoints
+  or given explicitly.
+
+  Parameters
+  ----------
+  costs: dict
+    Estimated running seconds of tasks, which take precedence over
+    the elapsed time recorded by runner inventory.
+
+  default_cost: float
+    Cost of tasks without any estimation. Default to be the mean of
+    known costs, or 1.0 if nothing is known.
+  """
+
+  def __init__(self, costs=None, *, default_cost=None):
+    self._m_costs = {} if costs is None else dict(costs)
+    self._m_default_cost = default_cost
+    self._m_priority = {}
+    self._m_order_id = {}
+
+  @classmethod
+  def from_checkpoint(cls, checkpoint_path, **kwargs):
+    """Create a scheduler with the elapsed time saved in a checkpoint.
+
+    Parameters
+    ----------
+    checkpoint_path: str
+      The checkpoint directory or the 'all_checkpoints.json' file
+      saved by MultiTaskRunner.save. The journal is used if it's newer
+      than the snapshots in the directory, see MultiTaskRunner.restore.
+
+    kwargs: dict
+      Other arguments of ParallelScheduler, explicit 'costs' override
+      the ones from the checkpoint.
+
+    Returns
+    -------
+    scheduler: ParallelScheduler
+    """
+    if _use_journal(checkpoint_path):
+      journal = CheckpointJournal(checkpoint_path)
+      journal.close()
+      runner_status = {
+        name: task["status"] for name, task in journal.tasks.items()}
+    else:
+      if os.path.isfile(checkpoint_path):
+        all_checkpoints_file = checkpoint_path
+      else:
+        all_checkpoints_file = os.path.join(
+            checkpoint_path, "all_checkpoints.json")
+
+      with open(all_checkpoints_file, 'r') as fin:
+        checkpoints_record = json.load(fin)
+      checkpoint_info = checkpoints_record[checkpoints_record["checkpoint"]]
+      with open(checkpoint_info["runner_inventory"], 'r') as fin:
+        runner_status = json.load(fin)
+
+    costs = {}
+    for name, task_status in runner_status.items():
+      if task_status["elapsed_time"] is not None:
+        costs[name] = task_status["elapsed_time"]
+    costs.update(kwargs.pop("costs", None) or {})
+    return cls(costs, **kwargs)
+
+  def prepare(self, dependency, runner_inventory):
+    nodes = dependency.get_nodes(order=True)
+    costs = {}
+    for name in nodes:
+      if name in self._m_costs:
+        costs[name] = self._m_costs[name]
+      elif runner_inventory is not None:
+        costs[name] = runner_inventory.get_info(name)["elapsed_time"]
+
+    default_cost = self._m_default_cost
+    if default_cost is None:
+      known_costs = [c for c in costs.values() if c is not None]
+      if len(known_costs) > 0:
+        default_cost = sum(known_costs) / len(known_costs)
+      else:
+        default_cost = 1.0
+
+    self._m_priority = {}
+    self._m_order_id = {}
+    for order_id, name in enumerate(nodes):
+      self._m_order_id[name] = order_id
+    for name in reversed(nodes):
+      cost = costs.get(name)
+      if cost is None:
+        cost = default_cost
+      children = dependency.reverse_depends(name)
+      self._m_priority[name] = cost + max(
+          [self._m_priority[child] for child in children], default=0)
+
+  def sort(self, tasks):
+    return sorted(tasks, key=lambda name: (
+        -self._m_priority[name], self._m_order_id[name]))
 
 
 class PipelineScheduler(Scheduler):
@@ -51,14 +211,78 @@ class RunnerLogs(object):
 
 class RunnerInventory(object):
   """Record a batch of tasks.
+
+  Parameters
+  ----------
+  shared_server: SharedDataServer
+    The server to hold the data which runners share between processes.
+    A new server is created and owned by this inventory if it's None,
+    all the runners in the inventory register into the same server.
+
+  pool_size: int
+    Execute callable targets by FuncPoolRunner in a pool of 'pool_size'
+    processes if it's set, otherwise each one in a new FuncProcessRunner.
+
+  worker_pool: FuncWorkerPool
+    The pool used by FuncPoolRunner, a new pool is created and owned
+    by this inventory if it's None.
+
+  use_asyncio: boolean
+    Execute command targets by AsyncCmdRunner if it's True,
+    otherwise by CmdRunner.
+
+  event_loop: RunnerEventLoop
+    The event loop used by AsyncCmdRunner, a new one is created and owned
+    by this inventory if it's None.
+
+  output_store: OutputStore
+    The store to save large output values of the callable targets.
+
+  remote_worker_pool: RemoteWorkerPool
+    Execute all the targets by RemoteRunner on the worker agents of
+    the pool if it's set.
   """
 
   def __init__(self, *, context=None,
                         log_path=None,
                         log_mode='w+',
                         retry=1,
-                        interval=5):
+                        interval=5,
+                        shared_server=None,
+                        pool_size=None,
+                        worker_pool=None,
+                        use_asyncio=False,
+                        event_loop=None,
+                        output_store=None,
+                        remote_worker_pool=None):
     self._m_context = context
+    self._m_output_store = output_store
+    self._m_remote_worker_pool = remote_worker_pool
+    self._m_pool_size = pool_size
+    self._m_use_asyncio = use_asyncio
+
+    if worker_pool is None:
+      # No process is forked until a FuncPoolRunner executes its target.
+      self._m_worker_pool = FuncWorkerPool(pool_size)
+      self._m_own_worker_pool = True
+    else:
+      self._m_worker_pool = worker_pool
+      self._m_own_worker_pool = False
+
+    if event_loop is None:
+      # The thread of the loop is started when a runner is started.
+      self._m_event_loop = RunnerEventLoop()
+      self._m_own_event_loop = True
+    else:
+      self._m_event_loop = event_loop
+      self._m_own_event_loop = False
+
+    if shared_server is None:
+      self._m_shared_server = SharedDataServer()
+      self._m_own_shared_server = True
+    else:
+      self._m_shared_server = shared_server
+      self._m_own_shared_server = False
 
     self._m_log_path = log_path
     if self._m_log_path is not None and not os.path.exists(self._m_log_path):
@@ -75,12 +299,27 @@ class RunnerInventory(object):
     self._m_closed = False
     self._m_restored_data = {}
 
+    # Names of the runners ordered by the sequence of their last change.
+    self._m_change_seq = 0
+    self._m_changes = collections.OrderedDict()
+
+    # Runners which are not processes notify their termination through
+    # this pipe, processes are waited on their sentinels directly.
+    self._m_done_reader, self._m_done_writer = multiprocessing.Pipe(
+        duplex=False)
+    self._m_done_lock = threading.Lock()
+    self._m_done_names = set()
+
   def __enter__(self):
     return self
 
   def __exit__(self, err_type, err_val, err_tb):
     self.close()
 
+  @property
+  def shared_server(self):
+    return self._m_shared_server
+
   def list(self):
     return list(self._m_inventory.keys())
 
@@ -100,11 +339,21 @@ class RunnerInventory(object):
         if self._m_runners[name]["runner"].is_alive():
           self._m_runners[name]["runner"].stop()
           self._m_runners[name]["status"] = RunnerStatus.KILLED
+          self._mark_changed(name)
 
       for log_file in self._m_log_files:
         log_file.close()
         if os.path.getsize(log_file.name) == 0:
           os.remove(log_file.name)
+      if self._m_own_worker_pool:
+        self._m_worker_pool.shutdown()
+      # The runners cancelled by closing the loop still notify the pipe.
+      if self._m_own_event_loop:
+        self._m_event_loop.close()
+      self._m_done_reader.close()
+      self._m_done_writer.close()
+      if self._m_own_shared_server:
+        self._m_shared_server.shutdown()
       self._m_closed = True
 
     finally:
@@ -132,17 +381,30 @@ class RunnerInventory(object):
     return status_file
 
   def restore(self, checkpoint_path):
-    self._m_lock.acquire()
     try:
       with open(checkpoint_path, 'r') as fin:
-        for name, task_status in json.load(fin).items():
-          if name not in self._m_runners:
-            raise KeyError("Can't find task '%s'" % (name))
-          self._m_runners[name]["status"] = RunnerStatus[task_status["status"]]
-          self._m_restored_data[name] = task_status
+        self.restore_status(json.load(fin))
     except BaseException as e:
       logging.warning("Restore from checkpoint '%s' got exception: %s.",
           checkpoint_path, e)
+    return self
+
+  def restore_status(self, status):
+    """Restore the status of the runners.
+
+    Parameters
+    ----------
+    status: dict
+      The information of the runners keyed by the names, see 'get_info'.
+    """
+    self._m_lock.acquire()
+    try:
+      for name, task_status in status.items():
+        if name not in self._m_runners:
+          raise KeyError("Can't find task '%s'" % (name))
+        self._m_runners[name]["status"] = RunnerStatus[task_status["status"]]
+        self._m_restored_data[name] = task_status
+        self._mark_changed(name)
     finally:
       self._m_lock.release()
     return self
@@ -170,7 +432,14 @@ class RunnerInventory(object):
         log_path=log_path,
         log_mode=self._m_log_mode,
         retry=self._m_retry,
-        interval=self._m_interval)
+        interval=self._m_interval,
+        shared_server=self._m_shared_server,
+        pool_size=self._m_pool_size,
+        worker_pool=self._m_worker_pool,
+        use_asyncio=self._m_use_asyncio,
+        event_loop=self._m_event_loop,
+        output_store=self._m_output_store,
+        remote_worker_pool=self._m_remote_worker_pool)
 
     for name, (target, runner_class, kwargs) in self._m_inventory.items():
       inventory.add(name, target, runner_class=runner_class, **kwargs)
@@ -226,29 +495,93 @@ class RunnerInventory(object):
       if "interval" not in kwargs:
         kwargs["interval"] = self._m_interval
 
-      runner = self._get_runner_class(runner_class, target)(
-          target, name=name, context=self._m_context, **kwargs)
+      runner = self._create_runner(name)
       self._m_runners[runner.name] = {
         "status": RunnerStatus.WAITING,
         "runner": runner,
+        "ready_time": None,
+        "queue": None,
       }
     finally:
       self._m_lock.release()
     return self
 
+  def _create_runner(self, name):
+    target, runner_class, kwargs = self._m_inventory[name]
+    runner_class = self._get_runner_class(runner_class, target)
+    if issubclass(runner_class, FuncPoolRunner) and "worker_pool" not in kwargs:
+      kwargs = dict(kwargs, worker_pool=self._m_worker_pool)
+    if issubclass(runner_class, RemoteRunner) and "worker_pool" not in kwargs:
+      kwargs = dict(kwargs, worker_pool=self._m_remote_worker_pool)
+    if issubclass(runner_class, AsyncCmdRunner) and "event_loop" not in kwargs:
+      kwargs = dict(kwargs, event_loop=self._m_event_loop)
+    if issubclass(runner_class, FuncRunner) and \
+        self._m_output_store is not None and "output_store" not in kwargs:
+      kwargs = dict(kwargs, output_store=self._m_output_store)
+    runner = runner_class(target, name=name, context=self._m_context,
+                          shared_server=self._m_shared_server, **kwargs)
+    if not isinstance(runner, multiprocessing.Process):
+      runner.add_done_callback(self._notify_done)
+    return runner
+
+  def _notify_done(self, runner):
+    with self._m_done_lock:
+      # At most one pending wakeup message exists in the pipe.
+      if len(self._m_done_names) == 0 and not self._m_closed:
+        self._m_done_writer.send_bytes(b"")
+      self._m_done_names.add(runner.name)
+
   def status(self, name):
     return self._m_runners[name]["status"]
 
+  def get_target(self, name):
+    """Return the target, runner class and other arguments of a runner."""
+    target, runner_class, kwargs = self._m_inventory[name]
+    return target, runner_class, dict(kwargs)
+
   def update_status(self, name, status):
     self._m_lock.acquire()
     try:
       if self._m_closed:
         raise RuntimeError(
             "Can't operate on a closed RunnerInventory instance.")
-      self._m_runners[name]["status"] = status
+      if self._m_runners[name]["status"] != status:
+        self._m_runners[name]["status"] = status
+        self._mark_changed(name)
+        if status == RunnerStatus.READY:
+          self._m_runners[name]["ready_time"] = time.time()
     finally:
       self._m_lock.release()
 
+  def changes(self, since=0):
+    """Return the runners whose status changed after a sequence number.
+
+    Parameters
+    ----------
+    since: int
+      A sequence number returned before, 0 to get all the changed runners.
+
+    Returns
+    -------
+    names: list
+      Names of the changed runners, the latest changed first.
+
+    sequence: int
+      The current sequence number.
+    """
+    with self._m_lock:
+      names = []
+      for name in reversed(self._m_changes):
+        if self._m_changes[name] <= since:
+          break
+        names.append(name)
+      return names, self._m_change_seq
+
+  def _mark_changed(self, name):
+    self._m_change_seq += 1
+    self._m_changes[name] = self._m_change_seq
+    self._m_changes.move_to_end(name)
+
   def start(self, name, recreate_if_necessary=False):
     self._m_lock.acquire()
     try:
@@ -263,12 +596,16 @@ class RunnerInventory(object):
           raise RuntimeError("Can't recreate a new runner "
               "since previous runner is alive for '%s'" % (name))
         else:
-          target, runner_class, kwargs = self._m_inventory[name]
-          runner_class = self._get_runner_class(runner_class, target)
-          self._m_runners[name]["runner"] = runner_class(
-              target, name=name, context=self._m_context, **kwargs)
+          self._m_runners[name]["runner"] = self._create_runner(name)
+
+      # Time from being ready to being started.
+      start_time = time.time()
+      ready_time = self._m_runners[name]["ready_time"]
+      self._m_runners[name]["queue"] = (ready_time or start_time, start_time)
+      self._m_runners[name]["ready_time"] = None
 
       self._m_runners[name]["status"] = RunnerStatus.RUNNING
+      self._mark_changed(name)
       self._m_runners[name]["runner"].start()
     finally:
       self._m_lock.release()
@@ -278,6 +615,61 @@ class RunnerInventory(object):
       return False
     return self._m_runners[name]["runner"].is_alive()
 
+  def wait(self, names, timeout=None):
+    """Wait until at least one of the runners terminates.
+
+    Parameters
+    ----------
+    names: iterable object
+      Names of the runners to wait for.
+
+    timeout: float
+      Return after 'timeout' seconds even if no runner terminates,
+      wait forever if None.
+
+    Returns
+    -------
+    finished: set
+      Names of the terminated runners.
+    """
+    names = set(names)
+    # Only prune the terminated runners, the notified ones which are still
+    # returning from run() are joined below.
+    self._take_done_names(set())
+    finished = {name for name in names if not self.is_alive(name)}
+    if len(finished) > 0 or len(names) == 0:
+      return finished
+
+    with self._m_done_lock:
+      notified = len(self._m_done_names & names) > 0
+
+    if not notified:
+      handles = [self._m_done_reader]
+      for name in names:
+        runner = self._m_runners[name]["runner"]
+        if isinstance(runner, multiprocessing.Process):
+          handles.append(runner.sentinel)
+      multiprocessing.connection.wait(handles, timeout=timeout)
+
+    done_names = self._take_done_names(names)
+    for name in done_names:
+      # The runner is returning from run(), it won't take long.
+      self._m_runners[name]["runner"].join()
+    return {name for name in names if not self.is_alive(name)}
+
+  def _take_done_names(self, names):
+    """Remove the notified runners in 'names', as well as the notified
+    runners which have terminated, since the caller may never wait for
+    them again. The wakeup message is consumed once none is left.
+    """
+    with self._m_done_lock:
+      done_names = self._m_done_names & names
+      self._m_done_names = {name for name in self._m_done_names - done_names
+                                 if self.is_alive(name)}
+      if len(self._m_done_names) == 0 and self._m_done_reader.poll():
+        self._m_done_reader.recv_bytes()
+    return done_names
+
   def exitcode(self, name):
     if name in self._m_restored_data:
       return self._m_restored_data[name]["exitcode"]
@@ -291,30 +683,135 @@ class RunnerInventory(object):
       elapsed_time = runner.elapsed_time
       attempts = runner.attempts
       exitcode = runner.exitcode
+      usage = runner.usage
     else:
       start_time = self._m_restored_data[name]["start_time"]
       elapsed_time = self._m_restored_data[name]["elapsed_time"]
       attempts = self._m_restored_data[name]["attempts"]
       exitcode = self._m_restored_data[name]["exitcode"]
+      # Checkpoints saved by earlier versions have no usage.
+      usage = self._m_restored_data[name].get("usage")
 
     return {
       "status": status,
       "exitcode": exitcode,
       "start_time": start_time,
       "elapsed_time": elapsed_time,
-      "attempts": attempts
+      "attempts": attempts,
+      "usage": usage
     }
 
+  def get_spans(self, name):
+    """Return the timing of the phases of the last run of a runner.
+
+    Besides the phases of the runner, see 'Runner.spans', 'queue' is the
+    time from being ready to being started, and 'spawn' is the time from
+    being started to running in its own thread or process.
+
+    Returns
+    -------
+    spans: list
+      Dicts with keys 'name', 'start', 'end' and 'args', ordered by
+      their start time.
+    """
+    record = self._m_runners[name]
+    if name in self._m_restored_data or record["queue"] is None:
+      return []
+
+    ready_time, start_time = record["queue"]
+    spans = [{"name": "queue", "start": ready_time, "end": start_time,
+              "args": {}}]
+    runner_start_time = record["runner"].start_time
+    if runner_start_time is not None:
+      spans.append({"name": "spawn", "start": start_time,
+                    "end": runner_start_time, "args": {}})
+    spans.extend(record["runner"].spans)
+    return spans
+
   def _get_runner_class(self, runner_class, target):
     if runner_class is not None:
       return runner_class
 
-    if callable(target):
+    if self._m_remote_worker_pool is not None:
+      return RemoteRunner
+    elif callable(target):
+      if self._m_pool_size is not None:
+        return FuncPoolRunner
       return FuncProcessRunner
+    elif self._m_use_asyncio:
+      return AsyncCmdRunner
     else:
       return CmdRunner
 
 
+class _Checkpointer(object):
+  """Save checkpoints in a background thread.
+
+  Parameters
+  ----------
+  save: callable object
+    The function to save a checkpoint.
+
+  interval: float
+    Minimum seconds between two checkpoints, save as soon as
+    notified if it's None.
+  """
+
+  def __init__(self, save, interval=None):
+    self._m_save = save
+    self._m_interval = 0 if interval is None else interval
+    self._m_cond = threading.Condition()
+    self._m_save_lock = threading.RLock()
+    self._m_pending = False
+    self._m_closed = False
+    self._m_last_time = 0
+    self.spans = []
+    self._m_thread = threading.Thread(
+        target=self._loop, name="Checkpointer", daemon=True)
+    self._m_thread.start()
+
+  def notify(self):
+    """Request a checkpoint without blocking."""
+    with self._m_cond:
+      self._m_pending = True
+      self._m_cond.notify()
+
+  def close(self):
+    """Stop the thread and save the last checkpoint."""
+    with self._m_cond:
+      if self._m_closed:
+        return
+      self._m_closed = True
+      self._m_cond.notify()
+    self._m_thread.join()
+    self._save()
+
+  def _loop(self):
+    while True:
+      with self._m_cond:
+        while not self._m_pending and not self._m_closed:
+          self._m_cond.wait()
+        if self._m_closed:
+          return
+
+        delay = self._m_last_time + self._m_interval - time.time()
+        if delay > 0:
+          self._m_cond.wait(delay)
+          continue
+        self._m_pending = False
+      self._save()
+
+  def _save(self):
+    with self._m_save_lock:
+      self._m_last_time = time.time()
+      try:
+        self._m_save()
+      except Exception as e:
+        logging.warning("Save checkpoint got exception: %s", e)
+      self.spans.append({"name": "checkpoint", "start": self._m_last_time,
+                         "end": time.time(), "args": {}})
+
+
 class MultiTaskRunner(object):
   """Run a bunch of tasks.
 
@@ -353,6 +850,42 @@ class MultiTaskRunner(object):
 
   runner_progresss_ui_class: MultiTaskProgressUI
     Class to dynamically display tasks running status.
+
+  scheduler: Scheduler
+    Decide the order to start ready tasks, e.g. ParallelScheduler.
+    Default to be None, which starts the tasks in topological order.
+
+  capacity: dict
+    Amount of resources of the machine, e.g. {"cpu": 16, "mem_gb": 64}.
+    Ready tasks start only if their 'resources' fit into the capacity
+    left by running tasks, together with the limit of 'parallel_degree'.
+    Resources not declared in capacity are not limited.
+
+  pool_size: int
+    Execute callable targets in a pool of 'pool_size' long-lived processes
+    instead of forking a new process for each one, see FuncPoolRunner.
+
+  use_asyncio: boolean
+    Drive all the command targets from one asyncio event loop
+    instead of a thread for each one, see AsyncCmdRunner.
+
+  cache: TaskResultCache
+    Skip the tasks whose outputs are cached, and cache the outputs of
+    succeed tasks. The cache is keyed by the task name, the target,
+    the input parameters and the outputs of the dependent tasks.
+    The file artifacts of the tasks are fingerprinted as well,
+    see 'artifacts' of MultiTaskRunner.add.
+
+  output_store: OutputStore
+    Save the large output values of the tasks into the store, and pass
+    lightweight handles between the tasks instead. Callable targets get
+    the values loaded from the store without copying.
+
+  remote_worker_pool: RemoteWorkerPool
+    Dispatch the tasks to the RemoteWorkerAgent on other hosts instead
+    of executing them locally, see RemoteRunner. A lost agent fails
+    the attempts running on it, which are retried on the other agents
+    as long as 'retry' allows.
   """
 
   def __init__(self, *, log_path=None,
@@ -362,18 +895,36 @@ class MultiTaskRunner(object):
                         config_file=None,
                         config_kwargs={},
                         params=None,
-                        runner_progresss_ui_class=MultiTaskTableProgressUI):
+                        runner_progresss_ui_class=MultiTaskTableProgressUI,
+                        scheduler=None,
+                        capacity=None,
+                        pool_size=None,
+                        use_asyncio=False,
+                        cache=None,
+                        output_store=None,
+                        remote_worker_pool=None):
     self._m_log_path = log_path
     self._m_parallel_degree = parallel_degree
     self._m_config_file = config_file
     self._m_config_kwargs = config_kwargs
     self._m_params = params
     self._m_runner_progress_ui_class = runner_progresss_ui_class
+    self._m_scheduler = Scheduler() if scheduler is None else scheduler
+    self._m_capacity = self._check_resources(capacity, "capacity")
+    self._m_task_resources = {}
+    self._m_cache = cache
+    self._m_task_fingerprints = {}
+    self._m_task_artifacts = {}
+    self._m_artifact_fingerprints = {}
+    self._m_journals = {}
 
     self._m_pid = os.getpid()
     self._m_lock = threading.Lock()
     self._m_runner_code_snippet = []
-    self._m_runner_inventory = RunnerInventory(retry=retry, interval=interval)
+    self._m_runner_inventory = RunnerInventory(
+        retry=retry, interval=interval, pool_size=pool_size,
+        use_asyncio=use_asyncio, output_store=output_store,
+        remote_worker_pool=remote_worker_pool)
     self._m_cached_running_record = collections.OrderedDict()
     self._m_runner_dependency = DynamicTopologicalGraph()
 
@@ -392,12 +943,17 @@ class MultiTaskRunner(object):
   def close(self, force=False, timeout=None):
     """Close all key resources.
     """
-    self._m_runner_inventory.close()
     for key, record in self._m_cached_running_record.items():
       record["runner_inventory"].close(force=force, timeout=timeout)
     self._m_cached_running_record.clear()
+    for journal, _, _ in self._m_journals.values():
+      journal.close()
+    self._m_journals.clear()
+    # Shutdown the shared server at last, which is used by all the records.
+    self._m_runner_inventory.close()
 
-  def save(self, checkpoint_path, *, params=None, max_checkpoint_num=5):
+  def save(self, checkpoint_path, *, params=None, max_checkpoint_num=5,
+                                    journal=False):
     """Save the status into disk.
 
     Parameters
@@ -411,6 +967,11 @@ class MultiTaskRunner(object):
     max_checkpoint_num: int
       Maximum number of checkpoints.
 
+    journal: boolean
+      Append the tasks changed since the last save into a journal
+      instead of saving snapshots of all the tasks, see CheckpointJournal.
+      'max_checkpoint_num' is ignored for a journal.
+
     Returns
     -------
     checkpoint_info: dict
@@ -431,6 +992,9 @@ class MultiTaskRunner(object):
       params = self._m_params
     record = self._get_cached_record(params)
 
+    if journal:
+      return self._save_journal(checkpoint_path, params, record)
+
     runner_inventory_file = record["runner_inventory"].save(
         checkpoint_path, max_checkpoint_num=max_checkpoint_num)
 
@@ -467,7 +1031,43 @@ class MultiTaskRunner(object):
 
     return checkpoints_record[timestamp]
 
+  def _save_journal(self, checkpoint_path, params, record):
+    runner_inventory = record["runner_inventory"]
+    context = record["context"]
+    journal_key = os.path.realpath(checkpoint_path)
+    if journal_key not in self._m_journals:
+      self._m_journals[journal_key] = [CheckpointJournal(checkpoint_path),
+                                       None, 0]
+    journal, last_record, since = self._m_journals[journal_key]
+
+    records = []
+    changed_names, sequence = runner_inventory.changes(since)
+    if last_record is not record:
+      # Write all the tasks for a new journal or new parameters.
+      records.append({"params": params})
+      changed_names = runner_inventory.list()
+
+    if last_record is not record:
+      # Fetch the context at once, each access of it costs a round trip.
+      data = context.get_data()
+    else:
+      data = context.get_data(changed_names)
+    for name in changed_names:
+      status = runner_inventory.get_info(name)
+      status["status"] = status["status"].name
+      task_data = data.get(name, {})
+      task_context = {"input": task_data.get("input", {})}
+      if task_data.get("output"):
+        task_context["output"] = task_data["output"]
+      records.append({"name": name, "status": status, "context": task_context})
+    journal.append(records)
+    self._m_journals[journal_key] = [journal, record, sequence]
+    return {"journal": journal.path, "params": params}
+
   def restore(self, checkpoint_path):
+    if _use_journal(checkpoint_path):
+      return self._restore_journal(checkpoint_path)
+
     if os.path.isfile(checkpoint_path):
       all_checkpoints_file = checkpoint_path
     else:
@@ -487,7 +1087,20 @@ class MultiTaskRunner(object):
 
     return self
 
-  def add(self, name, target, *, depends=None, **kwargs):
+  def _restore_journal(self, checkpoint_path):
+    journal = CheckpointJournal(checkpoint_path)
+    journal.close()
+
+    self.set_params(journal.params)
+    cached_record = self._get_cached_record(journal.params)
+    cached_record["context"].restore_data({
+      name: task["context"] for name, task in journal.tasks.items()})
+    cached_record["runner_inventory"].restore_status({
+      name: task["status"] for name, task in journal.tasks.items()})
+    return self
+
+  def add(self, name, target, *, depends=None, resources=None,
+                                 artifacts=None, **kwargs):
     """Add a new runner.
 
     Parameters
@@ -503,13 +1116,35 @@ class MultiTaskRunner(object):
       List of depended runners.
       If this is a string, multiple runners can be separated by a single comma.
 
+    resources: dict
+      Amount of resources the task holds while running,
+      e.g. {"cpu": 4, "mem_gb": 16}, see 'capacity' of MultiTaskRunner.
+
+    artifacts: list
+      Output fields which are paths of the files written by the task.
+      With a cache, the task is executed again if any of the files is
+      missing or modified, and so are the tasks depend on it if
+      the content of the files is changed.
+
     Returns
     -------
     self: MultiTaskRunner
       Reference for current instance.
+
+    Raises
+    ------
+    ValueError: If the resources of the task exceed the capacity.
     """
 
+    resources = self._check_resources(resources, "resources")
+    for key, amount in resources.items():
+      if amount > self._m_capacity.get(key, float("inf")):
+        raise ValueError("Task '%s' requires %s of '%s' which exceeds "
+            "the capacity %s." % (name, amount, key, self._m_capacity[key]))
+
     self._m_runner_inventory.add(name, target, **kwargs)
+    self._m_task_resources[name] = resources
+    self._m_task_artifacts[name] = list(artifacts or [])
     self._m_runner_dependency.add(name, depends)
     for key, record in self._m_cached_running_record.items():
       record["runner_inventory"].add(name, target, **kwargs)
@@ -597,7 +1232,11 @@ class MultiTaskRunner(object):
       progress_ui.display(reuse=False)
     return self._m_runner_dependency.get_nodes(order=True)
 
-  def run(self, tasks=None, *, params=None, verbose=False, try_best=False):
+  def run(self, tasks=None, *, params=None, verbose=False, try_best=False,
+                               checkpoint_path=None,
+                               checkpoint_every=None,
+                               resume=False,
+                               trace_file=None):
     """Run a bunch of tasks.
 
     Parameters
@@ -616,6 +1255,26 @@ class MultiTaskRunner(object):
       Set true if you want to executed the tasks as many as possible
       even if there exist some failed tasks.
 
+    checkpoint_path: str
+      Save checkpoints into a journal in this directory in a background
+      thread whenever tasks terminate, and before exiting on SIGINT or
+      SIGTERM, see 'save' with 'journal=True'.
+
+    checkpoint_every: float
+      Minimum seconds between two checkpoints. The background thread
+      still shares the CPU and the manager process with the scheduling
+      loop, raise it to reduce the overhead with many short tasks.
+
+    resume: boolean
+      Restore from 'checkpoint_path' if there is a checkpoint, so only
+      the tasks not done yet are executed. The saved parameters are used
+      if 'params' is None.
+
+    trace_file: str
+      Export the timing of the phases of the tasks executed in this run,
+      and of the checkpoints, into this file as Chrome trace events,
+      see 'RunnerInventory.get_spans' and 'multi_task_trace'.
+
     Returns
     -------
     result : integer
@@ -630,22 +1289,71 @@ class MultiTaskRunner(object):
     if not self._m_runner_dependency.is_valid():
       raise RuntimeError("Dependent relations of tasks is not topological")
 
+    if resume and checkpoint_path is not None and (
+        CheckpointJournal.exists(checkpoint_path) is not None or
+        os.path.isfile(os.path.join(checkpoint_path, "all_checkpoints.json"))):
+      self.restore(checkpoint_path)
+
+    checkpointer = None
+    if checkpoint_path is not None:
+      # Resolve the record here, the checkpointer thread must not
+      # create records in the cache of the running records.
+      run_params = self._m_params if params is None else params
+      checkpointer = _Checkpointer(functools.partial(
+          self._save_journal, checkpoint_path, run_params,
+          self._get_cached_record(run_params)),
+          interval=checkpoint_every)
+
+    run_start_time = time.time()
     self._m_lock.acquire()
     try:
-      handler = functools.partial(self._kill_signal_handler, run_params=params)
+      handler = functools.partial(self._kill_signal_handler,
+          run_params=params, checkpointer=checkpointer)
       prev_sigint_handler = signal.signal(signal.SIGINT, handler)
       prev_sigterm_handler = signal.signal(signal.SIGTERM, handler)
       return self._run_multiple_tasks(
-          tasks=tasks, params=params, verbose=verbose, try_best=try_best)
+          tasks=tasks, params=params, verbose=verbose, try_best=try_best,
+          checkpointer=checkpointer)
     finally:
       signal.signal(signal.SIGINT, prev_sigint_handler)
       signal.signal(signal.SIGTERM, prev_sigterm_handler)
+      if checkpointer is not None:
+        checkpointer.close()
+      if trace_file is not None:
+        self._dump_trace(trace_file, tasks, params, run_start_time,
+            checkpointer.spans if checkpointer is not None else [])
       self._m_lock.release()
 
+  def _dump_trace(self, trace_file, tasks, params, run_start_time,
+                        process_spans):
+    if params is None:
+      params = self._m_params
+    runner_inventory = self._get_cached_record(params)["runner_inventory"]
+
+    task_spans = collections.OrderedDict()
+    for name in self._m_runner_dependency.subset(tasks).get_nodes():
+      spans = runner_inventory.get_spans(name)
+      # Tasks which are not executed in this run are skipped.
+      if len(spans) == 0 or spans[0]["start"] < run_start_time:
+        continue
+      info = runner_inventory.get_info(name)
+      spans.insert(0, {"name": name, "start": spans[0]["start"],
+                       "end": max(span["end"] for span in spans),
+                       "args": {"status": info["status"].name,
+                                "exitcode": info["exitcode"],
+                                "attempts": info["attempts"]}})
+      task_spans[name] = spans
+
+    try:
+      multi_task_trace.dump_trace(trace_file, task_spans, process_spans)
+    except Exception as e:
+      logging.warning("Export trace '%s' got exception: %s", trace_file, e)
+
   def _run_multiple_tasks(self, tasks=None, *,
                                 params=None,
                                 verbose=False,
-                                try_best=False):
+                                try_best=False,
+                                checkpointer=None):
     if params is None:
       params = self._m_params
     record = self._get_cached_record(params)
@@ -654,12 +1362,15 @@ class MultiTaskRunner(object):
 
     dependency = self._m_runner_dependency.subset(tasks)
     enabled_tasks = set(dependency.get_nodes())
+    self._m_scheduler.prepare(dependency, runner_inventory)
     if verbose:
       progress_ui = self._m_runner_progress_ui_class(
           runner_inventory, dependency)
       progress_ui.display()
+      wait_timeout = progress_ui.update_interval
     else:
       progress_ui = None
+      wait_timeout = None
 
     previous_input = {}
     for task_name in enabled_tasks:
@@ -667,32 +1378,18 @@ class MultiTaskRunner(object):
 
     remaining_tasks = set(enabled_tasks)
     running_tasks = set()
+    used_resources = collections.Counter()
+    started_resources = {}
+    cache_keys = {}
     succeed_tasks = set()
     failed_tasks = set()
     while True:
-      for task_name in dependency.top():
-        if task_name not in remaining_tasks:
-          continue
-
-        # task succeed already.
-        if runner_inventory.status(task_name) == RunnerStatus.DONE \
-              and context.get_input(task_name) == previous_input[task_name]:
-          remaining_tasks.remove(task_name)
-          running_tasks.add(task_name)
-          continue
-
-        if self._m_parallel_degree < 0 or len(
-                running_tasks) < self._m_parallel_degree:
-          remaining_tasks.remove(task_name)
-          running_tasks.add(task_name)
-          runner_inventory.start(task_name, recreate_if_necessary=True)
-        else:
-          runner_inventory.update_status(task_name, RunnerStatus.READY)
-
+      finished_num = len(succeed_tasks) + len(failed_tasks)
       for task_name in running_tasks.copy():
         if runner_inventory.is_alive(task_name):
           continue
         running_tasks.remove(task_name)
+        used_resources.subtract(started_resources.pop(task_name, {}))
 
         exitcode = runner_inventory.exitcode(task_name)
         if exitcode != 0 and exitcode is not None:
@@ -708,31 +1405,147 @@ class MultiTaskRunner(object):
           runner_inventory.update_status(task_name, RunnerStatus.DONE)
           succeed_tasks.add(task_name)
           dependency.remove(task_name)
+          cache_key = cache_keys.pop(task_name, None)
+          if cache_key is not None:
+            output = context.get_output(task_name)
+            self._m_cache.put(cache_key, output,
+                name=task_name,
+                artifacts=self._fingerprint_artifacts(task_name, output))
+
+      if checkpointer is not None and \
+          len(succeed_tasks) + len(failed_tasks) > finished_num:
+        checkpointer.notify()
 
-      verbose and progress_ui.display()
-      if len(succeed_tasks) + len(failed_tasks) == len(enabled_tasks):
-        break
       if not try_best and len(failed_tasks) > 0:
+        verbose and progress_ui.display()
         self.stop()
         break
-      time.sleep(0.1)
+
+      for task_name in self._m_scheduler.sort(dependency.top()):
+        if task_name not in remaining_tasks:
+          continue
+
+        # task succeed already.
+        if runner_inventory.status(task_name) == RunnerStatus.DONE \
+              and context.get_input(task_name) == previous_input[task_name]:
+          remaining_tasks.remove(task_name)
+          running_tasks.add(task_name)
+          continue
+
+        if self._m_cache is not None and task_name not in cache_keys:
+          cache_key = self._get_cache_key(task_name, context)
+          entry = None if cache_key is None else \
+              self._m_cache.get_entry(cache_key)
+          if entry is not None:
+            logging.info("Task %s is skipped with cached output.", task_name)
+            context.set_output(task_name, entry["output"])
+            self._m_artifact_fingerprints[task_name] = entry["artifacts"]
+            remaining_tasks.remove(task_name)
+            runner_inventory.update_status(task_name, RunnerStatus.DONE)
+            succeed_tasks.add(task_name)
+            dependency.remove(task_name)
+            continue
+          cache_keys[task_name] = cache_key
+
+        # Lower ranked tasks may start if a higher ranked one doesn't fit.
+        runner_inventory.update_status(task_name, RunnerStatus.READY)
+        resources = self._m_task_resources[task_name]
+        if (self._m_parallel_degree < 0 or len(
+                running_tasks) < self._m_parallel_degree) and \
+            self._fit_capacity(resources, used_resources):
+          remaining_tasks.remove(task_name)
+          running_tasks.add(task_name)
+          used_resources.update(resources)
+          started_resources[task_name] = resources
+          runner_inventory.start(task_name, recreate_if_necessary=True)
+
+      verbose and progress_ui.display()
+      if len(succeed_tasks) + len(failed_tasks) == len(enabled_tasks):
+        break
+      runner_inventory.wait(running_tasks, timeout=wait_timeout)
 
     if verbose:
       progress_ui.display(reuse=False)
       progress_ui.clear()
+    if self._m_cache is not None:
+      logging.info("Task result cache: %s", self._m_cache.stats())
     return len(failed_tasks)
 
+  def _get_cache_key(self, task_name, context):
+    if task_name not in self._m_task_fingerprints:
+      target, runner_class, kwargs = \
+          self._m_runner_inventory.get_target(task_name)
+      # Streams and hooks don't change the output.
+      for key in ["stdin", "stdout", "stderr", "hooks", "pre_hooks",
+                  "post_hooks", "retry", "interval", "daemon"]:
+        kwargs.pop(key, None)
+      try:
+        self._m_task_fingerprints[task_name] = \
+            target_fingerprint(target, kwargs)
+      except (TypeError, ValueError) as e:
+        logging.warning("Task %s is not cached since its arguments can't be "
+            "serialized into json: %s", task_name, e)
+        self._m_task_fingerprints[task_name] = None
+    if self._m_task_fingerprints[task_name] is None:
+      return None
+
+    upstream_outputs = {}
+    upstream_artifacts = {}
+    for name in self._m_runner_dependency.depends(task_name):
+      upstream_outputs[name] = context.get_output(name)
+      if self._m_artifact_fingerprints.get(name):
+        upstream_artifacts[name] = self._m_artifact_fingerprints[name]
+    try:
+      return self._m_cache.key(task_name,
+          self._m_task_fingerprints[task_name], context.get_input(task_name),
+          upstream_outputs, upstream_artifacts)
+    except (TypeError, ValueError) as e:
+      logging.warning("Task %s is not cached since its input can't be "
+          "serialized into json: %s", task_name, e)
+      return None
+
+  def _fingerprint_artifacts(self, task_name, output):
+    fingerprints = {}
+    for field in self._m_task_artifacts[task_name]:
+      if isinstance(output, dict) and isinstance(output.get(field), str):
+        fingerprints[field] = artifact_fingerprint(output[field])
+      else:
+        fingerprints[field] = None
+    self._m_artifact_fingerprints[task_name] = fingerprints
+    return fingerprints
+
+  def _check_resources(self, resources, arg_name):
+    if resources is None:
+      return {}
+    if not isinstance(resources, dict):
+      raise TypeError("Parameter '%s' must be a dict." % (arg_name))
+    for key, amount in resources.items():
+      if not isinstance(amount, (int, float)) or amount < 0:
+        raise ValueError("Amount of '%s' in '%s' must be a non-negative "
+            "number, but received '%s'." % (key, arg_name, amount))
+    return dict(resources)
+
+  def _fit_capacity(self, resources, used_resources):
+    for key, amount in resources.items():
+      if key in self._m_capacity and \
+          used_resources[key] + amount > self._m_capacity[key]:
+        return False
+    return True
+
   def _get_cached_record(self, params):
     params_str = json.dumps(params, sort_keys=True).encode("utf-8")
     params_hashkey = hashlib.md5(params_str).hexdigest()
     if params_hashkey in self._m_cached_running_record:
       return self._m_cached_running_record[params_hashkey]
 
+    shared_server = self._m_runner_inventory.shared_server
     if self._m_config_file is not None:
       context = DependentRunnerContext(
-          task_config_file=self._m_config_file, **self._m_config_kwargs)
+          task_config_file=self._m_config_file,
+          shared_server=shared_server,
+          **self._m_config_kwargs)
     else:
-      context = RecordRunnerContext()
+      context = RecordRunnerContext(shared_server=shared_server)
 
     if params is not None:
       context.set_params(params)
@@ -750,7 +1563,8 @@ class MultiTaskRunner(object):
     }
     return self._m_cached_running_record[params_hashkey]
 
-  def _kill_signal_handler(self, signum, stack, run_params=None):
+  def _kill_signal_handler(self, signum, stack, run_params=None,
+                                                checkpointer=None):
     # Every subproces will receive the same signal,
     # we process the signal in the same process with MultiTaskRunner.
     if os.getpid() != self._m_pid:
@@ -760,6 +1574,8 @@ class MultiTaskRunner(object):
     self.stop()
     self.list(params=run_params, verbose=True)
     logging.warning("All runners are killed.")
+    if checkpointer is not None:
+      checkpointer.close()
     sys.exit(1)
 
   def stop(self):
@@ -0,0 +1,62 @@
+"""
+Export the timing of the tasks in a run as Chrome trace events, which can
+be loaded by chrome://tracing or https://ui.perfetto.dev.
+
+A span is a dict with keys 'name', 'start', 'end' in seconds since the
+epoch and 'args', see 'RunnerInventory.get_spans'.
+"""
+
+import os
+import json
+
+
+def trace_events(task_spans, process_spans=(), *, pid=None):
+  """Convert spans into Chrome trace events.
+
+  Parameters
+  ----------
+  task_spans: dict
+    Spans of the tasks keyed by the task names,
+    each task is displayed as a thread.
+
+  process_spans: list
+    Spans of the MultiTaskRunner itself, e.g. 'checkpoint'.
+
+  pid: int
+    The process id of the events, default to be the current one.
+
+  Returns
+  -------
+  events: list
+    Complete events, with metadata events naming the threads.
+  """
+  pid = os.getpid() if pid is None else pid
+  events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+             "args": {"name": "MultiTaskRunner"}}]
+  threads = [("MultiTaskRunner", process_spans)] + list(task_spans.items())
+  for tid, (thread_name, spans) in enumerate(threads):
+    events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                   "args": {"name": thread_name}})
+    for span in spans:
+      events.append({
+        "name": span["name"],
+        "cat": "task" if tid > 0 else "runner",
+        "ph": "X",
+        "pid": pid,
+        "tid": tid,
+        "ts": round(span["start"] * 1e6, 3),
+        "dur": round(max(span["end"] - span["start"], 0) * 1e6, 3),
+        "args": span.get("args", {}),
+      })
+  return events
+
+
+def dump_trace(trace_file, task_spans, process_spans=()):
+  """Write the spans into a file in the Chrome trace event format,
+  see 'trace_events'."""
+  trace_dir = os.path.dirname(trace_file)
+  if trace_dir and not os.path.exists(trace_dir):
+    os.makedirs(trace_dir)
+  with open(trace_file, 'w') as fout:
+    json.dump({"traceEvents": trace_events(task_spans, process_spans),
+               "displayTimeUnit": "ms"}, fout)
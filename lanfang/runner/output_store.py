@@ -0,0 +1,193 @@
+import os
+import sys
+import mmap
+import shutil
+import pickle
+import hashlib
+import tempfile
+
+
+__HANDLE_KEY__ = "__output_handle__"
+
+# Offsets of the buffers in a file are aligned to this value.
+__BUFFER_ALIGNMENT__ = 64
+
+
+def is_handle(value):
+  """Return whether a value is a handle returned by 'OutputStore.put'."""
+  return isinstance(value, dict) and __HANDLE_KEY__ in value
+
+
+def exists(handle):
+  """Return whether the value of a handle is still saved."""
+  return os.path.isfile(handle[__HANDLE_KEY__])
+
+
+def load(handle):
+  """Load the value of a handle returned by 'OutputStore.put'.
+
+  The file of the value is memory mapped, so bytes-like values are
+  returned as read-only memoryviews of the file, and buffers pickled
+  out-of-band, e.g. the data of numpy arrays, are read-only views of
+  the file as well. Nothing is copied in both cases.
+
+  Parameters
+  ----------
+  handle: dict
+    The handle of the value.
+
+  Returns
+  -------
+  value: object
+  """
+  if handle["size"] == 0:
+    view = memoryview(b"")
+  else:
+    with open(handle[__HANDLE_KEY__], 'rb') as fin:
+      # The map is kept alive by the views of it.
+      view = memoryview(mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ))
+
+  buffers = [view[offset:offset + length]
+                 for offset, length in handle["buffers"]]
+  if handle["format"] == "bytes":
+    return buffers[0]
+  return pickle.loads(view[:handle["header"]], buffers=buffers)
+
+
+def resolve(params):
+  """Replace the handles in the values of a dict by their values,
+  see 'load'. The dict is copied only if it contains handles."""
+  if not isinstance(params, dict) or \
+      not any(is_handle(v) for v in params.values()):
+    return params
+  return {k: load(v) if is_handle(v) else v for k, v in params.items()}
+
+
+class OutputStore(object):
+  """Save large output values of tasks into memory mapped files,
+  and pass lightweight handles between tasks instead of the values.
+
+  A handle is a json dict which contains the path of the file, so it
+  can be saved in any context, and be loaded in any process by 'load'.
+  Values are pickled with protocol 5, the out-of-band buffers such as
+  the data of numpy arrays are written once, and are loaded without
+  copying.
+
+  Files are named by the digests of their contents, so the same value
+  is saved only once.
+
+  Parameters
+  ----------
+  store_dir: str
+    The directory to save the files, a temporary directory under
+    '/dev/shm' is created if it's None, which is removed when the store
+    is closed. Set it to keep the outputs for restored or cached tasks.
+
+  min_size: int
+    Output values whose sizes are at least 'min_size' bytes are saved
+    into the store. Sizes of containers are estimated by sys.getsizeof,
+    which doesn't count their items. Values which are not json types,
+    e.g. numpy arrays, are always saved.
+  """
+
+  def __init__(self, store_dir=None, *, min_size=1 << 20):
+    if store_dir is None:
+      shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+      self._m_store_dir = tempfile.mkdtemp(prefix="lanfang-", dir=shm_dir)
+      self._m_own_store_dir = True
+    else:
+      if not os.path.exists(store_dir):
+        os.makedirs(store_dir)
+      self._m_store_dir = store_dir
+      self._m_own_store_dir = False
+    self._m_min_size = min_size
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, err_type, err_val, err_tb):
+    self.close()
+
+  def __getstate__(self):
+    # The store directory is only removed by the process which owns it.
+    return {"_m_store_dir": self._m_store_dir,
+            "_m_own_store_dir": False,
+            "_m_min_size": self._m_min_size}
+
+  @property
+  def store_dir(self):
+    return self._m_store_dir
+
+  def close(self):
+    """Remove the store directory if it's created by the store."""
+    if self._m_own_store_dir and os.path.isdir(self._m_store_dir):
+      shutil.rmtree(self._m_store_dir)
+
+  def put(self, value):
+    """Save a value.
+
+    Returns
+    -------
+    handle: dict
+      The handle to load the value, see 'load'.
+    """
+    header = b""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+      value_format = "bytes"
+      buffers = [memoryview(value).cast("B")]
+    else:
+      value_format = "pickle"
+      pickle_buffers = []
+      header = pickle.dumps(
+          value, protocol=5, buffer_callback=pickle_buffers.append)
+      try:
+        buffers = [buf.raw() for buf in pickle_buffers]
+      except BufferError:
+        # Buffers which are not contiguous are pickled in-band.
+        header, buffers = pickle.dumps(value, protocol=5), []
+
+    digest = hashlib.blake2b(header, digest_size=20)
+    offsets = []
+    size = len(header)
+    for buf in buffers:
+      size += -size % __BUFFER_ALIGNMENT__
+      offsets.append([size, buf.nbytes])
+      size += buf.nbytes
+      digest.update(buf)
+
+    path = os.path.join(
+        self._m_store_dir, "%s.%s" % (digest.hexdigest(), value_format))
+    if not os.path.isfile(path):
+      fd, tmp_path = tempfile.mkstemp(dir=self._m_store_dir, suffix=".tmp")
+      with os.fdopen(fd, 'wb') as fout:
+        fout.write(header)
+        for buf, (offset, length) in zip(buffers, offsets):
+          fout.seek(offset)
+          fout.write(buf)
+      os.replace(tmp_path, path)
+
+    return {
+      __HANDLE_KEY__: os.path.abspath(path),
+      "format": value_format,
+      "size": size,
+      "header": len(header),
+      "buffers": offsets,
+    }
+
+  def is_large(self, value):
+    """Return whether a value should be saved into the store."""
+    if value is None or isinstance(value, (bool, int, float)):
+      return False
+    try:
+      size = memoryview(value).nbytes
+    except TypeError:
+      size = sys.getsizeof(value)
+    return size >= self._m_min_size or \
+        not isinstance(value, (str, dict, list, tuple))
+
+  def offload(self, output):
+    """Replace the large values of an output dict by their handles."""
+    if not isinstance(output, dict):
+      return output
+    return {k: self.put(v) if self.is_large(v) and not is_handle(v) else v
+                for k, v in output.items()}
@@ -0,0 +1,778 @@
+"""
+Execute runners on other hosts.
+
+A RemoteWorkerAgent is started on each worker host, and the coordinator
+dispatches tasks to the agents by RemoteRunner. They talk json messages,
+one per line, over a TCP connection:
+
+  agent -> coordinator: {"type": "hello", "challenge": "..."}
+  coordinator -> agent: {"type": "auth", "digest": "..."}
+  agent -> coordinator: {"type": "welcome", "slots": 4, "host": "..."}
+  agent -> coordinator: {"type": "heartbeat"}
+  coordinator -> agent: {"type": "run", "id": 0, "name": "...",
+                         "target": ..., "input": {...}, "kwargs": {...}}
+  coordinator -> agent: {"type": "kill", "id": 0}
+  agent -> coordinator: {"type": "done", "id": 0, "exitcode": 0,
+                         "output": {...}, "error": null, "usage": {...}}
+
+The coordinator proves that it knows the shared secret by the HMAC digest
+of the challenge, the agent closes the connection without it. The secret
+is read from the environment variable LANFANG_RUNNER_SECRET if it's not
+given explicitly.
+"""
+
+from lanfang.runner.base import Runner
+from lanfang.runner.base import RunnerContext
+from lanfang.runner.base import SharedScope
+from lanfang.runner.base import SharedDataServer
+from lanfang.runner.cmd_runner import CmdRunner
+from lanfang.runner.func_runner import FuncProcessRunner
+
+import os
+import re
+import hmac
+import json
+import time
+import types
+import socket
+import hashlib
+import logging
+import secrets
+import importlib
+import importlib.util
+import itertools
+import threading
+
+
+SECRET_ENV_NAME = "LANFANG_RUNNER_SECRET"
+
+
+def _send(stream, lock, message):
+  data = (json.dumps(message) + "\n").encode("utf-8")
+  with lock:
+    stream.write(data)
+    stream.flush()
+
+
+def _recv(stream):
+  line = stream.readline()
+  if not line:
+    raise EOFError("connection closed")
+  return json.loads(line.decode("utf-8"))
+
+
+def _load_secret(secret):
+  if secret is None:
+    secret = os.environ.get(SECRET_ENV_NAME)
+  if not secret:
+    raise ValueError("A shared secret is required to talk with the worker "
+        "agents, pass 'secret' or set the environment variable %s." % (
+            SECRET_ENV_NAME))
+  if isinstance(secret, str):
+    secret = secret.encode("utf-8")
+  return secret
+
+
+def _sign(secret, challenge):
+  return hmac.new(secret, challenge.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def _parse_address(address):
+  """Convert 'host:port' into a tuple (host, port)."""
+  if isinstance(address, str):
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+  host, port = address
+  return (host, int(port))
+
+
+def _dump_target(target):
+  """Return the json value to send a target to the worker agents.
+
+  Callable objects are sent by their module and qualified name,
+  so they must be importable on the worker hosts.
+  """
+  if not callable(target):
+    return target
+
+  module = getattr(target, "__module__", None)
+  qualname = getattr(target, "__qualname__", "")
+  if module in (None, "__main__") or "<" in qualname:
+    raise TypeError("Callable target must be defined at the top level of "
+        "an importable module to execute remotely, but received %s" % target)
+  return {"callable": "%s:%s" % (module, qualname)}
+
+
+def _is_under(path, root):
+  path = os.path.realpath(path)
+  return os.path.commonpath([path, root]) == root
+
+
+def _load_target(value, start_dir):
+  """Import a callable target sent by '_dump_target'.
+
+  Only the callable objects defined in the modules under 'start_dir'
+  can be loaded, nothing is imported from other places.
+  """
+  if not isinstance(value, dict):
+    return value
+
+  if start_dir is None:
+    raise ValueError("Callable targets are not accepted since the worker "
+        "agent serves no 'start_dir'.")
+  root = os.path.realpath(start_dir)
+  module, qualname = value["callable"].split(":")
+  parts = module.split(".")
+  for i in range(1, len(parts) + 1):
+    name = ".".join(parts[:i])
+    # Finding a submodule imports its parent, which is checked already.
+    spec = importlib.util.find_spec(name)
+    locations = [] if spec is None else \
+        list(spec.submodule_search_locations or [])
+    if spec is not None and spec.has_location:
+      locations.append(spec.origin)
+    if len(locations) == 0 or \
+        not all(_is_under(location, root) for location in locations):
+      raise ValueError("Module '%s' is not under the served directory "
+          "'%s'." % (name, start_dir))
+
+  target = importlib.import_module(module)
+  for attr in qualname.split("."):
+    target = getattr(target, attr)
+    if isinstance(target, types.ModuleType):
+      raise ValueError("Callable target '%s' is not defined in module '%s'." % (
+          qualname, module))
+  if not callable(target) or getattr(target, "__module__", None) != module:
+    raise ValueError("Callable target '%s' is not defined in module '%s'." % (
+        qualname, module))
+  return target
+
+
+class _JobContext(RunnerContext):
+  """The context of a task on a worker agent, which holds its input only.
+  The output is sent back to the coordinator, who saves it into the
+  context of the task."""
+
+  def __init__(self, name, input_params):
+    self._m_name = name
+    self._m_input = input_params
+
+  def get_params(self):
+    return {}
+
+  def set_params(self, params):
+    pass
+
+  def get_input(self, name):
+    return self._m_input if name == self._m_name else {}
+
+  def set_input(self, name, value):
+    pass
+
+  def get_output(self, name):
+    return {}
+
+  def set_output(self, name, value):
+    pass
+
+  def save(self, checkpoint_path, max_checkpoint_num=5):
+    pass
+
+  def restore(self, checkpoint_path):
+    return self
+
+
+class RemoteWorkerAgent(object):
+  """Execute the tasks dispatched by RemoteRunner on this host.
+
+  Command targets are executed by CmdRunner, and callable targets by
+  FuncProcessRunner. Each task is tried only once on the agent,
+  retries are decided by the RemoteRunner on the coordinator.
+
+  Parameters
+  ----------
+  host: str
+    The address to listen on.
+
+  port: int
+    The port to listen on, a free port is chosen if it's 0,
+    see 'address'.
+
+  secret: str, bytes
+    The secret shared with the coordinators, only the coordinators who
+    know it can dispatch tasks. Read from the environment variable
+    LANFANG_RUNNER_SECRET if it's None.
+
+  start_dir: str
+    The directory of the modules which define the callable targets,
+    callable targets defined anywhere else are rejected. Only command
+    targets are accepted if it's None.
+
+  slots: int
+    Maximum number of tasks executed at the same time,
+    default to be the number of CPUs. Tasks dispatched while all the
+    slots are busy fail at once.
+
+  heartbeat_interval: float
+    Seconds between two heartbeats sent to the coordinator.
+
+  auth_timeout: float
+    Seconds to wait for a coordinator to authenticate itself.
+
+  log_path: str
+    The directory to save the stdout and stderr of the tasks into
+    files named by the task names. The streams of this process are
+    inherited if it's None.
+  """
+
+  def __init__(self, host="127.0.0.1", port=0, *, secret=None,
+                                                  start_dir=None,
+                                                  slots=None,
+                                                  heartbeat_interval=1.0,
+                                                  auth_timeout=5.0,
+                                                  log_path=None):
+    self._m_secret = _load_secret(secret)
+    self._m_start_dir = start_dir
+    self._m_slots = os.cpu_count() if slots is None else slots
+    self._m_running = 0
+    self._m_auth_timeout = auth_timeout
+    self._m_heartbeat_interval = heartbeat_interval
+    self._m_log_path = log_path
+    if log_path is not None and not os.path.exists(log_path):
+      os.makedirs(log_path)
+
+    self._m_server_socket = socket.create_server((host, port))
+    # Wake up periodically to check whether the agent is shut down.
+    self._m_server_socket.settimeout(0.2)
+    self._m_shared_server = SharedDataServer()
+    self._m_lock = threading.Lock()
+    self._m_connections = set()
+    self._m_closed = False
+    self._m_thread = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, err_type, err_val, err_tb):
+    self.shutdown()
+
+  @property
+  def address(self):
+    return self._m_server_socket.getsockname()[:2]
+
+  def start(self):
+    """Serve in a background thread."""
+    self._m_thread = threading.Thread(
+        target=self.serve_forever, name="RemoteWorkerAgent", daemon=True)
+    self._m_thread.start()
+    return self
+
+  def serve_forever(self):
+    """Accept connections from coordinators until shut down."""
+    while not self._m_closed:
+      try:
+        connection, _ = self._m_server_socket.accept()
+      except socket.timeout:
+        continue
+      except OSError:
+        break
+      threading.Thread(
+          target=self._serve, args=(connection,), daemon=True).start()
+
+  def shutdown(self):
+    """Stop serving, the running tasks are stopped as their
+    coordinators are disconnected."""
+    with self._m_lock:
+      if self._m_closed:
+        return
+      self._m_closed = True
+      connections = list(self._m_connections)
+
+    if self._m_thread is not None and \
+        self._m_thread is not threading.current_thread():
+      self._m_thread.join()
+    self._m_server_socket.close()
+    for connection in connections:
+      try:
+        connection.shutdown(socket.SHUT_RDWR)
+      except OSError:
+        pass
+    self._m_shared_server.shutdown()
+
+  def _serve(self, connection):
+    with self._m_lock:
+      if self._m_closed:
+        connection.close()
+        return
+      self._m_connections.add(connection)
+
+    stream = connection.makefile("rwb")
+    send_lock = threading.Lock()
+    disconnected = threading.Event()
+    runners = {}
+    killed = set()
+    try:
+      if not self._authenticate(connection, stream, send_lock):
+        return
+      _send(stream, send_lock, {"type": "welcome",
+                                "slots": self._m_slots,
+                                "host": socket.gethostname()})
+      threading.Thread(target=self._heartbeat,
+                       args=(stream, send_lock, disconnected),
+                       daemon=True).start()
+      while True:
+        message = _recv(stream)
+        if message["type"] == "run":
+          if not self._acquire_slot():
+            _send(stream, send_lock, {"type": "done", "id": message["id"],
+                "exitcode": 1, "output": None, "usage": None,
+                "error": "all the %d slots of the worker agent are busy" % (
+                    self._m_slots)})
+            continue
+          threading.Thread(target=self._execute,
+                           args=(stream, send_lock, runners, killed,
+                                 message),
+                           daemon=True).start()
+        elif message["type"] == "kill":
+          # The runner checks it as well in case it's not created yet.
+          killed.add(message["id"])
+          runner = runners.get(message["id"])
+          if runner is not None:
+            runner.stop()
+    except (EOFError, OSError, ValueError) as e:
+      logging.info("Coordinator of the worker agent disconnected: %s", e)
+    finally:
+      disconnected.set()
+      # The coordinator will retry the tasks on other workers.
+      for runner in list(runners.values()):
+        runner.stop()
+      with self._m_lock:
+        self._m_connections.discard(connection)
+      stream.close()
+      connection.close()
+
+  def _authenticate(self, connection, stream, send_lock):
+    """Check that the peer knows the shared secret."""
+    challenge = secrets.token_hex(16)
+    _send(stream, send_lock, {"type": "hello", "challenge": challenge})
+    connection.settimeout(self._m_auth_timeout)
+    try:
+      message = _recv(stream)
+    except socket.timeout:
+      message = None
+    connection.settimeout(None)
+    if not isinstance(message, dict) or message.get("type") != "auth" or \
+        not isinstance(message.get("digest"), str) or \
+        not hmac.compare_digest(message["digest"],
+                                _sign(self._m_secret, challenge)):
+      logging.warning("Rejected a coordinator of the worker agent which "
+          "failed the authentication.")
+      return False
+    return True
+
+  def _acquire_slot(self):
+    with self._m_lock:
+      if self._m_running >= self._m_slots:
+        return False
+      self._m_running += 1
+      return True
+
+  def _release_slot(self):
+    with self._m_lock:
+      self._m_running -= 1
+
+  def _heartbeat(self, stream, send_lock, disconnected):
+    while not disconnected.wait(self._m_heartbeat_interval):
+      try:
+        _send(stream, send_lock, {"type": "heartbeat"})
+      except (OSError, ValueError):
+        break
+
+  def _open_logs(self, name):
+    if self._m_log_path is None:
+      return {}
+    # The name is sent by the coordinator, keep the files in 'log_path'.
+    name = re.sub(r"[^\w.\-]", "_", name).lstrip(".") or "_"
+    return {sname: open("%s/%s.%s" % (self._m_log_path, name, suffix), 'a')
+                for sname, suffix in [("stdout", "out"), ("stderr", "err")]}
+
+  def _execute(self, stream, send_lock, runners, killed, job):
+    result = {"type": "done", "id": job["id"], "exitcode": 1,
+              "output": None, "error": None, "usage": None}
+    log_files = {}
+    try:
+      target = _load_target(job["target"], self._m_start_dir)
+      runner_class = FuncProcessRunner if callable(target) else CmdRunner
+      log_files = self._open_logs(job["name"])
+      runner = runner_class(
+          target, name=job["name"],
+          context=_JobContext(job["name"], job["input"]),
+          shared_server=self._m_shared_server,
+          **log_files, **job["kwargs"])
+      runner.start()
+      runners[job["id"]] = runner
+      if job["id"] in killed:
+        runner.stop()
+      runner.join()
+
+      if runner.exitcode is not None:
+        result["exitcode"] = runner.exitcode
+      result["usage"] = runner.usage
+      if result["exitcode"] == 0:
+        result["output"] = runner.output
+        # Make sure the output can be sent.
+        json.dumps(result)
+    except BaseException as e:
+      result.update(exitcode=1, output=None,
+                    error="got exception %s: %s" % (type(e), e))
+    finally:
+      runners.pop(job["id"], None)
+      killed.discard(job["id"])
+      for log_file in log_files.values():
+        log_file.close()
+      self._release_slot()
+
+    try:
+      _send(stream, send_lock, result)
+    except (OSError, ValueError) as e:
+      logging.warning("Can't send the result of task '%s': %s",
+          job["name"], e)
+
+
+class _RemoteWorker(object):
+  """The connection to a RemoteWorkerAgent.
+
+  The agent is treated as lost if the connection is closed or no message
+  arrives in 'heartbeat_timeout' seconds, the tasks waiting on it fail.
+  """
+
+  def __init__(self, address, *, secret, heartbeat_timeout, connect_timeout):
+    self._m_address = address
+    self._m_heartbeat_timeout = heartbeat_timeout
+    self._m_socket = socket.create_connection(
+        address, timeout=connect_timeout)
+    self._m_stream = self._m_socket.makefile("rwb")
+    self._m_send_lock = threading.Lock()
+    try:
+      challenge = _recv(self._m_stream)["challenge"]
+      _send(self._m_stream, self._m_send_lock,
+            {"type": "auth", "digest": _sign(secret, challenge)})
+      # The agent closes the connection if the secret is wrong.
+      self.slots = _recv(self._m_stream)["slots"]
+    except BaseException:
+      self._m_stream.close()
+      self._m_socket.close()
+      raise
+    self._m_socket.settimeout(None)
+
+    self.running = 0
+    self._m_cond = threading.Condition()
+    self._m_results = {}
+    self._m_job_ids = itertools.count()
+    self._m_alive = True
+    self._m_last_seen = time.time()
+    threading.Thread(target=self._read, daemon=True).start()
+
+  @property
+  def address(self):
+    return self._m_address
+
+  def _read(self):
+    try:
+      while True:
+        message = _recv(self._m_stream)
+        with self._m_cond:
+          self._m_last_seen = time.time()
+          if message["type"] == "done":
+            self._m_results[message["id"]] = message
+            self._m_cond.notify_all()
+    except (EOFError, OSError, ValueError) as e:
+      if self._m_alive:
+        logging.warning("Lost the worker agent %s:%s: %s",
+            self._m_address[0], self._m_address[1], e)
+    self.close()
+
+  def is_alive(self):
+    with self._m_cond:
+      return self._check_alive()
+
+  def _check_alive(self):
+    if self._m_alive and \
+        time.time() - self._m_last_seen > self._m_heartbeat_timeout:
+      logging.warning("No heartbeat from the worker agent %s:%s in %.2f "
+          "seconds.", self._m_address[0], self._m_address[1],
+          self._m_heartbeat_timeout)
+      self._close()
+    return self._m_alive
+
+  def close(self):
+    with self._m_cond:
+      self._close()
+
+  def _close(self):
+    if not self._m_alive:
+      return
+    self._m_alive = False
+    try:
+      # Wake up the reading thread.
+      self._m_socket.shutdown(socket.SHUT_RDWR)
+    except OSError:
+      pass
+    self._m_socket.close()
+    self._m_cond.notify_all()
+
+  def execute(self, job, stopped=None):
+    """Execute a task on the agent and wait for it.
+
+    Returns
+    -------
+    exitcode: int
+
+    output: dict
+
+    error: str
+      The reason of failure, None if no error is reported.
+
+    usage: dict
+      The resource usage measured on the agent, see 'Runner.usage'.
+    """
+    job_id = next(self._m_job_ids)
+    try:
+      _send(self._m_stream, self._m_send_lock, dict(job, type="run", id=job_id))
+    except (OSError, ValueError) as e:
+      self.close()
+      return 1, None, "can't send the task to the worker agent: %s" % (e), \
+          None
+
+    killed = False
+    while True:
+      with self._m_cond:
+        if job_id in self._m_results:
+          result = self._m_results.pop(job_id)
+          return result["exitcode"], result["output"], result["error"], \
+              result["usage"]
+        if not self._check_alive():
+          return 1, None, \
+              "lost the worker agent %s:%s" % self._m_address, None
+        if killed or stopped is None or not stopped():
+          self._m_cond.wait(0.1)
+          continue
+
+      killed = True
+      try:
+        _send(self._m_stream, self._m_send_lock, {"type": "kill", "id": job_id})
+      except (OSError, ValueError):
+        self.close()
+
+
+class RemoteWorkerPool(object):
+  """Connections to the RemoteWorkerAgent on multiple hosts.
+
+  Agents are connected when they're first needed. A lost agent is
+  connected again at most once every 'heartbeat_timeout' seconds,
+  the tasks running on it fail and are retried by their runners.
+
+  Parameters
+  ----------
+  addresses: list
+    Addresses of the agents, each one is a tuple (host, port)
+    or a string 'host:port'.
+
+  secret: str, bytes
+    The secret shared with the agents, see RemoteWorkerAgent.
+
+  heartbeat_timeout: float
+    An agent is treated as lost if no message arrives from it
+    in 'heartbeat_timeout' seconds.
+
+  connect_timeout: float
+    Timeout of connecting to an agent.
+  """
+
+  def __init__(self, addresses, *, secret=None,
+                                   heartbeat_timeout=10.0,
+                                   connect_timeout=5.0):
+    self._m_addresses = [_parse_address(address) for address in addresses]
+    if len(self._m_addresses) == 0:
+      raise ValueError("Parameter 'addresses' can't be empty.")
+    self._m_secret = _load_secret(secret)
+    self._m_heartbeat_timeout = heartbeat_timeout
+    self._m_connect_timeout = connect_timeout
+    self._m_workers = {address: None for address in self._m_addresses}
+    self._m_next_connect = {address: 0 for address in self._m_addresses}
+    self._m_cond = threading.Condition()
+    self._m_closed = False
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, err_type, err_val, err_tb):
+    self.shutdown()
+
+  def _connect(self, address):
+    worker = self._m_workers[address]
+    if worker is not None and worker.is_alive():
+      return worker
+
+    self._m_workers[address] = None
+    if time.time() < self._m_next_connect[address]:
+      return None
+    try:
+      worker = _RemoteWorker(address,
+                             secret=self._m_secret,
+                             heartbeat_timeout=self._m_heartbeat_timeout,
+                             connect_timeout=self._m_connect_timeout)
+    except (OSError, EOFError, ValueError, KeyError) as e:
+      logging.warning("Can't connect to the worker agent %s:%s: %s",
+          address[0], address[1], e)
+      self._m_next_connect[address] = time.time() + self._m_heartbeat_timeout
+      return None
+    self._m_workers[address] = worker
+    return worker
+
+  def acquire(self, stopped=None):
+    """Get an agent with a free slot, wait if all the slots are busy.
+
+    Parameters
+    ----------
+    stopped: callable object
+      Stop waiting and return None once it returns True.
+
+    Returns
+    -------
+    worker: _RemoteWorker
+      The agent, which must be released after the task, see 'release'.
+      None if no agent can be connected.
+    """
+    with self._m_cond:
+      while True:
+        if self._m_closed:
+          raise RuntimeError("Can't operate on a closed RemoteWorkerPool.")
+        if stopped is not None and stopped():
+          return None
+
+        connected = False
+        for address in self._m_addresses:
+          worker = self._connect(address)
+          if worker is None:
+            continue
+          connected = True
+          if worker.running < worker.slots:
+            worker.running += 1
+            return worker
+
+        if not connected:
+          return None
+        self._m_cond.wait(0.1)
+
+  def release(self, worker):
+    with self._m_cond:
+      worker.running -= 1
+      self._m_cond.notify()
+
+  def shutdown(self):
+    """Close the connections, tasks on the agents are stopped."""
+    with self._m_cond:
+      self._m_closed = True
+      for worker in self._m_workers.values():
+        if worker is not None:
+          worker.close()
+      self._m_cond.notify_all()
+
+
+class RemoteRunner(Runner, threading.Thread):
+  """Execute a target on a worker host by its RemoteWorkerAgent.
+
+  The runner itself is a thread which waits for the result. A failed
+  attempt, including the one whose agent is lost, is retried on any
+  agent with a free slot.
+
+  Parameters
+  ----------
+  target: list, str, callable object
+    The target to execute. Commands are executed by CmdRunner on the
+    worker host, and callable objects by FuncProcessRunner. Callable
+    objects are sent by their names, so they must be defined at the
+    top level of a module which is importable on the worker hosts.
+
+  worker_pool: RemoteWorkerPool
+    The agents to execute the target.
+
+  target_kwargs: dict
+    Other arguments of the runner on the worker host, e.g. 'shell'
+    of CmdRunner or 'kwargs' of FuncProcessRunner. They're sent as json,
+    as well as the input and the output of the target.
+
+  Notes
+  -----
+  'stdout' and 'stderr' of the target are written on the worker host,
+  see 'log_path' of RemoteWorkerAgent. Handles of OutputStore can only
+  be loaded if the store directory is shared with the worker hosts.
+  """
+
+  __doc__ += "\nDocument of Runner\n" + ("-" * 20) + "\n" + Runner.__doc__
+
+  def __init__(self, target, *, worker_pool, name=None, retry=1, interval=5,
+                             daemon=None, hooks=None, context=None,
+                             stdin=None, stdout=None, stderr=None,
+                             shared_server=None, output_store=None,
+                             **target_kwargs):
+    threading.Thread.__init__(self, name=name, daemon=daemon)
+
+    Runner.__init__(
+      self, target=target, name=name, retry=retry, interval=interval,
+      daemon=daemon, hooks=hooks, context=context,
+      stdin=stdin, stdout=stdout, stderr=stderr,
+      internal_scope=SharedScope.THREAD, shared_server=shared_server,
+      output_store=output_store)
+
+    self._m_name = self.name
+    self._m_worker_pool = worker_pool
+    self._m_job = {
+      "name": self._m_name,
+      "target": _dump_target(target),
+      "kwargs": target_kwargs,
+    }
+    json.dumps(self._m_job)
+    self._m_stop_event = threading.Event()
+    self._m_worker = None
+
+  def _fetch_input_params(self, params):
+    return params
+
+  def _execute_target(self, input_params):
+    worker = self._m_worker_pool.acquire(stopped=self.stopped)
+    if worker is None:
+      error = "stopped before execution" if self.stopped() else \
+          "no worker agent is available"
+      exitcode, output, usage, worker_name = 1, None, None, "none"
+    else:
+      self._m_worker = worker
+      try:
+        exitcode, output, error, usage = worker.execute(
+            dict(self._m_job, input=input_params), stopped=self.stopped)
+      finally:
+        self._m_worker = None
+        self._m_worker_pool.release(worker)
+      worker_name = "%s:%s" % worker.address
+
+    if usage is not None:
+      self._record_usage(usage)
+    if error is not None:
+      logging.warning("Runner '%s' on worker agent %s %s on attempts %d/%d",
+          self._m_name, worker_name, error,
+          self._m_runner_status["attempts"], self._m_retry_limit)
+    return exitcode, output
+
+  def is_alive(self):
+    return threading.Thread.is_alive(self)
+
+  def join(self, timeout=None):
+    return threading.Thread.join(self, timeout=timeout)
+
+  def stop(self):
+    # The worker agent is asked to kill the target while waiting for it.
+    self._m_stop_event.set()
+
+  def stopped(self):
+    return self._m_stop_event.is_set()
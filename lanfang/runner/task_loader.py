@@ -1,25 +1,66 @@
 """Loading tasks."""
+from lanfang.runner.task_register import TaskRegister
+
 import re
 import os
 import sys
+import json
+import hashlib
+import logging
+import tempfile
 import importlib.util
+import concurrent.futures
 
 # what about .pyc (etc)
 # we would need to avoid loading the same tasks multiple times
 # from '.py', *and* '.pyc'
 VALID_MODULE_NAME = re.compile(r'[_a-z]\w*\.py$', re.IGNORECASE)
 
+# Directories which never contain tasks.
+IGNORED_DIRS = frozenset([
+  ".git", ".hg", ".svn", "__pycache__", "venv", ".venv", ".tox",
+  "node_modules",
+])
+
 
 class TaskLoader(object):
   """
   This class is responsible for loading tasks according to various criteria
   and register all tasks in lanfang.runner.
 
+  With an 'index_dir', the tasks registered by each file are saved in
+  a discovery index keyed by the path, mtime and size of the file, so
+  that listing the tasks does not import the unchanged files again,
+  see 'list'. A file is assumed to register the same tasks as long as
+  it is unchanged, whatever modules it imports.
+
   """
-  def __init__(self):
+  __INDEX_VERSION__ = 1
+
+  def __init__(self, index_dir=None, *, ignored_dirs=IGNORED_DIRS,
+                                        max_workers=None):
+    """
+    Parameters
+    ----------
+    index_dir: str
+      The directory to save the discovery indexes, one file for each
+      start directory. No index is used if it's None.
+
+    ignored_dirs: set
+      Names of the directories which are not scanned.
+
+    max_workers: int
+      The number of threads scanning the directories.
+
+    """
     super(TaskLoader, self).__init__()
+    if index_dir is not None:
+      index_dir = os.path.abspath(os.path.expanduser(index_dir))
+    self._m_index_dir = index_dir
+    self._m_ignored_dirs = frozenset(ignored_dirs)
+    self._m_max_workers = max_workers
 
-  def load(self, start_dir, pattern='.*task(s?)\.py'):
+  def load(self, start_dir, pattern=r'.*task(s?)\.py', *, tasks=None):
     """Load and register all tasks under directory 'start_dir'.
 
     Parameters
@@ -30,20 +71,202 @@ class TaskLoader(object):
     pattern: str
       The pattern of the matched file name.
 
+    tasks: list
+      Names of the tasks needed. Files which are known from the index
+      not to register any of them are not imported.
+
+    Returns
+    -------
+    tasks: list
+      Summaries of the registered tasks, see 'list'.
+
     """
     start_dir = os.path.abspath(start_dir)
-    for root, dirs, files in os.walk(start_dir):
-      for fname in files:
-        if not VALID_MODULE_NAME.match(fname):
-          continue
-        full_fname = os.path.join(root, fname)
-        if not self._match_path(fname, full_fname, pattern):
-          continue
-        self._import_file(full_fname, start_dir)
+    index = self._read_index(start_dir)
+    new_index = {}
+    task_summaries = []
+    for full_fname, stat in self.discover(start_dir, pattern):
+      entry = self._get_entry(index, full_fname, stat)
+      if entry is not None and tasks is not None and not any(
+          task["name"] in tasks for task in entry["tasks"]):
+        new_index[full_fname] = entry
+        continue
+      entry = self._load_entry(full_fname, stat, start_dir)
+      new_index[full_fname] = entry
+      task_summaries.extend(entry["tasks"])
+
+    if new_index != index:
+      self._write_index(start_dir, new_index)
+    return task_summaries
+
+  def list(self, start_dir, pattern=r'.*task(s?)\.py'):
+    """List the tasks under directory 'start_dir', only the files
+    which are new or changed since the last 'load' or 'list' are
+    imported.
+
+    Parameters
+    ----------
+    start_dir: str
+      The start directory of the tasks.
+
+    pattern: str
+      The pattern of the matched file name.
+
+    Returns
+    -------
+    tasks: list
+      Summaries of the tasks in order of the files, e.g.
+      {
+        "name": "train",
+        "file": "/path/to/train_tasks.py",
+        "input": {"locals": ["epochs"], "globals": ["train_data"]},
+        "output": {"locals": [], "globals": ["model"]},
+        "artifacts": ["model"]
+      }
+      'input' is None if the input schema of a command is not specified.
+
+    """
+    start_dir = os.path.abspath(start_dir)
+    index = self._read_index(start_dir)
+    new_index = {}
+    task_summaries = []
+    for full_fname, stat in self.discover(start_dir, pattern):
+      entry = self._get_entry(index, full_fname, stat)
+      if entry is None:
+        entry = self._load_entry(full_fname, stat, start_dir)
+      new_index[full_fname] = entry
+      task_summaries.extend(entry["tasks"])
+
+    if new_index != index:
+      self._write_index(start_dir, new_index)
+    return task_summaries
+
+  def discover(self, start_dir, pattern=r'.*task(s?)\.py'):
+    """Find the task files under directory 'start_dir'.
+
+    The directories are scanned in parallel level by level, those in
+    'ignored_dirs' are skipped.
+
+    Returns
+    -------
+    files: list
+      Pairs of (path, os.stat_result) sorted by the paths.
+
+    """
+    pattern = re.compile(pattern)
+    task_files = []
+    pending_dirs = [os.path.abspath(start_dir)]
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=self._m_max_workers) as executor:
+      while len(pending_dirs) > 0:
+        scanned = executor.map(
+            self._scan_dir, pending_dirs, [pattern] * len(pending_dirs))
+        pending_dirs = []
+        for sub_dirs, files in scanned:
+          pending_dirs.extend(sub_dirs)
+          task_files.extend(files)
+    return sorted(task_files, key=lambda item: item[0])
+
+  def _scan_dir(self, path, pattern):
+    sub_dirs = []
+    files = []
+    try:
+      entries = list(os.scandir(path))
+    except OSError as e:
+      logging.warning("Can't scan directory '%s': %s", path, e)
+      return sub_dirs, files
+
+    for entry in entries:
+      try:
+        if entry.is_dir(follow_symlinks=False):
+          if entry.name not in self._m_ignored_dirs:
+            sub_dirs.append(entry.path)
+        elif VALID_MODULE_NAME.match(entry.name) \
+            and self._match_path(entry.name, entry.path, pattern) \
+            and entry.is_file():
+          files.append((entry.path, entry.stat()))
+      except OSError:
+        continue
+    return sub_dirs, files
 
   def _match_path(self, path, full_path, pattern):
-    # override this method to use alternative matching strategy
-    return re.compile(pattern).match(path) is not None
+    # override this method to use alternative matching strategy,
+    # 'pattern' is a compiled regular expression.
+    return pattern.match(path) is not None
+
+  def _get_entry(self, index, full_fname, stat):
+    entry = index.get(full_fname)
+    if entry is None or entry["mtime"] != stat.st_mtime_ns \
+        or entry["size"] != stat.st_size:
+      return None
+    return entry
+
+  def _load_entry(self, full_fname, stat, start_dir):
+    num_tasks = len(TaskRegister.__tasks__)
+    self._import_file(full_fname, start_dir)
+    return {
+      "mtime": stat.st_mtime_ns,
+      "size": stat.st_size,
+      "tasks": [self._summarize_task(task, full_fname)
+                    for task in TaskRegister.__tasks__[num_tasks:]],
+    }
+
+  def _summarize_task(self, task, full_fname):
+    def schema_fields(schema):
+      if schema is None:
+        return None
+      return {"locals": schema.locals, "globals": schema.globals}
+
+    return {
+      "name": task["name"],
+      "file": full_fname,
+      "input": schema_fields(task["input_schema"]),
+      "output": schema_fields(task["output_schema"]),
+      "artifacts": task["output_schema"].artifacts,
+    }
+
+  def _index_file(self, start_dir):
+    digest = hashlib.sha256(start_dir.encode("utf-8")).hexdigest()
+    return os.path.join(self._m_index_dir, digest[:32] + ".json")
+
+  def _read_index(self, start_dir):
+    if self._m_index_dir is None:
+      return {}
+    try:
+      with open(self._index_file(start_dir), 'r') as fin:
+        index = json.load(fin)
+    except (OSError, ValueError):
+      return {}
+    if index.get("version") != self.__INDEX_VERSION__ \
+        or index.get("start_dir") != start_dir:
+      return {}
+    return index["files"]
+
+  def _write_index(self, start_dir, files):
+    if self._m_index_dir is None:
+      return
+    # The index is only a cache, the tasks are loaded without it.
+    try:
+      os.makedirs(self._m_index_dir, exist_ok=True)
+      fd, tmp_path = tempfile.mkstemp(dir=self._m_index_dir, suffix=".tmp")
+    except OSError as e:
+      logging.warning("Can't write the task index into '%s': %s",
+          self._m_index_dir, e)
+      return
+
+    try:
+      with os.fdopen(fd, 'w') as fout:
+        json.dump({"version": self.__INDEX_VERSION__,
+                   "start_dir": start_dir,
+                   "files": files}, fout)
+      os.replace(tmp_path, self._index_file(start_dir))
+    except (OSError, TypeError, ValueError) as e:
+      logging.warning("Can't write the task index into '%s': %s",
+          self._m_index_dir, e)
+      try:
+        os.remove(tmp_path)
+      except OSError:
+        pass
 
   def _get_name_from_path(self, path, top_level_dir):
     if path == top_level_dir:
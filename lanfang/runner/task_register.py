@@ -18,7 +18,7 @@ import voluptuous
 class TaskSchema(object):
   """Task schema manager."""
 
-  def __init__(self, *, locals=None, globals=None):
+  def __init__(self, *, locals=None, globals=None, artifacts=None):
     """
     Parameters
     ----------
@@ -36,6 +36,11 @@ class TaskSchema(object):
       Maintain global parameters which will be shared with other tasks,
       format the same as 'locals'.
 
+    artifacts: list
+      Fields whose values are paths of files written by the task,
+      e.g. ["vocab_file"]. They are fingerprinted to decide whether
+      the task needs to be executed again, see MultiTaskRunner.add.
+
     """
     if locals is None:
       self._m_locals = {}
@@ -58,6 +63,12 @@ class TaskSchema(object):
       raise KeyError("globals and locals have the same fields: %s" % (
           ", ".join(sorted(duplicate_fields))))
 
+    self._m_artifacts = [] if artifacts is None else list(artifacts)
+    unknown_fields = set(self._m_artifacts) - set(self._m_all_items)
+    if len(unknown_fields) > 0:
+      raise KeyError("artifacts have unknown fields: %s" % (
+          ", ".join(sorted(unknown_fields))))
+
     self._m_checker = voluptuous.Schema(self._m_all_items)
 
   def check(self, value):
@@ -88,6 +99,10 @@ class TaskSchema(object):
   def all(self):
     return list(self._m_all_items.keys())
 
+  @property
+  def artifacts(self):
+    return list(self._m_artifacts)
+
 
 class TaskRegister(object):
   """Tools for register task and manage multiple tasks automatically.
@@ -104,13 +119,15 @@ class TaskRegister(object):
                      daemon=None,
                      append_log=False,
                      input_default=None,
-                     output_default=None):
+                     output_default=None,
+                     resources=None):
     """
     Parameters
     ----------
     output_schema: dict, TaskSchema
       The output schema of the task.  If it is a dict,
       it will be passed as the 'globals' parameter of TaskSchema.
+      Use a TaskSchema to declare the file artifacts of the task.
 
     input_schema: dict, TaskSchema [optional]
       The input schema of the task.
@@ -125,6 +142,10 @@ class TaskRegister(object):
     output_default: dict
       The default output value of the task.
 
+    resources: dict
+      Amount of resources the task holds while running,
+      e.g. {"cpu": 4, "mem_gb": 16}.
+
     Notes
     -----
     Those parameters not specified in this doc was from 'MultiTaskRunner.add',
@@ -165,6 +186,7 @@ class TaskRegister(object):
 
     self._m_encoding = encoding
     self._m_daemon = daemon
+    self._m_resources = resources
     self._m_append_log = append_log
     self._m_task = None
 
@@ -209,6 +231,8 @@ class TaskRegister(object):
       "append_log": self._m_append_log,
       "encoding": self._m_encoding,
       "daemon": self._m_daemon,
+      "resources": self._m_resources,
+      "artifacts": self._m_output_schema.artifacts,
       **kwargs
     }
     self.__tasks__.append(self._m_task)
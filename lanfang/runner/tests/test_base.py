@@ -0,0 +1,120 @@
+import lanfang
+import unittest
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+
+
+class TestSharedStatus(unittest.TestCase):
+  def test_fields(self):
+    status = lanfang.runner.base.SharedStatus(
+        {"attempts": int, "elapsed_time": float, "need_stop": bool},
+        attempts=0)
+    self.assertEqual(status["attempts"], 0)
+    self.assertIsNone(status["elapsed_time"])
+    self.assertIsNone(status["need_stop"])
+    self.assertEqual(len(status), 3)
+
+    status["elapsed_time"] = 1.5
+    status["attempts"] += 1
+    self.assertEqual(status["attempts"], 1)
+    self.assertEqual(status["elapsed_time"], 1.5)
+
+    del status["elapsed_time"]
+    self.assertIsNone(status["elapsed_time"])
+
+    with self.assertRaises(KeyError):
+      status["output"] = {}
+    with self.assertRaises(KeyError):
+      status["output"]
+
+  def test_process_scope(self):
+    status = lanfang.runner.base.SharedStatus(
+        {"exitcode": int, "need_stop": bool},
+        shared_scope=lanfang.runner.base.SharedScope.PROCESS)
+
+    def _update(status):
+      status.update(exitcode=3, need_stop=True)
+
+    proc = multiprocessing.Process(target=_update, args=(status,))
+    proc.start()
+    proc.join()
+    self.assertEqual(status["exitcode"], 3)
+    self.assertIs(status["need_stop"], True)
+
+  def test_interrupted_write(self):
+    status = lanfang.runner.base.SharedStatus(
+        {"exitcode": int, "attempts": int}, exitcode=0, attempts=0,
+        shared_scope=lanfang.runner.base.SharedScope.PROCESS)
+
+    def _killed_writer(status):
+      # Terminated between the two updates of the sequence.
+      status._acquire()
+      status._m_sequence.value += 1
+      status._m_values[1] = 1.0
+      os.kill(os.getpid(), signal.SIGKILL)
+
+    proc = multiprocessing.Process(target=_killed_writer, args=(status,))
+    proc.start()
+    # The writer isn't reaped yet, so it's a zombie while reading.
+    multiprocessing.connection.wait([proc.sentinel])
+    self.assertEqual(status["exitcode"], 0)
+    self.assertEqual(status._m_sequence.value % 2, 0)
+    status["attempts"] = 2
+    self.assertEqual(status["attempts"], 2)
+    proc.join()
+    self.assertEqual(proc.exitcode, -signal.SIGKILL)
+
+    # A live writer holding the lock isn't taken over.
+    self.assertTrue(status._acquire())
+    with self.assertRaises(RuntimeError):
+      status["exitcode"] = 1
+    status._release()
+    self.assertEqual(status["exitcode"], 0)
+
+
+class TestSharedDataServer(unittest.TestCase):
+  def test_namespace(self):
+    server = lanfang.runner.base.SharedDataServer()
+    data_1 = server.create({"name": "data_1"})
+    data_2 = server.create()
+
+    def _update(data):
+      data["output"] = [1, 2, 3]
+
+    proc = multiprocessing.Process(target=_update, args=(data_2,))
+    proc.start()
+    proc.join()
+    self.assertDictEqual(dict(data_1), {"name": "data_1"})
+    self.assertDictEqual(dict(data_2), {"output": [1, 2, 3]})
+
+    del data_1["name"]
+    self.assertEqual(len(data_1), 0)
+    self.assertEqual(len(data_2), 1)
+    server.shutdown()
+
+  def test_items(self):
+    server = lanfang.runner.base.SharedDataServer()
+    data = server.create({"a": [1], "b": {"c": 2}})
+    data.update(d=3)
+    self.assertEqual(data["b"], {"c": 2})
+    self.assertEqual(sorted(data), ["a", "b", "d"])
+
+    # Listing a namespace only returns its own items.
+    other = server.create({"e": 4})
+    self.assertEqual(sorted(data), ["a", "b", "d"])
+    self.assertEqual(len(data), 3)
+    self.assertEqual(other.copy(), {"e": 4})
+    self.assertEqual(data._m_shared_dict.get_items(["a", "e"]), {"a": [1]})
+
+    context = lanfang.runner.multi_task_context.RecordRunnerContext(
+        shared_server=server)
+    context.set_input("task", {"x": 1})
+    context.set_output("task", {"y": 2})
+    self.assertEqual(context.get_input("task"), {"x": 1})
+    self.assertEqual(context.get_output("other"), {})
+    self.assertEqual(context.get_data(),
+                     {"task": {"input": {"x": 1}, "output": {"y": 2}}})
+    self.assertEqual(context.get_data(["task"]), context.get_data())
+    server.shutdown()
@@ -1,6 +1,9 @@
 import lanfang
 import unittest
 import subprocess
+import threading
+import tempfile
+import sys
 
 
 class TestCmdRunner(unittest.TestCase):
@@ -32,6 +35,131 @@ class TestCmdRunner(unittest.TestCase):
     self.assertIn("params_num", output)
     self.assertEqual(len(output) - 1, output["params_num"])
 
+  def test_capture(self):
+    for runner_class in [lanfang.runner.CmdRunner,
+                         lanfang.runner.AsyncCmdRunner]:
+      with tempfile.TemporaryFile("w+") as log_file:
+        task = runner_class(
+            target="seq 1 100000 && echo '{\"lines\": 100000}'",
+            shell=True,
+            capture_size=1024,
+            stdout=log_file)
+        task.start()
+        task.join()
+
+        self.assertEqual(task.exitcode, 0)
+        self.assertDictEqual(task.output, {"lines": 100000})
+        log_file.seek(0)
+        self.assertEqual(len(log_file.readlines()), 100001)
+
+  def test_result_file(self):
+    script = "echo log && echo '{\"name\": \"Donald\"}' > $%s" % (
+        lanfang.runner.cmd_runner.__TASK_ENV_RESULT__)
+    for runner_class in [lanfang.runner.CmdRunner,
+                         lanfang.runner.AsyncCmdRunner]:
+      for capture_stdout in [True, False]:
+        with tempfile.TemporaryFile("w+") as log_file:
+          task = runner_class(
+              target=script,
+              shell=True,
+              capture_stdout=capture_stdout,
+              stdout=log_file)
+          task.start()
+          task.join()
+
+          self.assertEqual(task.exitcode, 0)
+          self.assertDictEqual(task.output, {"name": "Donald"})
+          log_file.seek(0)
+          self.assertEqual(log_file.read(), "log\n")
+
+  def test_usage(self):
+    # The usage of the shell includes its waited children.
+    task = lanfang.runner.CmdRunner(
+        target="%s -c 'x = bytearray(64 << 20); sum(range(10 ** 6))'; "
+               "exit 1" % (sys.executable),
+        shell=True, retry=2, interval=0)
+    task.start()
+    task.join()
+    self.assertEqual(task.exitcode, 1)
+    self.assertGreaterEqual(task.usage["max_rss"], 64 << 20)
+    self.assertGreater(task.usage["cpu_user"] + task.usage["cpu_sys"], 0)
+    attempts = [span["args"]["usage"] for span in task.spans
+                    if span["name"] == "execute"]
+    self.assertEqual(len(attempts), 2)
+    self.assertAlmostEqual(task.usage["cpu_user"],
+                           sum(usage["cpu_user"] for usage in attempts))
+
+
+class TestAsyncCmdRunner(unittest.TestCase):
+  def test_run(self):
+    event_loop = lanfang.runner.RunnerEventLoop()
+    task_1 = lanfang.runner.AsyncCmdRunner(
+        target=["echo", '{"name": "Donald"}'],
+        stdout=subprocess.PIPE,
+        event_loop=event_loop)
+    task_2 = lanfang.runner.AsyncCmdRunner(
+        target="echo log && exit 3",
+        shell=True,
+        retry=2,
+        interval=0.1,
+        stdout=subprocess.PIPE,
+        event_loop=event_loop)
+    task_3 = lanfang.runner.AsyncCmdRunner(
+        target=["sleep", "10"],
+        event_loop=event_loop)
+    for task in [task_1, task_2, task_3]:
+      task.start()
+
+    task_1.join()
+    task_2.join()
+    self.assertEqual(task_1.exitcode, 0)
+    self.assertDictEqual(task_1.output, {"name": "Donald"})
+    self.assertEqual(task_2.exitcode, 3)
+    self.assertTupleEqual(task_2.attempts, (2, 2))
+
+    self.assertTrue(task_3.is_alive())
+    task_3.stop()
+    task_3.join(timeout=5)
+    self.assertFalse(task_3.is_alive())
+    event_loop.close()
+
+  def test_slow_hook(self):
+    event_loop = lanfang.runner.RunnerEventLoop()
+    released = threading.Event()
+
+    class SlowHook(lanfang.runner.RunnerHook):
+      def begin(self, target, input_values):
+        released.wait(10)
+
+      def end(self, target, input_values, output_values):
+        pass
+
+    task_1 = lanfang.runner.AsyncCmdRunner(
+        target=["true"], hooks=[SlowHook()], event_loop=event_loop)
+    task_2 = lanfang.runner.AsyncCmdRunner(
+        target=["true"], event_loop=event_loop)
+    task_1.start()
+    task_2.start()
+    # The hook of task_1 doesn't block the event loop.
+    task_2.join(timeout=5)
+    self.assertFalse(task_2.is_alive())
+    self.assertEqual(task_2.exitcode, 0)
+    self.assertTrue(task_1.is_alive())
+
+    released.set()
+    task_1.join(timeout=5)
+    self.assertEqual(task_1.exitcode, 0)
+    event_loop.close()
+
+  def test_run_sync(self):
+    task = lanfang.runner.AsyncCmdRunner(
+        target=["echo", '{"name": "Donald"}'], stdout=subprocess.PIPE)
+    self.assertNotIsInstance(task, threading.Thread)
+    # run() executes the command in the calling thread.
+    task.run()
+    self.assertEqual(task.exitcode, 0)
+    self.assertDictEqual(task.output, {"name": "Donald"})
+
 
 if __name__ == "__main__":
   # The following code are used fo TestCmdRunner.test_context.
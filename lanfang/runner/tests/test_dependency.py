@@ -30,3 +30,63 @@ class TestTaskTopologicalGraph(unittest.TestCase):
 
     nodes = graph.subset("1,2").get_nodes()
     self.assertEqual(len(nodes), 2)
+
+  def test_reverse_depends(self):
+    graph = lanfang.runner.TopologicalGraph.from_data([
+      ("task1", None),
+      ("task2", "task1"),
+      ("task3", "task1"),
+      ("report", "task2,task3"),
+    ])
+    self.assertSetEqual(graph.reverse_depends("task1"), {"task2", "task3"})
+    self.assertSetEqual(graph.reverse_depends("task1", recursive=True),
+                        {"task2", "task3", "report"})
+    self.assertSetEqual(graph.reverse_depends("task1"), {"task2", "task3"})
+
+    graph.add("summary", "report")
+    self.assertSetEqual(graph.reverse_depends("task2", recursive=True),
+                        {"report", "summary"})
+
+  def test_subset_closure(self):
+    graph = lanfang.runner.TopologicalGraph.from_data([
+      ("fetch_1", None),
+      ("fetch_2", None),
+      ("train", "fetch_1,fetch_2"),
+      ("evaluate", "train"),
+      ("report", "evaluate"),
+    ])
+    self.assertListEqual(graph.subset("+train").get_nodes(),
+                         ["fetch_1", "fetch_2", "train"])
+    self.assertListEqual(graph.subset("evaluate+").get_nodes(),
+                         ["evaluate", "report"])
+    self.assertListEqual(graph.subset("+evaluate+,fetch_1").get_nodes(),
+                         ["fetch_1", "fetch_2", "train", "evaluate", "report"])
+    self.assertListEqual(graph.subset("fetch_\\d+").get_nodes(),
+                         ["fetch_1", "fetch_2"])
+
+
+class TestDynamicTopologicalGraph(unittest.TestCase):
+  def test_top_remove(self):
+    graph = lanfang.runner.DynamicTopologicalGraph.from_data([
+      ("task1", None),
+      ("task2", None),
+      ("run_task1", "task1,task2"),
+      ("run_task2", "task2"),
+      ("report", "run_task1,run_task2"),
+    ])
+    self.assertListEqual(graph.top(), ["task1", "task2"])
+    self.assertListEqual(graph.top(1), ["task1"])
+    with self.assertRaises(ValueError):
+      graph.remove("run_task1")
+
+    graph.remove("task2")
+    self.assertListEqual(graph.top(), ["task1", "run_task2"])
+    self.assertSetEqual(graph.depends("run_task1"), {"task1"})
+
+    graph.remove("task1")
+    graph.remove("run_task2")
+    self.assertListEqual(graph.top(), ["run_task1"])
+    graph.remove("run_task1")
+    self.assertListEqual(graph.top(2), ["report"])
+    graph.remove("report")
+    self.assertListEqual(graph.top(), [])
@@ -1,5 +1,8 @@
 import lanfang
 import unittest
+import os
+import signal
+import time
 
 
 class TestFuncProcessRunner(unittest.TestCase):
@@ -43,6 +46,19 @@ class TestFuncProcessRunner(unittest.TestCase):
     runner.join()
     self.assertEqual(runner.output, '1 + 3 = 4')
 
+  def test_usage(self):
+    def allocate(size):
+      data = bytearray(size)
+      return {"size": len(data)}
+
+    runner = lanfang.runner.FuncProcessRunner(
+        target=allocate, name="runner", args=(64 << 20,))
+    runner.start()
+    runner.join()
+    self.assertEqual(runner.exitcode, 0)
+    self.assertGreaterEqual(runner.usage["max_rss"], 64 << 20)
+    self.assertIsNone(lanfang.runner.FuncThreadRunner(target=sum).usage)
+
   def test_context(self):
     context = lanfang.runner.RunnerContext()
     input_params = {"name": "Donald", "age": 18, "money": 3000}
@@ -124,3 +140,58 @@ class TestFuncThreadRunner(unittest.TestCase):
     self.assertEqual(runner.output["name"], "Donald")
     self.assertEqual(runner.output["year"], 2019)
     self.assertEqual(runner.output["money"], 50)
+
+
+class TestFuncPoolRunner(unittest.TestCase):
+  def test_run(self):
+    def _proc_with_exception(a, b, name="test"):
+      raise ValueError("Test Exception")
+
+    def _proc_with_pid():
+      return os.getpid()
+
+    worker_pool = lanfang.runner.FuncWorkerPool(1)
+    runner_1 = lanfang.runner.FuncPoolRunner(
+        target=_proc_with_exception, name="runner_1", args=(1, 2),
+        retry=3, interval=0.1, worker_pool=worker_pool)
+    runner_2 = lanfang.runner.FuncPoolRunner(
+        target=sum, name="runner_2", args=(range(10),),
+        worker_pool=worker_pool)
+    runner_3 = lanfang.runner.FuncPoolRunner(
+        target=_proc_with_pid, name="runner_3", worker_pool=worker_pool)
+    runner_4 = lanfang.runner.FuncPoolRunner(
+        target=_proc_with_pid, name="runner_4", worker_pool=worker_pool)
+    for runner in [runner_1, runner_2, runner_3, runner_4]:
+      runner.start()
+      runner.join()
+
+    self.assertEqual(runner_1.exitcode, 1)
+    self.assertTupleEqual(runner_1.attempts, (3, 3))
+    self.assertEqual(runner_2.exitcode, 0)
+    self.assertEqual(runner_2.output, 45)
+    # The worker process is reused.
+    self.assertNotEqual(runner_3.output, os.getpid())
+    self.assertEqual(runner_3.output, runner_4.output)
+    worker_pool.shutdown()
+
+  def test_stop(self):
+    def _proc_with_sleep(seconds):
+      time.sleep(seconds)
+
+    worker_pool = lanfang.runner.FuncWorkerPool(1)
+    runner = lanfang.runner.FuncPoolRunner(
+        target=_proc_with_sleep, name="runner", args=(10,),
+        worker_pool=worker_pool)
+    runner.start()
+    time.sleep(0.5)
+    runner.stop()
+    runner.join(timeout=5)
+    self.assertFalse(runner.is_alive())
+    self.assertEqual(runner.exitcode, -signal.SIGTERM)
+
+    runner = lanfang.runner.FuncPoolRunner(
+        target=sum, name="runner", args=([1, 2],), worker_pool=worker_pool)
+    runner.start()
+    runner.join()
+    self.assertEqual(runner.output, 3)
+    worker_pool.shutdown()
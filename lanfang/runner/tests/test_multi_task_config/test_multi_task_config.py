@@ -1,15 +1,16 @@
 import lanfang
 import unittest
+import unittest.mock
 import os
 
 
 class TestMultiTaskJsonnetConfig(unittest.TestCase):
   def setUp(self):
-    config_file = os.path.join(
+    self._m_config_file = os.path.join(
         os.path.dirname(os.path.realpath(__file__)),
         "multi_task_config.jsonnet")
     self._m_config = lanfang.runner.MultiTaskJsonnetConfig(
-        config_file = config_file)
+        config_file = self._m_config_file)
 
   def tearDown(self):
     pass
@@ -101,3 +102,54 @@ class TestMultiTaskJsonnetConfig(unittest.TestCase):
     self.assertEqual(config["train"]["input"]["train_data"], "./train")
     self.assertEqual(config["train"]["input"]["dev_data"], "./dev")
     self.assertEqual(config["evaluate"]["input"]["data"], "./test")
+
+  def test_incremental_evaluation(self):
+    module = lanfang.runner.multi_task_config
+    with unittest.mock.patch.object(module, "_evaluate_snippet",
+        wraps=module._evaluate_snippet) as evaluate_snippet:
+      # The template is parsed and checked once for the same file.
+      config = lanfang.runner.MultiTaskJsonnetConfig(
+          config_file = self._m_config_file)
+      self.assertEqual(evaluate_snippet.call_count, 0)
+
+      config.set_params({
+        "locale": "zh_CN",
+        "data_url": "http://fakeurl.com",
+        "learning_rate": 3e-4
+      })
+      config.get_config()
+      self.assertEqual(evaluate_snippet.call_count, 2)
+
+      # No template refers to 'train_acc'.
+      config.update_output("train", {"train_acc": 0.8})
+      self.assertEqual(config.get_config()["train"]["output"]["train_acc"], 0.8)
+      self.assertEqual(evaluate_snippet.call_count, 2)
+
+      # Fields take the output as it is are updated in place.
+      config.update_output("fetch_data", {"train": "./train"})
+      self.assertEqual(
+          config.get_config()["train"]["input"]["train_data"], "./train")
+      self.assertEqual(evaluate_snippet.call_count, 2)
+
+      # 'model' is accessed by 'self.model', so the config is evaluated.
+      config.update_output("train", {"model_path": "./model/best"})
+      self.assertEqual(
+          config.get_config()["evaluate"]["input"]["model"], "./model/best")
+      self.assertEqual(evaluate_snippet.call_count, 3)
+
+  def test_snapshot(self):
+    self._m_config.set_params({
+      "locale": "zh_CN",
+      "data_url": "http://fakeurl.com",
+      "learning_rate": 3e-4
+    })
+    config = self._m_config.get_config()
+    self.assertIs(self._m_config.get_config(), config)
+    with self.assertRaises(TypeError):
+      config["train"]["input"]["model"] = "cnn"
+
+    self._m_config.update_output("fetch_data", {"train": "./train"})
+    new_config = self._m_config.get_config()
+    self.assertEqual(config["train"]["input"]["train_data"], None)
+    self.assertEqual(new_config["train"]["input"]["train_data"], "./train")
+    self.assertIs(new_config["evaluate"], config["evaluate"])
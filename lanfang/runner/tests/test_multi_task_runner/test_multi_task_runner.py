@@ -4,6 +4,10 @@ import subprocess
 import os
 import tempfile
 import shutil
+import threading
+import time
+import json
+import collections
 
 
 class TestRunnerInventory(unittest.TestCase):
@@ -34,8 +38,117 @@ class TestRunnerInventory(unittest.TestCase):
     self.assertIsNone(task_info["elapsed_time"])
     self.assertTupleEqual(task_info["attempts"], (0, 1))
 
+  def test_wait(self):
+    inventory = lanfang.runner.multi_task_runner.RunnerInventory()
+    inventory.add(name="sleep_cmd", target=["sleep", "10"])
+    inventory.add(name="quick_cmd", target=["true"])
+    inventory.add(name="quick_func", target=sum, args=(range(10),))
+
+    for name in inventory.list():
+      inventory.start(name)
+
+    finished = set()
+    while len(finished) < 2:
+      finished |= inventory.wait(set(inventory.list()) - finished, timeout=5)
+    self.assertSetEqual(finished, {"quick_cmd", "quick_func"})
+    self.assertTrue(inventory.is_alive("sleep_cmd"))
+    inventory.close(force=True)
+
+  def test_close_async_runner(self):
+    inventory = lanfang.runner.multi_task_runner.RunnerInventory(
+        use_asyncio=True)
+    inventory.add(name="sleep_cmd", target=["sleep", "10"])
+    inventory.start("sleep_cmd")
+    runner = inventory._m_runners["sleep_cmd"]["runner"]
+    self.assertTrue(runner.is_alive())
+    inventory.close(force=True)
+    # The coroutine is finished before the event loop is closed.
+    self.assertFalse(runner.is_alive())
+    self.assertNotEqual(runner.exitcode, 0)
+
+  def test_wait_finished_elsewhere(self):
+    inventory = lanfang.runner.multi_task_runner.RunnerInventory()
+    inventory.add(name="sleep_cmd", target=["sleep", "10"])
+    inventory.add(name="quick_cmd", target=["true"])
+    for name in inventory.list():
+      inventory.start(name)
+    while inventory.is_alive("quick_cmd"):
+      time.sleep(0.01)
+
+    # The wakeup of 'quick_cmd', which is never waited for, is consumed.
+    inventory.wait(["sleep_cmd"], timeout=0)
+    start_time = time.time()
+    self.assertSetEqual(inventory.wait(["sleep_cmd"], timeout=0.5), set())
+    self.assertGreaterEqual(time.time() - start_time, 0.4)
+    inventory.close(force=True)
+
+  def test_wait_returning_runner(self):
+    inventory = lanfang.runner.multi_task_runner.RunnerInventory()
+    inventory.add(name="quick_func", target=sum, args=(range(10),),
+                  runner_class=lanfang.runner.FuncThreadRunner)
+    # The runner is still alive for a while after it's notified.
+    inventory._m_runners["quick_func"]["runner"].add_done_callback(
+        lambda runner: time.sleep(0.3))
+    inventory.start("quick_func")
+    while len(inventory._m_done_names) == 0:
+      time.sleep(0.01)
+
+    start_time = time.time()
+    self.assertSetEqual(inventory.wait(["quick_func"], timeout=5),
+                        {"quick_func"})
+    self.assertLess(time.time() - start_time, 4)
+    inventory.close(force=True)
+
+
+class TestParallelScheduler(unittest.TestCase):
+  def test_sort(self):
+    dependency = lanfang.runner.TopologicalGraph.from_data([
+      ("prepare_a", None),
+      ("prepare_b", None),
+      ("prepare_c", None),
+      ("train", "prepare_c"),
+      ("evaluate", "train"),
+    ])
+    scheduler = lanfang.runner.ParallelScheduler(
+        {"prepare_a": 2, "prepare_b": 5, "train": 100, "evaluate": 10})
+    scheduler.prepare(dependency, None)
+    # 'prepare_c' has no estimation, it costs the mean of the others.
+    self.assertListEqual(
+        scheduler.sort(["prepare_a", "prepare_b", "prepare_c"]),
+        ["prepare_c", "prepare_b", "prepare_a"])
+
+    scheduler = lanfang.runner.ParallelScheduler(default_cost=0)
+    scheduler.prepare(dependency, None)
+    self.assertListEqual(
+        scheduler.sort(["prepare_b", "prepare_c", "prepare_a"]),
+        ["prepare_a", "prepare_b", "prepare_c"])
+
 
 class TestMultiTaskRunner(unittest.TestCase):
+  def test_capacity(self):
+    lock = threading.Lock()
+    usage = {"cpu": 0, "max_cpu": 0}
+    def occupy(cpu):
+      with lock:
+        usage["cpu"] += cpu
+        usage["max_cpu"] = max(usage["max_cpu"], usage["cpu"])
+      time.sleep(0.2)
+      with lock:
+        usage["cpu"] -= cpu
+      return {}
+
+    scheduler = lanfang.runner.MultiTaskRunner(capacity={"cpu": 4})
+    for name, cpu in [("heavy", 3), ("light_a", 1), ("light_b", 1),
+                      ("light_c", 2)]:
+      scheduler.add(name, occupy, args=(cpu,), resources={"cpu": cpu},
+                    runner_class=lanfang.runner.FuncThreadRunner)
+    with self.assertRaises(ValueError):
+      scheduler.add("huge", occupy, args=(5,), resources={"cpu": 5},
+                    runner_class=lanfang.runner.FuncThreadRunner)
+    self.assertEqual(scheduler.run(), 0)
+    self.assertEqual(usage["max_cpu"], 4)
+    scheduler.close()
+
   def test_not_share_params(self):
     scheduler = lanfang.runner.MultiTaskRunner()
     scheduler.add(
@@ -69,6 +182,216 @@ class TestMultiTaskRunner(unittest.TestCase):
       args=(range(10000000),))
     self.assertEqual(scheduler.run(try_best=True, verbose=True), 3)
 
+  def test_cache(self):
+    executed = []
+    def square(x):
+      executed.append("square")
+      return {"value": x * x}
+
+    def plus_one(x):
+      executed.append("plus_one")
+      return {"value": x + 1}
+
+    # The output of 'square' is changed for x = 4,
+    # so 'plus_one' is executed again.
+    cache_dir = tempfile.mkdtemp()
+    for x, expected_executed, expected_hits in [
+            (3, ["square", "plus_one"], 0),
+            (3, [], 2),
+            (4, ["square", "plus_one"], 0)]:
+      executed.clear()
+      cache = lanfang.runner.TaskResultCache(cache_dir)
+      scheduler = lanfang.runner.MultiTaskRunner(cache=cache)
+      scheduler.add("square", square, args=(x,),
+                    runner_class=lanfang.runner.FuncThreadRunner)
+      scheduler.add("plus_one", plus_one, args=(7,), depends="square",
+                    runner_class=lanfang.runner.FuncThreadRunner)
+      self.assertEqual(scheduler.run(), 0)
+      scheduler.close()
+      self.assertListEqual(executed, expected_executed)
+      self.assertEqual(cache.stats()["hits"], expected_hits)
+
+    # Arguments which can't be serialized into json disable the cache.
+    for _ in range(2):
+      executed.clear()
+      cache = lanfang.runner.TaskResultCache(cache_dir)
+      scheduler = lanfang.runner.MultiTaskRunner(cache=cache)
+      scheduler.add("square", square, args=(3,),
+                    runner_class=lanfang.runner.FuncThreadRunner)
+      scheduler.add("plus_one", lambda x, unused: plus_one(x),
+                    args=(7, object()), depends="square",
+                    runner_class=lanfang.runner.FuncThreadRunner)
+      self.assertEqual(scheduler.run(), 0)
+      scheduler.close()
+      self.assertIn("plus_one", executed)
+    shutil.rmtree(cache_dir)
+
+  def test_artifacts(self):
+    executed = []
+    content = ["a"]
+    def write_vocab(vocab_file):
+      executed.append("write_vocab")
+      with open(vocab_file, "w") as fout:
+        fout.write(content[0])
+      return {"vocab_file": vocab_file}
+
+    def count_vocab():
+      executed.append("count_vocab")
+      return {"size": 1}
+
+    cache_dir = tempfile.mkdtemp()
+    vocab_file = os.path.join(cache_dir, "vocab.txt")
+    def touch():
+      os.utime(vocab_file, ns=(0, 0))
+
+    def rewrite():
+      os.remove(vocab_file)
+      content[0] = "b"
+
+    # Only the md5 value matters, and 'count_vocab' is executed again
+    # only if the content of the vocab file is changed.
+    for prepare, expected_executed in [
+            (None, ["write_vocab", "count_vocab"]),
+            (None, []),
+            (touch, []),
+            (rewrite, ["write_vocab", "count_vocab"])]:
+      prepare and prepare()
+      executed.clear()
+      scheduler = lanfang.runner.MultiTaskRunner(
+          cache=lanfang.runner.TaskResultCache(cache_dir))
+      scheduler.add("write_vocab", write_vocab, args=(vocab_file,),
+                    artifacts=["vocab_file"],
+                    runner_class=lanfang.runner.FuncThreadRunner)
+      scheduler.add("count_vocab", count_vocab, depends="write_vocab",
+                    runner_class=lanfang.runner.FuncThreadRunner)
+      self.assertEqual(scheduler.run(), 0)
+      scheduler.close()
+      self.assertListEqual(executed, expected_executed)
+    shutil.rmtree(cache_dir)
+
+  def test_journal(self):
+    def square(x):
+      return {"value": x * x}
+
+    checkpoint_path = tempfile.mkdtemp()
+    scheduler = lanfang.runner.MultiTaskRunner()
+    for i in range(3):
+      scheduler.add("square_%d" % i, square, args=(i,),
+                    runner_class=lanfang.runner.FuncThreadRunner)
+    scheduler.save(checkpoint_path, journal=True)
+    self.assertEqual(scheduler.run(["square_1"]), 0)
+    scheduler.save(checkpoint_path, journal=True)
+    scheduler.close()
+
+    # A partially written line is dropped.
+    with open(os.path.join(checkpoint_path, "journal.jsonl"), "a") as fout:
+      fout.write('{"name": "square_2", ')
+
+    restore_scheduler = lanfang.runner.MultiTaskRunner()
+    for i in range(3):
+      restore_scheduler.add("square_%d" % i, square, args=(i,),
+                            runner_class=lanfang.runner.FuncThreadRunner)
+    restore_scheduler.restore(checkpoint_path)
+    record = restore_scheduler._get_cached_record(None)
+    self.assertEqual(record["runner_inventory"].status("square_1"),
+                     lanfang.runner.RunnerStatus.DONE)
+    self.assertEqual(record["runner_inventory"].status("square_2"),
+                     lanfang.runner.RunnerStatus.WAITING)
+    self.assertDictEqual(record["context"].get_output("square_1"),
+                         {"value": 1})
+    restore_scheduler.close()
+
+    # Costs of the finished tasks are read from the journal.
+    parallel_scheduler = lanfang.runner.ParallelScheduler.from_checkpoint(
+        checkpoint_path)
+    self.assertListEqual(list(parallel_scheduler._m_costs), ["square_1"])
+
+    journal = lanfang.runner.CheckpointJournal(checkpoint_path)
+    self.assertEqual(len(journal.tasks), 3)
+    journal.compact()
+    journal.close()
+    self.assertEqual(os.path.getsize(
+        os.path.join(checkpoint_path, "journal.jsonl")), 0)
+    shutil.rmtree(checkpoint_path)
+
+  def test_trace(self):
+    class NoopHook(lanfang.runner.RunnerHook):
+      def begin(self, target, input_values):
+        pass
+
+      def end(self, target, input_values, output_values):
+        pass
+
+    def square(x):
+      return {"value": x * x}
+
+    trace_dir = tempfile.mkdtemp()
+    trace_file = os.path.join(trace_dir, "trace.json")
+    scheduler = lanfang.runner.MultiTaskRunner(parallel_degree=1)
+    scheduler.add("square", square, args=(3,), hooks=[NoopHook()])
+    scheduler.add("echo", ["echo", "{}"], depends="square")
+    scheduler.add("failed", "exit 2", shell=True, retry=2, interval=0)
+    self.assertEqual(scheduler.run(try_best=True, checkpoint_path=trace_dir,
+                                   trace_file=trace_file), 1)
+    scheduler.close()
+
+    with open(trace_file, "r") as fin:
+      events = json.load(fin)["traceEvents"]
+    threads = {e["tid"]: e["args"]["name"] for e in events if e["ph"] == "M"}
+    spans = collections.defaultdict(list)
+    for e in events:
+      if e["ph"] == "X":
+        spans[threads[e["tid"]]].append(e["name"])
+        self.assertGreaterEqual(e["dur"], 0)
+
+    self.assertIn("checkpoint", spans["MultiTaskRunner"])
+    self.assertListEqual(spans["square"], ["square", "queue", "spawn",
+        "fetch_input", "hook_begin", "execute", "hook_end", "publish"])
+    self.assertListEqual(spans["echo"], ["echo", "queue", "spawn",
+        "fetch_input", "execute", "publish"])
+    self.assertListEqual(spans["failed"], ["failed", "queue", "spawn",
+        "fetch_input", "execute", "execute"])
+    shutil.rmtree(trace_dir)
+
+  def test_resume(self):
+    executed = []
+    broken = [True]
+    def prepare():
+      executed.append("prepare")
+      return {}
+
+    def train():
+      executed.append("train")
+      if broken[0]:
+        raise ValueError("Broken")
+      return {}
+
+    checkpoint_path = tempfile.mkdtemp()
+    for expected_failed, expected_executed in [
+            (1, ["prepare", "train"]),
+            (0, ["train"])]:
+      executed.clear()
+      scheduler = lanfang.runner.MultiTaskRunner()
+      scheduler.add("prepare", prepare,
+                    runner_class=lanfang.runner.FuncThreadRunner)
+      scheduler.add("train", train, depends="prepare",
+                    runner_class=lanfang.runner.FuncThreadRunner)
+      threads = set()
+      get_cached_record = scheduler._get_cached_record
+      def _get_cached_record(params):
+        threads.add(threading.current_thread())
+        return get_cached_record(params)
+      scheduler._get_cached_record = _get_cached_record
+      self.assertEqual(scheduler.run(
+          checkpoint_path=checkpoint_path, resume=True, try_best=True),
+          expected_failed)
+      scheduler.close()
+      # The checkpointer thread doesn't touch the cached records.
+      self.assertSetEqual(threads, {threading.current_thread()})
+      self.assertListEqual(executed, expected_executed)
+      broken[0] = False
+    shutil.rmtree(checkpoint_path)
+
   def _add_shared_tasks(self, scheduler):
     scheduler.add(
         name="fetch_vocab",
@@ -0,0 +1,74 @@
+import lanfang
+import unittest
+import os
+
+
+class TestOutputStore(unittest.TestCase):
+  def test_put(self):
+    with lanfang.runner.OutputStore(min_size=1024) as store:
+      output = store.offload({
+        "data": b"0123456789" * 200,
+        "items": list(range(1000)),
+        "tags": {"a", "b"},
+        "name": "small",
+      })
+      self.assertEqual(output["name"], "small")
+      self.assertTrue(lanfang.runner.output_store.is_handle(output["data"]))
+      self.assertTrue(lanfang.runner.output_store.is_handle(output["tags"]))
+
+      loaded = lanfang.runner.output_store.resolve(output)
+      self.assertIsInstance(loaded["data"], memoryview)
+      self.assertEqual(bytes(loaded["data"][:10]), b"0123456789")
+      self.assertEqual(loaded["items"], list(range(1000)))
+      self.assertEqual(loaded["tags"], {"a", "b"})
+
+      # The same value is saved once.
+      self.assertEqual(store.put(b"0123456789" * 200), output["data"])
+    self.assertFalse(os.path.exists(store.store_dir))
+
+  def test_runner(self):
+    server = lanfang.runner.base.SharedDataServer()
+    context = lanfang.runner.multi_task_context.RecordRunnerContext(
+        shared_server=server)
+
+    with lanfang.runner.OutputStore(min_size=1024) as store:
+      def produce():
+        return {"data": b"x" * 4096}
+
+      producer = lanfang.runner.FuncProcessRunner(
+          target=produce, name="produce", context=context,
+          shared_server=server, output_store=store)
+      producer.start()
+      producer.join()
+      self.assertEqual(producer.exitcode, 0)
+      handle = context.get_output("produce")["data"]
+      self.assertTrue(lanfang.runner.output_store.is_handle(handle))
+
+      def consume(data):
+        return {"size": len(data), "view": isinstance(data, memoryview),
+                "data": data}
+
+      class Hook(lanfang.runner.RunnerHook):
+        def begin(self, target, input_values):
+          seen.append(bytes(input_values["data"][:1]))
+
+        def end(self, target, input_values, output_values):
+          seen.append(bytes(output_values["data"][:1]))
+
+      context.set_input("consume", {"data": handle})
+      for runner_class in [lanfang.runner.FuncThreadRunner,
+                           lanfang.runner.FuncPoolRunner]:
+        seen = []
+        consumer = runner_class(
+            target=consume, name="consume", context=context,
+            shared_server=server, output_store=store, hooks=[Hook()])
+        consumer.start()
+        consumer.join()
+        self.assertEqual(consumer.exitcode, 0)
+        output = context.get_output("consume")
+        self.assertEqual(output["size"], 4096)
+        self.assertTrue(output["view"])
+        self.assertTrue(lanfang.runner.output_store.is_handle(output["data"]))
+        # Hooks see the values instead of the handles with both runners.
+        self.assertListEqual(seen, [b"x", b"x"])
+    server.shutdown()
@@ -0,0 +1,131 @@
+import lanfang
+import unittest
+import json
+import os
+import socket
+import tempfile
+import threading
+
+SECRET = "test-secret"
+
+
+def square(x):
+  return {"value": x * x}
+
+
+class TestRemoteRunner(unittest.TestCase):
+  def setUp(self):
+    self.agents = [
+      lanfang.runner.RemoteWorkerAgent(
+          secret=SECRET, start_dir=os.path.dirname(__file__),
+          slots=2, heartbeat_interval=0.1).start() for _ in range(2)]
+    self.server = lanfang.runner.base.SharedDataServer()
+    self.context = lanfang.runner.multi_task_context.RecordRunnerContext(
+        shared_server=self.server)
+
+  def tearDown(self):
+    for agent in self.agents:
+      agent.shutdown()
+    self.server.shutdown()
+
+  def _run(self, pool, target, name, **kwargs):
+    runner = lanfang.runner.RemoteRunner(
+        target, name=name, worker_pool=pool, context=self.context,
+        shared_server=self.server, **kwargs)
+    runner.start()
+    runner.join()
+    return runner
+
+  def test_run(self):
+    addresses = ["%s:%s" % agent.address for agent in self.agents]
+    with lanfang.runner.RemoteWorkerPool(addresses, secret=SECRET) as pool:
+      runner = self._run(
+          pool, "echo '{\"value\": 1}'", "cmd", shell=True)
+      self.assertEqual(runner.exitcode, 0)
+      self.assertEqual(self.context.get_output("cmd"), {"value": 1})
+
+      runner = self._run(pool, square, "func", kwargs={"x": 3})
+      self.assertEqual(runner.exitcode, 0)
+      self.assertEqual(self.context.get_output("func"), {"value": 9})
+
+      runner = self._run(pool, "exit 3", "failed", shell=True)
+      self.assertEqual(runner.exitcode, 3)
+
+    with self.assertRaises(TypeError):
+      lanfang.runner.RemoteRunner(lambda: None, worker_pool=pool)
+
+  def test_lost_worker(self):
+    # A worker agent which never sends heartbeats.
+    silent_server = socket.create_server(("127.0.0.1", 0))
+    connections = []
+    def serve():
+      connection, _ = silent_server.accept()
+      connection.sendall(json.dumps({"type": "hello", "challenge": "0"})
+                             .encode("utf-8") + b"\n")
+      connection.makefile("rb").readline()
+      connection.sendall(json.dumps({"type": "welcome", "slots": 1})
+                             .encode("utf-8") + b"\n")
+      connections.append(connection)
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+
+    addresses = [silent_server.getsockname(), self.agents[0].address]
+    with lanfang.runner.RemoteWorkerPool(
+        addresses, secret=SECRET, heartbeat_timeout=0.5) as pool:
+      runner = self._run(pool, square, "func", kwargs={"x": 4},
+                         retry=2, interval=0)
+      self.assertEqual(runner.exitcode, 0)
+      self.assertEqual(runner.attempts, (2, 2))
+      self.assertEqual(self.context.get_output("func"), {"value": 16})
+
+    thread.join()
+    for connection in connections:
+      connection.close()
+    silent_server.close()
+
+  def test_multi_task_runner(self):
+    addresses = [agent.address for agent in self.agents]
+    with lanfang.runner.RemoteWorkerPool(addresses, secret=SECRET) as pool:
+      scheduler = lanfang.runner.MultiTaskRunner(remote_worker_pool=pool)
+      for i in range(5):
+        scheduler.add("square_%d" % i, square, kwargs={"x": i})
+      scheduler.add("sum", "echo '{\"value\": 30}'", shell=True,
+                    depends=["square_%d" % i for i in range(5)])
+      self.assertEqual(scheduler.run(), 0)
+      scheduler.close()
+
+      # Agents are lost before the tasks finish.
+      scheduler = lanfang.runner.MultiTaskRunner(remote_worker_pool=pool)
+      scheduler.add("sleep", ["sleep", "10"])
+      timer = threading.Timer(0.5, self.agents[0].shutdown)
+      timer.start()
+      self.agents[1].shutdown()
+      self.assertNotEqual(scheduler.run(), 0)
+      timer.join()
+
+  def test_authentication(self):
+    marker = os.path.join(tempfile.mkdtemp(), "marker")
+    with socket.create_connection(self.agents[0].address) as connection:
+      stream = connection.makefile("rwb")
+      self.assertEqual(json.loads(stream.readline())["type"], "hello")
+      stream.write(json.dumps({"type": "run", "id": 0, "name": "touch",
+                               "target": "touch %s" % (marker),
+                               "input": {}, "kwargs": {"shell": True}})
+                       .encode("utf-8") + b"\n")
+      stream.flush()
+      # The agent closes the connection without executing the task.
+      self.assertEqual(stream.readline(), b"")
+    self.assertFalse(os.path.exists(marker))
+
+    with lanfang.runner.RemoteWorkerPool(
+        [self.agents[0].address], secret="wrong") as pool:
+      runner = self._run(pool, "true", "true", shell=True)
+      self.assertNotEqual(runner.exitcode, 0)
+
+  def test_rejected_target(self):
+    addresses = [self.agents[0].address]
+    with lanfang.runner.RemoteWorkerPool(addresses, secret=SECRET) as pool:
+      runner = self._run(pool, os.getcwd, "getcwd")
+      self.assertNotEqual(runner.exitcode, 0)
+      runner = self._run(pool, json.dumps, "dumps", kwargs={"obj": 1})
+      self.assertNotEqual(runner.exitcode, 0)
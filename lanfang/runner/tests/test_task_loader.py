@@ -0,0 +1,116 @@
+import lanfang
+import unittest
+import unittest.mock
+import tempfile
+import shutil
+import os
+
+
+TASK_TEMPLATE = """
+from lanfang import runner
+
+@runner.TaskRegister({"%(output)s": str})
+def %(name)s(%(input)s: str):
+  return {"%(output)s": %(input)s}
+"""
+
+
+class TestTaskLoader(unittest.TestCase):
+  def setUp(self):
+    self._m_num_tasks = len(lanfang.runner.TaskRegister.__tasks__)
+    self._m_start_dir = tempfile.mkdtemp()
+    self._m_index_dir = tempfile.mkdtemp()
+    self._write_task("a_tasks.py", "loader_task_a", "raw_data", "data")
+    self._write_task(os.path.join("sub", "b_tasks.py"),
+                     "loader_task_b", "data", "model")
+    self._write_task(os.path.join("sub", "helper.py"),
+                     "loader_helper", "data", "helper")
+    # Files in the ignored directories are never imported.
+    for ignored_dir in [".git", "venv"]:
+      os.makedirs(os.path.join(self._m_start_dir, ignored_dir))
+      with open(os.path.join(
+          self._m_start_dir, ignored_dir, "tasks.py"), 'w') as fout:
+        fout.write("raise RuntimeError()\n")
+
+  def tearDown(self):
+    del lanfang.runner.TaskRegister.__tasks__[self._m_num_tasks:]
+    shutil.rmtree(self._m_start_dir)
+    shutil.rmtree(self._m_index_dir)
+
+  def _write_task(self, path, name, input_name, output_name):
+    path = os.path.join(self._m_start_dir, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as fout:
+      fout.write(TASK_TEMPLATE % {
+          "name": name, "input": input_name, "output": output_name})
+
+  def _list(self, **kwargs):
+    # Each listing runs as a new process, with no registered tasks.
+    del lanfang.runner.TaskRegister.__tasks__[self._m_num_tasks:]
+    loader = lanfang.runner.TaskLoader(self._m_index_dir)
+    with unittest.mock.patch.object(loader, "_import_file",
+        wraps=loader._import_file) as import_file:
+      if "tasks" in kwargs:
+        tasks = loader.load(self._m_start_dir, **kwargs)
+      else:
+        tasks = loader.list(self._m_start_dir)
+    imported = [os.path.basename(call[0][0])
+                    for call in import_file.call_args_list]
+    return [task["name"] for task in tasks], imported
+
+  def test_discover(self):
+    loader = lanfang.runner.TaskLoader()
+    files = [os.path.relpath(path, self._m_start_dir)
+                 for path, _ in loader.discover(self._m_start_dir)]
+    self.assertEqual(files, ["a_tasks.py", os.path.join("sub", "b_tasks.py")])
+
+    files = loader.discover(self._m_start_dir, pattern=r".*\.py")
+    self.assertEqual(len(files), 3)
+
+  def test_index(self):
+    tasks, imported = self._list()
+    self.assertEqual(tasks, ["loader_task_a", "loader_task_b"])
+    self.assertEqual(imported, ["a_tasks.py", "b_tasks.py"])
+    task = lanfang.runner.TaskLoader(self._m_index_dir).list(
+        self._m_start_dir)[1]
+    self.assertEqual(task["input"], {"locals": [], "globals": ["data"]})
+    self.assertEqual(task["output"], {"locals": [], "globals": ["model"]})
+
+    # Unchanged files are not imported again.
+    tasks, imported = self._list()
+    self.assertEqual(tasks, ["loader_task_a", "loader_task_b"])
+    self.assertEqual(imported, [])
+
+    self._write_task(os.path.join("sub", "b_tasks.py"),
+                     "loader_task_c", "data", "best_model")
+    tasks, imported = self._list()
+    self.assertEqual(tasks, ["loader_task_a", "loader_task_c"])
+    self.assertEqual(imported, ["b_tasks.py"])
+
+    # Only the files registering the needed tasks are loaded.
+    tasks, imported = self._list(tasks=["loader_task_c"])
+    self.assertEqual(tasks, ["loader_task_c"])
+    self.assertEqual(imported, ["b_tasks.py"])
+
+    os.remove(os.path.join(self._m_start_dir, "sub", "b_tasks.py"))
+    tasks, imported = self._list(tasks=None)
+    self.assertEqual(tasks, ["loader_task_a"])
+    self.assertEqual(imported, ["a_tasks.py"])
+
+  def test_unwritable_index(self):
+    # A file is in the way of the index directory.
+    index_dir = os.path.join(self._m_index_dir, "file", "index")
+    with open(os.path.join(self._m_index_dir, "file"), 'w'):
+      pass
+    tasks = lanfang.runner.TaskLoader(index_dir).list(self._m_start_dir)
+    self.assertEqual([task["name"] for task in tasks],
+                     ["loader_task_a", "loader_task_b"])
+
+    # Nothing is left if the index can't be serialized.
+    loader = lanfang.runner.TaskLoader(self._m_index_dir)
+    loader._write_index(self._m_start_dir, {"file": object()})
+    self.assertEqual(os.listdir(self._m_index_dir), ["file"])
+
+
+if __name__ == "__main__":
+  unittest.main()
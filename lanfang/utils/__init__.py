@@ -7,6 +7,8 @@ from . import terminal
 from . import disk
 from . import random
 from . import func
+from . import frozen
+from . import lazy
 
 
 __all__ = [_s for _s in dir() if not _s.startswith('_')]
@@ -0,0 +1,143 @@
+"""
+Immutable snapshots of json-like values.
+
+A frozen value can be shared by all its readers without copying, and a new
+snapshot with a changed field shares all the other fields with the old one.
+"""
+
+import copy
+
+
+class FrozenDict(dict):
+  """A read-only dict.
+
+  It's a subclass of dict, so it can be passed to anything which
+  expects a dict, e.g. 'json.dumps'. Use 'dict(value)' to get a
+  mutable copy.
+  """
+
+  __slots__ = ()
+
+  def _immutable(self, *args, **kwargs):
+    raise TypeError("'%s' object is immutable" % (self.__class__.__name__))
+
+  __setitem__ = __delitem__ = __ior__ = _immutable
+  clear = pop = popitem = setdefault = update = _immutable
+
+  def __copy__(self):
+    return self
+
+  def __deepcopy__(self, memo):
+    return self
+
+  def __reduce__(self):
+    return (self.__class__, (dict(self),))
+
+  def __repr__(self):
+    return "%s(%s)" % (self.__class__.__name__, dict.__repr__(self))
+
+
+class FrozenList(list):
+  """A read-only list.
+
+  It's a subclass of list, so it can be passed to anything which
+  expects a list. Use 'list(value)' to get a mutable copy.
+  """
+
+  __slots__ = ()
+
+  def _immutable(self, *args, **kwargs):
+    raise TypeError("'%s' object is immutable" % (self.__class__.__name__))
+
+  __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+  append = clear = extend = insert = pop = remove = reverse = sort = \
+      _immutable
+
+  def __copy__(self):
+    return self
+
+  def __deepcopy__(self, memo):
+    return self
+
+  def __reduce__(self):
+    return (self.__class__, (list(self),))
+
+  def __repr__(self):
+    return "%s(%s)" % (self.__class__.__name__, list.__repr__(self))
+
+
+def is_frozen(value):
+  return isinstance(value, (FrozenDict, FrozenList))
+
+
+def freeze(value):
+  """Return a frozen snapshot of a json-like value.
+
+  Dicts and lists are converted recursively, frozen values are returned
+  as they are, so freezing a value which shares most of its fields
+  with a frozen one only converts the changed fields.
+  """
+  if isinstance(value, (FrozenDict, FrozenList)):
+    return value
+  if isinstance(value, dict):
+    return FrozenDict((k, freeze(v)) for k, v in value.items())
+  if isinstance(value, (list, tuple)):
+    return FrozenList(freeze(v) for v in value)
+  return value
+
+
+def thaw(value, memo=None):
+  """Return a mutable deep copy of a value which may contain
+  frozen values.
+
+  Parameters
+  ----------
+  memo: dict
+    The memo of 'copy.deepcopy', values keyed by their ids in it
+    are shared instead of copied.
+  """
+  if memo is not None and id(value) in memo:
+    return memo[id(value)]
+  if isinstance(value, dict):
+    return {k: thaw(v, memo) for k, v in value.items()}
+  if isinstance(value, list):
+    return [thaw(v, memo) for v in value]
+  if isinstance(value, (str, int, float, bool, type(None))):
+    return value
+  return copy.deepcopy(value, memo)
+
+
+def set_in(value, path, new_value):
+  """Return a new snapshot of 'value' with the field at 'path'
+  set to 'new_value'.
+
+  Only the dicts and lists along the path are copied,
+  all the other fields are shared with 'value'.
+
+  Parameters
+  ----------
+  value: FrozenDict, FrozenList
+    The frozen snapshot.
+
+  path: tuple
+    The keys and indexes from the root to the field.
+
+  new_value: object
+    The new value of the field, it's frozen as well.
+
+  Returns
+  -------
+  snapshot: FrozenDict, FrozenList
+  """
+  if len(path) == 0:
+    return freeze(new_value)
+
+  key = path[0]
+  child = set_in(value[key], path[1:], new_value)
+  if isinstance(value, dict):
+    items = dict(value)
+    items[key] = child
+    return FrozenDict(items)
+  items = list(value)
+  items[key] = child
+  return FrozenList(items)
@@ -0,0 +1,57 @@
+"""
+Lazy loading of submodules and attributes of a package (PEP 562).
+"""
+
+import importlib
+
+
+def attach(package_name, submodules=(), attributes=None):
+  """Load submodules and attributes of a package on first access.
+
+  Parameters
+  ----------
+  package_name: str
+    The name of the package, usually '__name__'.
+
+  submodules: list
+    Names of the submodules to be imported on first access,
+    e.g. 'runner' for 'lanfang.runner'.
+
+  attributes: dict
+    Attributes to be imported on first access, keyed by the attribute
+    names, the values are names of the submodules which define them,
+    e.g. {"Dataset": "engine.dataset"}.
+
+  Returns
+  -------
+  (__getattr__, __dir__, __all__): tuple
+    The module level functions and the public names of the package.
+
+  Examples
+  --------
+  >>> __getattr__, __dir__, __all__ = lazy.attach(
+  ...     __name__, ["runner", "ai"])
+  """
+  submodules = set(submodules)
+  attributes = dict(attributes or {})
+  public_names = sorted(submodules | set(attributes))
+
+  def __getattr__(name):
+    if name in submodules:
+      module = importlib.import_module("%s.%s" % (package_name, name))
+    elif name in attributes:
+      module = importlib.import_module(
+          "%s.%s" % (package_name, attributes[name]))
+      module = getattr(module, name)
+    else:
+      raise AttributeError("module '%s' has no attribute '%s'" % (
+          package_name, name))
+    # Cache the value, '__getattr__' is only called for missing names.
+    setattr(importlib.import_module(package_name), name, module)
+    return module
+
+  def __dir__():
+    package = importlib.import_module(package_name)
+    return sorted(set(package.__dict__) | set(public_names))
+
+  return __getattr__, __dir__, public_names
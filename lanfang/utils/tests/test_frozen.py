@@ -0,0 +1,46 @@
+from lanfang.utils import frozen
+
+import copy
+import json
+import pickle
+import unittest
+
+
+class TestFrozen(unittest.TestCase):
+  def test_freeze(self):
+    value = {"a": {"b": [1, {"c": 2}]}, "d": "e"}
+    snapshot = frozen.freeze(value)
+    self.assertEqual(snapshot, value)
+    self.assertTrue(frozen.is_frozen(snapshot["a"]["b"][1]))
+    self.assertEqual(json.loads(json.dumps(snapshot)), value)
+    self.assertIs(frozen.freeze(snapshot), snapshot)
+    self.assertIs(copy.deepcopy(snapshot), snapshot)
+
+    with self.assertRaises(TypeError):
+      snapshot["d"] = "f"
+    with self.assertRaises(TypeError):
+      snapshot["a"].update({"b": None})
+    with self.assertRaises(TypeError):
+      snapshot["a"]["b"].append(3)
+
+    restored = pickle.loads(pickle.dumps(snapshot))
+    self.assertEqual(restored, value)
+    self.assertTrue(frozen.is_frozen(restored["a"]["b"]))
+
+    mutable = frozen.thaw(snapshot)
+    mutable["a"]["b"].append(3)
+    self.assertFalse(frozen.is_frozen(mutable["a"]))
+    self.assertEqual(len(snapshot["a"]["b"]), 2)
+
+    # Values in the memo are shared instead of copied.
+    loaded = {"x": [1, 2]}
+    mutable = frozen.thaw({"a": [1], "b": loaded}, {id(loaded): loaded})
+    self.assertIs(mutable["b"], loaded)
+
+  def test_set_in(self):
+    snapshot = frozen.freeze({"a": {"b": [1, 2]}, "c": {"d": 3}})
+    updated = frozen.set_in(snapshot, ("a", "b", 1), {"e": 4})
+    self.assertEqual(updated, {"a": {"b": [1, {"e": 4}]}, "c": {"d": 3}})
+    self.assertEqual(snapshot["a"]["b"], [1, 2])
+    self.assertIs(updated["c"], snapshot["c"])
+    self.assertTrue(frozen.is_frozen(updated["a"]["b"][1]))
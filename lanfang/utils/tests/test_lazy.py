@@ -0,0 +1,30 @@
+from lanfang.utils import lazy
+
+import subprocess
+import sys
+import unittest
+
+
+class TestLazy(unittest.TestCase):
+  def test_attach(self):
+    getattr_fn, dir_fn, names = lazy.attach(
+        "lanfang.utils", ["lazy"], {"attach": "lazy"})
+    self.assertEqual(names, ["attach", "lazy"])
+    self.assertIs(getattr_fn("lazy"), lazy)
+    self.assertIs(getattr_fn("attach"), lazy.attach)
+    self.assertIn("attach", dir_fn())
+    with self.assertRaises(AttributeError):
+      getattr_fn("nothing")
+
+  def test_import_lanfang(self):
+    # Heavy dependencies are not loaded by importing the runner.
+    code = ("import sys, lanfang.runner; "
+            "print(','.join(sorted(m for m in ['lanfang.ai', "
+            "'lanfang.network', 'tensorflow', 'requests', 'jieba', 'nltk', "
+            "'_jsonnet'] if m in sys.modules)))")
+    output = subprocess.check_output([sys.executable, "-c", code])
+    self.assertEqual(output.decode("utf-8").strip(), "")
+
+
+if __name__ == "__main__":
+  unittest.main()